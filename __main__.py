@@ -15,18 +15,13 @@ if __name__ == "__main__":
         "643 Summer St, Boston, Suffolk, MA, 02210",
     ]
 
+    # Only the addresses without a good match are geocoded again with pagc_normalize_address
     for address in address_list:
         print(address)
-        print(db.get_geocoded_data(address))
-        print()
-
-    print()
-
-    for address in address_list:
-        print(address)
-        print(db.get_geocoded_data(address, pagc_normalize_address=True))
+        print(db.get_geocoded_data(address, cascade=True))
         print()
 
+    print(db.cascade_stats)
     print()
 
     # Reverse geocoding address
@@ -0,0 +1,170 @@
+"""
+Table of addresses the database already geocoded, kept next to the TIGER data so every client, language and replica
+that calls tiger_cache.geocode() instead of geocode() gets the stored result without the fuzzy search
+
+Rows are keyed by the text of the normalized address, so different spellings that normalize the same share a row,
+and stamped with the TIGER year of tiger.loader_variables, rows of another year are ignored until they are purged.
+Database(address_hits=True) reads through the table and its geocode_many writes the addresses it geocoded into it
+
+SELECT * FROM tiger_cache.geocode('60 TEMPLE PL, BOSTON, MA')
+
+python -m address_hits create
+python -m address_hits cap --max-rows 1000000
+python -m address_hits purge                  after loading a new TIGER year
+python -m address_hits stats
+"""
+
+import argparse
+
+from geocoder import Database
+
+
+# Rows cap keeps by default, the ones written most recently are kept
+ADDRESS_HITS_MAX_ROWS = 5_000_000
+
+CREATE_ADDRESS_HITS_SQL = [
+    "CREATE SCHEMA IF NOT EXISTS tiger_cache",
+    """
+    CREATE TABLE IF NOT EXISTS tiger_cache.address_hits(
+        norm_key text NOT NULL,
+        pagc boolean NOT NULL,
+        tiger_year text NOT NULL,
+        pprint text,
+        latitude float8,
+        longitude float8,
+        rating integer,
+        updated_at timestamptz NOT NULL DEFAULT now(),
+        CONSTRAINT pk_tiger_cache_address_hits PRIMARY KEY (norm_key, pagc)
+    )
+    """,
+    """
+    CREATE OR REPLACE FUNCTION tiger_cache.current_tiger_year() RETURNS text AS $$
+        SELECT COALESCE((SELECT tiger_year FROM tiger.loader_variables LIMIT 1), '')
+    $$ LANGUAGE sql STABLE
+    """,
+    """
+    CREATE OR REPLACE FUNCTION tiger_cache.address_key(in_address text, in_pagc boolean DEFAULT false) RETURNS text AS $$
+        SELECT (CASE WHEN in_pagc THEN pagc_normalize_address(in_address) ELSE normalize_address(in_address) END)::text
+    $$ LANGUAGE sql STABLE
+    """,
+    # Restricted searches can find another best match than the stored one so they always call geocode()
+    """
+    CREATE OR REPLACE FUNCTION tiger_cache.geocode_key(
+        in_key text, in_max_results integer DEFAULT 1, in_restrict_region geometry DEFAULT NULL, in_pagc boolean DEFAULT false
+    ) RETURNS TABLE(pprint text, latitude float8, longitude float8, rating integer, cached boolean, norm_key text) AS $$
+    BEGIN
+        IF in_restrict_region IS NULL THEN
+            RETURN QUERY
+            SELECT h.pprint, h.latitude, h.longitude, h.rating, true, in_key FROM tiger_cache.address_hits AS h
+            WHERE h.norm_key = in_key AND h.pagc = in_pagc AND h.tiger_year = tiger_cache.current_tiger_year();
+
+            IF FOUND THEN
+                RETURN;
+            END IF;
+        END IF;
+
+        RETURN QUERY
+        SELECT pprint_addy(g.addy), ST_Y(g.geomout), ST_X(g.geomout), g.rating, false, in_key
+        FROM geocode(in_key::norm_addy, in_max_results, in_restrict_region) AS g
+        ORDER BY g.rating;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION tiger_cache.geocode(
+        in_address text, in_max_results integer DEFAULT 1, in_restrict_region geometry DEFAULT NULL, in_pagc boolean DEFAULT false
+    ) RETURNS TABLE(pprint text, latitude float8, longitude float8, rating integer, cached boolean, norm_key text) AS $$
+        SELECT * FROM tiger_cache.geocode_key(tiger_cache.address_key(in_address, in_pagc), in_max_results, in_restrict_region, in_pagc)
+    $$ LANGUAGE sql
+    """,
+]
+
+
+def create_address_hits(db):
+    """
+    Creates the tiger_cache.address_hits table and the tiger_cache.geocode() function reading through it
+    """
+
+    for sql_query in CREATE_ADDRESS_HITS_SQL:
+        db.execute(sql_query)
+
+
+def cap_address_hits(db, max_rows=ADDRESS_HITS_MAX_ROWS):
+    """
+    Deletes the rows written least recently until at most max_rows are left and returns the number of deleted rows
+    """
+
+    with db.get_connection() as connection, connection.cursor() as cursor:
+        cursor.execute(
+            """
+            DELETE FROM tiger_cache.address_hits WHERE ctid IN (
+                SELECT ctid FROM tiger_cache.address_hits ORDER BY updated_at DESC OFFSET %s
+            )""",
+            [max_rows],
+        )
+        return cursor.rowcount
+
+
+def purge_address_hits(db, all_rows=False):
+    """
+    Deletes the rows stored for another TIGER year than the loaded one, or every row with all_rows=True,
+    and returns the number of deleted rows
+    """
+
+    with db.get_connection() as connection, connection.cursor() as cursor:
+        if all_rows:
+            cursor.execute("DELETE FROM tiger_cache.address_hits")
+        else:
+            cursor.execute("DELETE FROM tiger_cache.address_hits WHERE tiger_year <> tiger_cache.current_tiger_year()")
+
+        return cursor.rowcount
+
+
+def get_address_hits_stats(db):
+    with db.get_connection() as connection, connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT count(*), count(*) FILTER (WHERE tiger_year = tiger_cache.current_tiger_year()),
+            pg_total_relation_size('tiger_cache.address_hits')
+            FROM tiger_cache.address_hits"""
+        )
+        rows, current_rows, size = cursor.fetchone()
+
+    return {'rows': rows, 'current_year_rows': current_rows, 'bytes': size}
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Manage the tiger_cache.address_hits table")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("create", help="create the table and the tiger_cache.geocode() function")
+
+    cap_parser = subparsers.add_parser("cap", help="delete the rows written least recently above --max-rows")
+    cap_parser.add_argument("--max-rows", type=int, default=ADDRESS_HITS_MAX_ROWS)
+
+    purge_parser = subparsers.add_parser("purge", help="delete the rows of other TIGER years, run it after loading a new year")
+    purge_parser.add_argument("--all", action="store_true", help="delete every row")
+
+    subparsers.add_parser("stats", help="print the number of rows and the size of the table")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = parse_arguments()
+    db = Database()
+
+    if arguments.command == "create":
+        create_address_hits(db)
+        print("Created tiger_cache.address_hits and tiger_cache.geocode()")
+
+    elif arguments.command == "cap":
+        print(f"Deleted {cap_address_hits(db, arguments.max_rows)} rows")
+
+    elif arguments.command == "purge":
+        print(f"Deleted {purge_address_hits(db, arguments.all)} rows")
+
+    else:
+        print(get_address_hits_stats(db))
+
+    db.close()
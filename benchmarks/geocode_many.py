@@ -0,0 +1,55 @@
+"""
+Compares the one address at a time loop from __main__.py with the set based Database.geocode_many
+and the pipelined Database.geocode_stream
+
+Run from the project root so .env is found
+python -m benchmarks.geocode_many 2000
+"""
+
+import sys
+import time
+
+from geocoder import Database
+
+
+ADDRESS_LIST = [
+    "115 Cass Avenue in Woonsocket, RI",
+    "60 TEMPLE PL, BOSTON, MA",
+    "115 Cass Avenue, RI 02895",
+    "1279 Wampanoag Trl, Riverside, RI 02915",
+    "1428 West AVE APT 405 Miami FL 33139",
+    "1428 West AVE Miami FL 33139",
+    "643 Summer St, Boston, Suffolk, MA, 02210",
+]
+
+
+def print_result(name, number_of_addresses, elapsed):
+    print(f"{name:<30} {number_of_addresses} addresses in {elapsed:.2f}s - {number_of_addresses / elapsed:.1f} addresses/s")
+
+
+if __name__ == "__main__":
+    number_of_addresses = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    addresses = [ADDRESS_LIST[i % len(ADDRESS_LIST)] for i in range(number_of_addresses)]
+
+    db = Database()
+
+    for pagc_normalize_address in (False, True):
+        print(f"pagc_normalize_address={pagc_normalize_address}")
+
+        start = time.perf_counter()
+        one_at_a_time = [db.get_geocoded_data(address, pagc_normalize_address=pagc_normalize_address) for address in addresses]
+        print_result("get_geocoded_data loop", number_of_addresses, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        batched = db.geocode_many(addresses, pagc_normalize_address=pagc_normalize_address)
+        print_result("geocode_many", number_of_addresses, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        streamed = list(db.geocode_stream(addresses, pagc_normalize_address=pagc_normalize_address))
+        print_result("geocode_stream", number_of_addresses, time.perf_counter() - start)
+
+        mismatches = sum(1 for single, batch in zip(one_at_a_time, batched) if single != batch)
+        print(f"results that differ between get_geocoded_data and geocode_many: {mismatches}")
+        mismatches = sum(1 for single, stream in zip(one_at_a_time, streamed) if single != stream)
+        print(f"results that differ between get_geocoded_data and geocode_stream: {mismatches}")
+        print()
@@ -0,0 +1,74 @@
+"""
+Compares OfflineGeocoder with Database.get_geocoded_data and geocode_many on addresses of the benchmark fixture,
+prints the addresses per second of every path, the share answered offline and how far the offline points are
+from the ones of the database
+
+The fixture state is exported to the export directory first when it doesnt hold an export yet
+
+Run from the project root so .env is found
+python -m benchmarks.offline_geocode --addresses 2000 --export exports/benchmark_ri
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+from benchmarks.tiger_fixture import BENCHMARK_DB_NAME, STATE, generate_addresses, use_database
+from cache import METERS_PER_DEGREE_LATITUDE
+from geocoder import Database
+from offline_export import export_state
+from offline_geocoder import OfflineGeocoder
+
+
+def print_result(name, number_of_addresses, elapsed):
+    print(f"{name:<35} {number_of_addresses} addresses in {elapsed:.2f}s - {number_of_addresses / elapsed:.1f} addresses/s")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Compare the offline geocoder with the database")
+    parser.add_argument("--addresses", type=int, default=2000)
+    parser.add_argument("--export", default="exports/benchmark_ri", help="directory of the export of the fixture state")
+    parser.add_argument("--dbname", default=BENCHMARK_DB_NAME)
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = parse_arguments()
+    use_database(arguments.dbname)
+    db = Database()
+
+    if not (Path(arguments.export) / "metadata.json").exists():
+        export_state(db, STATE["abbr"], arguments.export)
+
+    offline = OfflineGeocoder([arguments.export], db=db)
+    addresses = generate_addresses(arguments.addresses, seed=0)
+
+    start = time.perf_counter()
+    expected = [db.get_geocoded_data(address) for address in addresses]
+    print_result("Database.get_geocoded_data loop", arguments.addresses, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    db.geocode_many(addresses)
+    print_result("Database.geocode_many", arguments.addresses, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    results = [offline.get_geocoded_data(address) for address in addresses]
+    print_result("OfflineGeocoder.get_geocoded_data", arguments.addresses, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    offline.geocode_many(addresses)
+    print_result("OfflineGeocoder.geocode_many", arguments.addresses, time.perf_counter() - start)
+
+    # Only the addresses answered offline can differ, the others are the results of the database
+    distances = sorted(
+        METERS_PER_DEGREE_LATITUDE * ((result.latitude - expected_result.latitude) ** 2 + (result.longitude - expected_result.longitude) ** 2) ** 0.5
+        for address, result, expected_result in zip(addresses, results, expected)
+        if offline.match(address) is not None and expected_result.latitude is not None
+    )
+
+    print(f"answered offline                    {offline.stats()['offline_rate']:.1%}")
+    if distances:
+        print(f"distance to the database point      median {distances[len(distances) // 2]:.1f} m, max {distances[-1]:.1f} m")
+
+    db.close()
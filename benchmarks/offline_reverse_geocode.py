@@ -0,0 +1,83 @@
+"""
+Compares OfflineReverseGeocoder with Database.reverse_geocode and reverse_geocode_many on points of the benchmark fixture,
+prints the points per second of every path and how often the offline streets match the ones of the database
+
+The fixture state is exported to the export directory first when it doesnt hold an export yet
+
+Run from the project root so .env is found
+python -m benchmarks.offline_reverse_geocode --points 2000 --export exports/benchmark_ri
+"""
+
+import argparse
+import re
+import time
+from pathlib import Path
+
+from benchmarks.tiger_fixture import BENCHMARK_DB_NAME, STATE, generate_coordinates, use_database
+from geocoder import Database
+from offline_export import export_state
+from offline_reverse_geocoder import OfflineReverseGeocoder
+
+
+REGEX_house_number_pattern = re.compile(r"^\d+ ")
+
+
+def print_result(name, number_of_points, elapsed):
+    print(f"{name:<40} {number_of_points} points in {elapsed:.2f}s - {number_of_points / elapsed:.1f} points/s")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Compare the offline reverse geocoder with the database")
+    parser.add_argument("--points", type=int, default=2000)
+    parser.add_argument("--export", default="exports/benchmark_ri", help="directory of the export of the fixture state")
+    parser.add_argument("--dbname", default=BENCHMARK_DB_NAME)
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = parse_arguments()
+    use_database(arguments.dbname)
+    db = Database()
+
+    if not (Path(arguments.export) / "metadata.json").exists():
+        start = time.perf_counter()
+        number_of_edges, _ = export_state(db, STATE["abbr"], arguments.export)
+        print(f"exported {number_of_edges} edges in {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    offline = OfflineReverseGeocoder(arguments.export)
+    print(f"loaded and indexed the export in {time.perf_counter() - start:.2f}s")
+
+    coordinates = generate_coordinates(arguments.points, seed=0)
+    latitudes = [latitude for latitude, _ in coordinates]
+    longitudes = [longitude for _, longitude in coordinates]
+
+    start = time.perf_counter()
+    expected = [db.reverse_geocode(latitude, longitude) for latitude, longitude in coordinates]
+    print_result("Database.reverse_geocode loop", arguments.points, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    db.reverse_geocode_many(latitudes, longitudes)
+    print_result("Database.reverse_geocode_many", arguments.points, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    results = [offline.reverse_geocode(latitude, longitude) for latitude, longitude in coordinates]
+    print_result("OfflineReverseGeocoder.reverse_geocode loop", arguments.points, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    offline.reverse_geocode_many(latitudes, longitudes)
+    print_result("OfflineReverseGeocoder.reverse_geocode_many", arguments.points, time.perf_counter() - start)
+
+    # The street without its house number shows whether the same street was found even when the interpolation differs
+    same_street_1 = sum(
+        1 for result, expected_result in zip(results, expected)
+        if result.street_1 and expected_result.street_1
+        and REGEX_house_number_pattern.sub("", result.street_1) == REGEX_house_number_pattern.sub("", expected_result.street_1)
+    )
+    same_address_1 = sum(1 for result, expected_result in zip(results, expected) if result.street_1 == expected_result.street_1)
+
+    print(f"street_1 on the same street as the database  {same_street_1 / arguments.points:.1%}")
+    print(f"street_1 the same as the database            {same_address_1 / arguments.points:.1%}")
+
+    db.close()
@@ -0,0 +1,34 @@
+"""
+Measures how ParallelGeocoder throughput scales with the number of worker processes
+
+Run from the project root so .env is found
+python -m benchmarks.parallel_geocoder 20000 8
+"""
+
+import os
+import sys
+import time
+
+from parallel_geocoder import ParallelGeocoder
+from benchmarks.geocode_many import ADDRESS_LIST
+
+
+if __name__ == "__main__":
+    number_of_addresses = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    max_processes = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+
+    addresses = [ADDRESS_LIST[i % len(ADDRESS_LIST)] for i in range(number_of_addresses)]
+
+    processes = 1
+    single_process_rate = None
+    while processes <= max_processes:
+        with ParallelGeocoder(processes) as parallel_geocoder:
+            start = time.perf_counter()
+            parallel_geocoder.geocode_many(addresses)
+            elapsed = time.perf_counter() - start
+
+        rate = number_of_addresses / elapsed
+        single_process_rate = single_process_rate or rate
+        print(f"{processes:>3} processes - {rate:8.1f} addresses/s - speedup {rate / single_process_rate:.2f}x")
+
+        processes *= 2
@@ -0,0 +1,76 @@
+"""
+Measures the latency of get_geocoded_data and reverse_geocode with and without server side prepared statements,
+reverse_geocode is also compared with the old query that put the coordinates in the sql text
+
+Run from the project root so .env is found
+python -m benchmarks.prepared_statements 500
+"""
+
+import statistics
+import sys
+import time
+
+from geocoder import Database
+from benchmarks.geocode_many import ADDRESS_LIST
+
+
+COORDINATES = [
+    (42.00520268824846, -71.49633130645371),
+    (25.78629822167768, -80.14252463174698),
+    (25.786397605531484, -80.14256448941912),
+]
+
+
+def reverse_geocode_without_parameters(db, latitude, longitude):
+    # Every coordinate pair is a new statement for the server, this is how reverse_geocode used to query
+    sql_query = f"""
+        SELECT pprint_addy(r.addy[1]) As st1, pprint_addy(r.addy[2]) As st2, pprint_addy(r.addy[3])
+        FROM reverse_geocode(ST_GeomFromText('POINT({longitude} {latitude})', 4269)) AS r"""
+
+    with db.get_connection() as connection, connection.cursor() as cursor:
+        cursor.execute(sql_query)
+        return cursor.fetchone()
+
+
+def measure(function, arguments):
+    latencies = []
+    for argument in arguments:
+        start = time.perf_counter()
+        function(*argument)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return latencies
+
+
+def print_latencies(name, latencies):
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(f"{name:<40} mean {statistics.mean(latencies):7.2f}ms  p50 {quantiles[49]:7.2f}ms  p95 {quantiles[94]:7.2f}ms")
+
+
+if __name__ == "__main__":
+    number_of_calls = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+
+    addresses = [(ADDRESS_LIST[i % len(ADDRESS_LIST)],) for i in range(number_of_calls)]
+    # Moving every point a little makes each query text unique like real gps fixes
+    coordinates = []
+    for i in range(number_of_calls):
+        latitude, longitude = COORDINATES[i % len(COORDINATES)]
+        coordinates.append((latitude + i * 1e-7, longitude + i * 1e-7))
+
+    prepared = Database(prepare=True)
+    not_prepared = Database(prepare=False)
+
+    # First calls plan the statements and fill caches, they are not part of the measurement
+    for db in (prepared, not_prepared):
+        measure(db.get_geocoded_data, addresses[:10])
+        measure(db.reverse_geocode, coordinates[:10])
+
+    print_latencies("get_geocoded_data prepared", measure(prepared.get_geocoded_data, addresses))
+    print_latencies("get_geocoded_data not prepared", measure(not_prepared.get_geocoded_data, addresses))
+
+    print_latencies("reverse_geocode prepared", measure(prepared.reverse_geocode, coordinates))
+    print_latencies("reverse_geocode not prepared", measure(not_prepared.reverse_geocode, coordinates))
+    print_latencies(
+        "reverse_geocode coordinates in sql text",
+        measure(lambda latitude, longitude: reverse_geocode_without_parameters(not_prepared, latitude, longitude), coordinates),
+    )
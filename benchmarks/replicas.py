@@ -0,0 +1,48 @@
+"""
+Geocodes from several threads through a Database with replicas and prints the throughput and the queries every replica answered,
+the replicas can be any local PostgreSQL instances with the same data, like the benchmark fixture loaded into each of them
+
+Stopping one of the instances while it runs shows it being ejected and the others taking its queries
+
+Run from the project root so .env is found
+python -m benchmarks.replicas localhost:5433 localhost:5434 --routing least_outstanding
+"""
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.tiger_fixture import BENCHMARK_DB_NAME, generate_addresses, use_database
+from geocoder import Database
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Geocode through read replicas")
+    parser.add_argument("replicas", nargs="+", help="replicas as host:port or connection URIs")
+    parser.add_argument("--routing", choices=["round_robin", "least_outstanding"], default="round_robin")
+    parser.add_argument("--dbname", default=BENCHMARK_DB_NAME, help="database of the primary and of host:port replicas")
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8)
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = parse_arguments()
+    use_database(arguments.dbname)
+
+    db = Database(pooled=True, max_size=arguments.threads, replicas=arguments.replicas, routing=arguments.routing)
+    addresses = generate_addresses(arguments.calls, seed=0)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(arguments.threads) as executor:
+        results = list(executor.map(db.get_geocoded_data, addresses))
+    elapsed = time.perf_counter() - start
+
+    print(f"{arguments.calls / elapsed:.1f} geocodes/s with {arguments.threads} threads and {arguments.routing} routing")
+
+    stats = db.replica_router.stats()
+    for index, replica in enumerate(db.replica_router.replicas):
+        print(f"{replica.name:<30} {stats[f'{index}_queries']:>8} queries {stats[f'{index}_failures']:>4} failures")
+
+    db.close()
@@ -0,0 +1,67 @@
+"""
+Replays a trace of gps fixes through reverse_geocode with and without ReverseGeocodeCache and reports
+how many database queries the cache removes, how much faster it is and how often the cached streets differ
+
+The trace is a csv file with latitude and longitude columns, without one a trace of fixes scattered
+a few meters around the example coordinates is generated
+
+Run from the project root so .env is found
+python -m benchmarks.reverse_geocode_cache trace.csv 5
+"""
+
+import csv
+import random
+import sys
+import time
+
+from cache import ReverseGeocodeCache
+from geocoder import Database
+from benchmarks.prepared_statements import COORDINATES
+
+
+def read_trace(file_path):
+    with open(file_path, newline="") as f:
+        return [(float(row["latitude"]), float(row["longitude"])) for row in csv.DictReader(f)]
+
+
+def generate_trace(number_of_points=2000, spread=20):
+    # spread is in meters, about 1e-5 degrees per meter is close enough for a synthetic trace
+    random.seed(0)
+    trace = []
+    for i in range(number_of_points):
+        latitude, longitude = COORDINATES[i % len(COORDINATES)]
+        trace.append((latitude + random.uniform(-spread, spread) * 1e-5, longitude + random.uniform(-spread, spread) * 1e-5))
+
+    return trace
+
+
+if __name__ == "__main__":
+    trace = read_trace(sys.argv[1]) if len(sys.argv) > 1 else generate_trace()
+    cell_size = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    uncached = Database()
+    reverse_cache = ReverseGeocodeCache(cell_size=cell_size)
+    cached = Database(reverse_cache=reverse_cache)
+
+    start = time.perf_counter()
+    expected = [uncached.reverse_geocode(latitude, longitude) for latitude, longitude in trace]
+    uncached_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = [cached.reverse_geocode(latitude, longitude) for latitude, longitude in trace]
+    cached_elapsed = time.perf_counter() - start
+
+    stats = reverse_cache.stats()
+    different_street_1 = sum(1 for result, expected_result in zip(results, expected) if result["street_1"] != expected_result["street_1"])
+    different_any = sum(1 for result, expected_result in zip(results, expected) if result != expected_result)
+
+    print(f"points in trace                  {len(trace)}")
+    print(f"cell size                        {cell_size} m")
+    print(f"database queries without cache   {len(trace)}")
+    print(f"database queries with cache      {stats['misses']} ({1 - stats['misses'] / len(trace):.1%} removed)")
+    print(f"cache hit rate                   {stats['hit_rate']:.1%}")
+    print(f"cache entries                    {stats['entries']}")
+    print(f"time without cache               {uncached_elapsed:.2f}s - {len(trace) / uncached_elapsed:.1f} points/s")
+    print(f"time with cache                  {cached_elapsed:.2f}s - {len(trace) / cached_elapsed:.1f} points/s")
+    print(f"street_1 differs from database   {different_street_1} ({different_street_1 / len(trace):.2%})")
+    print(f"any street differs from database {different_any} ({different_any / len(trace):.2%})")
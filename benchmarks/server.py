@@ -0,0 +1,60 @@
+"""
+Measures the requests per second the geocoding server answers over one database connection
+with micro batching turned off (batch size 1) and on
+
+Run from the project root so .env is found
+python -m benchmarks.server 2000 100
+"""
+
+import asyncio
+import sys
+import time
+from urllib.parse import quote
+
+from benchmarks.geocode_many import ADDRESS_LIST
+from geocoder import AsyncDatabase
+from server import GeocodingServer
+
+
+async def send_requests(port, paths):
+    """Sends the requests one after another over a keep alive connection"""
+
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+
+    for path in paths:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+        await writer.drain()
+
+        header = await reader.readuntil(b"\r\n\r\n")
+        for line in header.decode("latin-1").split("\r\n"):
+            if line.lower().startswith("content-length:"):
+                await reader.readexactly(int(line.split(":", 1)[1]))
+
+    writer.close()
+
+
+async def measure(number_of_requests, clients, batch_size):
+    paths = [f"/geocode?address={quote(ADDRESS_LIST[i % len(ADDRESS_LIST)])}" for i in range(number_of_requests)]
+
+    async with AsyncDatabase(min_size=1, max_size=1) as db:
+        geocoding_server = GeocodingServer(db, batch_size=batch_size)
+        server = await asyncio.start_server(geocoding_server.handle_connection, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+
+        start = time.perf_counter()
+        await asyncio.gather(*[send_requests(port, paths[client::clients]) for client in range(clients)])
+        elapsed = time.perf_counter() - start
+
+        server.close()
+        await server.wait_closed()
+
+    stats = geocoding_server.batchers["default"].stats()
+    print(f"batch size {batch_size:>4} - {number_of_requests / elapsed:8.1f} requests/s - average batch {stats['average_batch_size']:.1f}")
+
+
+if __name__ == "__main__":
+    number_of_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    for batch_size in (1, 10, 100):
+        asyncio.run(measure(number_of_requests, clients, batch_size))
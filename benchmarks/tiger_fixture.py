@@ -0,0 +1,297 @@
+"""
+Builds a small synthetic TIGER dataset, a grid town of 20 x 20 streets, in its own database so benchmarks
+can run offline against a local PostGIS and give the same numbers for the same PostGIS version and indexes
+
+The rows are generated with the columns shp2pgsql would create from the TIGER files and loaded into tiger_data
+with the same scripts/common_sql.py, load_states.py and create_indicies.py functions as real data,
+so the tables, constraints and indexes are the ones a real load creates
+
+Run from the project root so .env is found
+python -m benchmarks.tiger_fixture geocoder_benchmark
+"""
+
+import random
+import sys
+
+import geocoder
+from geocoder import Database, drop_and_create_new_database
+from scripts.common_sql import (
+    create_county_all_table,
+    create_state_all_table,
+    create_state_section_table,
+    finish_state_section_table,
+    load_staged_county_all_data,
+    load_staged_state_all_data,
+    load_staged_state_section_data,
+    reset_schema,
+)
+from scripts.create_extensions import create_extensions
+from scripts.create_indicies import create_indicies
+from scripts.load_states import create_state_section_indexes, load_zip_tables_data
+
+
+BENCHMARK_DB_NAME = "geocoder_benchmark"
+
+# The town reuses real FIPS codes and names, normalize_address only recognizes places in the lookup tables of the extension
+STATE = {'abbr': "RI", 'fips': "44", 'name': "Rhode Island"}
+COUNTY = {'countyfp': "007", 'name': "Providence"}
+PLACE = {'placefp': "80780", 'name': "Woonsocket"}
+ZIP_CODE = "02895"
+
+# South west corner of the grid and distance between two streets in degrees, about 110 m in both directions
+ORIGIN_LATITUDE = 41.99
+ORIGIN_LONGITUDE = -71.53
+LATITUDE_SPACING = 0.001
+LONGITUDE_SPACING = 0.0013
+
+# East west streets from south to north and north south avenues from west to east
+STREET_NAMES = [
+    "Elm", "Oak", "Maple", "Cedar", "Pine", "Walnut", "Spruce", "Chestnut", "Birch", "Willow",
+    "Ash", "Cherry", "Poplar", "Hickory", "Laurel", "Magnolia", "Sycamore", "Juniper", "Hawthorn", "Linden",
+]
+AVENUE_NAMES = [
+    "Cass", "Adams", "Baker", "Carver", "Dexter", "Emerson", "Fulton", "Grant", "Hamlet", "Irving",
+    "Jensen", "Kendall", "Lowell", "Morton", "Nelson", "Oliver", "Porter", "Quincy", "Reed", "Sumner",
+]
+GRID_SIZE = len(STREET_NAMES)
+
+# Columns of the staging tables as shp2pgsql creates them, the types are copied from the tiger parent tables
+STAGING_SQL = {
+    'state': "SELECT statefp, stusps, name, mtfcc, funcstat, the_geom FROM tiger.state",
+    'county': "SELECT statefp, countyfp, cntyidfp AS geoid, name, namelsad, lsad, classfp, mtfcc, funcstat, the_geom FROM tiger.county",
+    'place': "SELECT statefp, placefp, plcidfp AS geoid, name, namelsad, lsad, classfp, mtfcc, funcstat, the_geom FROM tiger.place",
+    'cousub': "SELECT statefp, countyfp, cousubfp, cosbidfp AS geoid, name, namelsad, lsad, classfp, mtfcc, funcstat, the_geom FROM tiger.cousub",
+    'faces': "SELECT tfid, statefp, countyfp, cousubfp, placefp, the_geom FROM tiger.faces",
+    'featnames': "SELECT tlid, fullname, name, suftypabrv, suftyp, linearid, mtfcc, paflag FROM tiger.featnames",
+    'edges': """
+        SELECT statefp, countyfp, tlid, tfidl, tfidr, mtfcc, fullname, lfromadd, ltoadd, rfromadd, rtoadd, zipl, zipr,
+        roadflg, tnidf, tnidt, the_geom FROM tiger.edges""",
+    'addr': "SELECT tlid, fromhn, tohn, side, zip, fromtyp, totyp, arid, mtfcc FROM tiger.addr",
+}
+
+# Primary keys of the tiger_data state tables, the same as in load_states.py
+PRIMARY_KEYS = {'place': "plcidfp", 'cousub': "cosbidfp", 'faces': "gid", 'featnames': "gid", 'edges': "gid", 'addr': "gid"}
+
+
+def grid_latitude(row):
+    return ORIGIN_LATITUDE + row * LATITUDE_SPACING
+
+
+def grid_longitude(column):
+    return ORIGIN_LONGITUDE + column * LONGITUDE_SPACING
+
+
+def rectangle_wkt(west, south, east, north):
+    return f"MULTIPOLYGON((({west} {south},{east} {south},{east} {north},{west} {north},{west} {south})))"
+
+
+def get_bounds():
+    # The outer faces are one block wide strips around the grid so every edge has a face on both sides
+    return grid_longitude(-1), grid_latitude(-1), grid_longitude(GRID_SIZE), grid_latitude(GRID_SIZE)
+
+
+def get_face_id(column, row):
+    """Returns the tfid of the block between avenues column and column + 1 and streets row and row + 1"""
+
+    return 1 + (row + 1) * (GRID_SIZE + 1) + (column + 1)
+
+
+def get_house_numbers(block):
+    """Returns (first odd, last odd, first even, last even) house number of a block, numbers grow by 100 per block"""
+
+    start = 100 * (block + 1)
+    return start + 1, start + 99, start, start + 98
+
+
+def generate_faces():
+    faces = []
+
+    for row in range(-1, GRID_SIZE):
+        for column in range(-1, GRID_SIZE):
+            wkt = rectangle_wkt(grid_longitude(column), grid_latitude(row), grid_longitude(column + 1), grid_latitude(row + 1))
+            faces.append((get_face_id(column, row), STATE["fips"], COUNTY["countyfp"], PLACE["placefp"], PLACE["placefp"], wkt))
+
+    return faces
+
+
+def generate_streets():
+    """
+    Returns the featnames, edges and addr rows of the grid, every street is split into one edge per block
+    with odd house numbers on the left side and even ones on the right side
+    """
+
+    featnames = []
+    edges = []
+    addr = []
+    tlid = 100_000
+
+    for row, name in enumerate(STREET_NAMES):
+        for block in range(GRID_SIZE - 1):
+            tlid += 1
+            west, east = grid_longitude(block), grid_longitude(block + 1)
+            latitude = grid_latitude(row)
+            # Going east the block north of the street is on the left
+            edges.append((tlid, name, "St", f"MULTILINESTRING(({west} {latitude},{east} {latitude}))", get_face_id(block, row), get_face_id(block, row - 1), block))
+
+    for column, name in enumerate(AVENUE_NAMES):
+        for block in range(GRID_SIZE - 1):
+            tlid += 1
+            south, north = grid_latitude(block), grid_latitude(block + 1)
+            longitude = grid_longitude(column)
+            # Going north the block west of the avenue is on the left
+            edges.append((tlid, name, "Ave", f"MULTILINESTRING(({longitude} {south},{longitude} {north}))", get_face_id(column - 1, block), get_face_id(column, block), block))
+
+    edge_rows = []
+    for tlid, name, street_type, wkt, tfidl, tfidr, block in edges:
+        left_from, left_to, right_from, right_to = get_house_numbers(block)
+        full_name = f"{name} {street_type}"
+
+        featnames.append((tlid, full_name, name, street_type, street_type, f"L{tlid}", "S1400", "P"))
+        edge_rows.append((
+            STATE["fips"], COUNTY["countyfp"], tlid, tfidl, tfidr, "S1400", full_name,
+            str(left_from), str(left_to), str(right_from), str(right_to), ZIP_CODE, ZIP_CODE,
+            "Y", tlid * 2, tlid * 2 + 1, wkt,
+        ))
+        addr.append((tlid, str(left_from), str(left_to), "L", ZIP_CODE, "I", "I", f"A{tlid}L", "M2100"))
+        addr.append((tlid, str(right_from), str(right_to), "R", ZIP_CODE, "I", "I", f"A{tlid}R", "M2100"))
+
+    return featnames, edge_rows, addr
+
+
+def load_staged_rows(db, staging_table, section, rows):
+    """
+    Creates tiger_staging.<staging_table> with the columns of STAGING_SQL[section] and inserts rows into it,
+    the last value of a row is the geometry as WKT when the section has one
+    """
+
+    db.execute(f"CREATE TABLE tiger_staging.{staging_table} AS {STAGING_SQL[section]} WITH NO DATA")
+
+    with db.get_connection() as connection, connection.cursor() as cursor:
+        cursor.execute(f"SELECT * FROM tiger_staging.{staging_table} LIMIT 0")
+        columns = [column.name for column in cursor.description]
+
+        placeholders = ["ST_Multi(ST_GeomFromText(%s, 4269))" if column == "the_geom" else "%s" for column in columns]
+        cursor.executemany(
+            f"INSERT INTO tiger_staging.{staging_table}({', '.join(columns)}) VALUES ({', '.join(placeholders)})",
+            rows,
+        )
+
+
+def load_national_fixture(db):
+    west, south, east, north = get_bounds()
+    wkt = rectangle_wkt(west, south, east, north)
+
+    reset_schema(db)
+    create_state_all_table(db)
+    load_staged_rows(db, "state", "state", [(STATE["fips"], STATE["abbr"], STATE["name"], "G4000", "A", wkt)])
+    load_staged_state_all_data(db)
+
+    reset_schema(db)
+    create_county_all_table(db)
+    load_staged_rows(
+        db,
+        "county",
+        "county",
+        [(STATE["fips"], COUNTY["countyfp"], STATE["fips"] + COUNTY["countyfp"], COUNTY["name"], f"{COUNTY['name']} County", "06", "H1", "G4020", "A", wkt)],
+    )
+    load_staged_county_all_data(db)
+
+
+def load_state_fixture(db):
+    abbr = STATE["abbr"].lower()
+    fips = STATE["fips"]
+
+    west, south, east, north = get_bounds()
+    wkt = rectangle_wkt(west, south, east, north)
+    featnames, edges, addr = generate_streets()
+
+    sections = {
+        'place': [(fips, PLACE["placefp"], fips + PLACE["placefp"], PLACE["name"], f"{PLACE['name']} city", "25", "C1", "G4110", "A", wkt)],
+        'cousub': [(fips, COUNTY["countyfp"], PLACE["placefp"], fips + COUNTY["countyfp"] + PLACE["placefp"], PLACE["name"], f"{PLACE['name']} city", "25", "C5", "G4040", "F", wkt)],
+        'faces': generate_faces(),
+        'featnames': featnames,
+        'edges': edges,
+        'addr': addr,
+    }
+
+    for section, rows in sections.items():
+        print(f"Loading {len(rows)} {section} rows")
+
+        reset_schema(db)
+        create_state_section_table(db, section, abbr, fips, PRIMARY_KEYS[section])
+        load_staged_rows(db, f"{abbr}_{section}", section, rows)
+        load_staged_state_section_data(db, section, abbr, PRIMARY_KEYS[section])
+        finish_state_section_table(db, section, abbr)
+        create_state_section_indexes(db, section, abbr)
+
+    load_zip_tables_data(abbr, fips)
+
+
+def use_database(dbname):
+    """Points every Database created after this call, including the ones of the loader scripts, to dbname"""
+
+    geocoder.get_db_parameters()["dbname"] = dbname
+
+
+def create_fixture(dbname=BENCHMARK_DB_NAME):
+    """
+    Drops and creates dbname and loads the synthetic dataset into it
+    """
+
+    use_database(dbname)
+    drop_and_create_new_database()
+    create_extensions()
+
+    db = Database()
+    load_national_fixture(db)
+    load_state_fixture(db)
+    db.close()
+
+    create_indicies()
+
+
+def generate_addresses(number_of_addresses, seed=0):
+    """
+    Returns addresses of the fixture in the different ways they are written in real input, the same seed
+    always gives the same addresses
+    """
+
+    generator = random.Random(seed)
+    addresses = []
+
+    for _ in range(number_of_addresses):
+        if generator.random() < 0.5:
+            name, street_type, long_street_type = generator.choice(STREET_NAMES), "St", "Street"
+        else:
+            name, street_type, long_street_type = generator.choice(AVENUE_NAMES), "Ave", "Avenue"
+
+        block = generator.randrange(GRID_SIZE - 1)
+        number = 100 * (block + 1) + generator.randrange(100)
+
+        address = generator.choice([
+            f"{number} {name} {street_type}, {PLACE['name']}, {STATE['abbr']} {ZIP_CODE}",
+            f"{number} {name} {long_street_type}, {PLACE['name']}, {STATE['abbr']}",
+            f"{number} {name.upper()} {street_type.upper()} {STATE['abbr']} {ZIP_CODE}",
+            f"{number} {name} {long_street_type} in {PLACE['name']}, {STATE['abbr']}",
+        ])
+        addresses.append(address)
+
+    return addresses
+
+
+def generate_coordinates(number_of_coordinates, seed=0):
+    """Returns (latitude, longitude) pairs inside the grid, the same seed always gives the same points"""
+
+    generator = random.Random(seed)
+    coordinates = []
+
+    for _ in range(number_of_coordinates):
+        latitude = grid_latitude(generator.uniform(0, GRID_SIZE - 1))
+        longitude = grid_longitude(generator.uniform(0, GRID_SIZE - 1))
+        coordinates.append((latitude, longitude))
+
+    return coordinates
+
+
+if __name__ == "__main__":
+    create_fixture(sys.argv[1] if len(sys.argv) > 1 else BENCHMARK_DB_NAME)
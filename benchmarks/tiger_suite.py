@@ -0,0 +1,198 @@
+"""
+Reproducible benchmark of get_geocoded_data, get_geocoded_data(pagc_normalize_address=True) and reverse_geocode
+over the synthetic dataset of benchmarks/tiger_fixture.py, runs offline against a local PostGIS
+
+Reports the latency percentiles of single calls and the throughput for every concurrency as JSON,
+two result files can be compared to see if a PostGIS upgrade or an index change made geocoding faster or slower
+
+Run from the project root so .env is found, --load-fixture (re)creates the benchmark database first
+python -m benchmarks.tiger_suite --load-fixture --output before.json
+python -m benchmarks.tiger_suite --output after.json --compare before.json
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.tiger_fixture import BENCHMARK_DB_NAME, create_fixture, generate_addresses, generate_coordinates, use_database
+from geocoder import Database, GeocodeResult, GeocodingConfidence
+
+
+# Calls made before measuring so statements are planned and the fixture is in shared buffers
+WARM_UP_CALLS = 50
+
+OPERATIONS = ["geocode", "geocode_pagc", "reverse_geocode"]
+
+
+def get_operation_calls(db, operation, number_of_calls, seed):
+    """
+    Returns a list of (function, arguments) for number_of_calls calls of operation, the same seed gives the same calls
+    """
+
+    if operation == "reverse_geocode":
+        return [(db.reverse_geocode, coordinates) for coordinates in generate_coordinates(number_of_calls, seed)]
+
+    pagc_normalize_address = operation == "geocode_pagc"
+    return [(db.get_geocoded_data, (address, pagc_normalize_address)) for address in generate_addresses(number_of_calls, seed)]
+
+
+def is_match(result):
+    if isinstance(result, GeocodeResult):
+        return result.confidence != GeocodingConfidence.NO_MATCH
+
+    return result.street_1 is not None
+
+
+def get_percentiles(latencies):
+    quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+
+    return {
+        'mean': round(statistics.mean(latencies), 3),
+        'p50': round(quantiles[49], 3),
+        'p90': round(quantiles[89], 3),
+        'p95': round(quantiles[94], 3),
+        'p99': round(quantiles[98], 3),
+        'max': round(max(latencies), 3),
+    }
+
+
+def measure_latency(db, operation, number_of_calls):
+    """Makes number_of_calls calls one after another and returns their latency percentiles in ms and the match rate"""
+
+    for function, arguments in get_operation_calls(db, operation, WARM_UP_CALLS, seed=1):
+        function(*arguments)
+
+    latencies = []
+    matches = 0
+
+    for function, arguments in get_operation_calls(db, operation, number_of_calls, seed=0):
+        start = time.perf_counter()
+        result = function(*arguments)
+        latencies.append((time.perf_counter() - start) * 1000)
+        matches += is_match(result)
+
+    return {**get_percentiles(latencies), 'match_rate': round(matches / number_of_calls, 4)}
+
+
+def measure_throughput(operation, number_of_calls, concurrency):
+    """Makes number_of_calls calls from concurrency threads sharing a pooled Database and returns the calls per second"""
+
+    db = Database(pooled=True, min_size=concurrency, max_size=concurrency)
+
+    try:
+        with ThreadPoolExecutor(concurrency) as executor:
+            warm_up = [executor.submit(function, *arguments) for function, arguments in get_operation_calls(db, operation, WARM_UP_CALLS, seed=1)]
+            for future in warm_up:
+                future.result()
+
+            calls = get_operation_calls(db, operation, number_of_calls, seed=0)
+            start = time.perf_counter()
+            futures = [executor.submit(function, *arguments) for function, arguments in calls]
+            for future in futures:
+                future.result()
+            elapsed = time.perf_counter() - start
+
+    finally:
+        db.close()
+
+    return round(number_of_calls / elapsed, 1)
+
+
+def get_versions(db):
+    with db.get_connection() as connection, connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT current_setting('server_version'), postgis_lib_version(),
+            (SELECT extversion FROM pg_extension WHERE extname = 'postgis_tiger_geocoder')"""
+        )
+        postgres, postgis, tiger_geocoder = cursor.fetchone()
+
+    return {'postgres': postgres, 'postgis': postgis, 'postgis_tiger_geocoder': tiger_geocoder}
+
+
+def run_suite(number_of_calls, concurrencies):
+    db = Database()
+
+    results = {
+        'versions': get_versions(db),
+        'calls': number_of_calls,
+        'latency_ms': {},
+        'throughput_per_second': {},
+    }
+
+    for operation in OPERATIONS:
+        print(f"Measuring {operation} latency")
+        results["latency_ms"][operation] = measure_latency(db, operation, number_of_calls)
+
+    db.close()
+
+    for operation in OPERATIONS:
+        results["throughput_per_second"][operation] = {}
+
+        for concurrency in concurrencies:
+            print(f"Measuring {operation} throughput with {concurrency} threads")
+            results["throughput_per_second"][operation][str(concurrency)] = measure_throughput(operation, number_of_calls, concurrency)
+
+    return results
+
+
+def print_comparison(results, previous_results):
+    """Prints the change of every latency percentile and throughput, negative latency and positive throughput changes are better"""
+
+    def change(new, old):
+        return f"{(new - old) / old:+7.1%}" if old else "      -"
+
+    if results["versions"] != previous_results["versions"]:
+        print(f"versions {previous_results['versions']} -> {results['versions']}")
+
+    for operation, latencies in results["latency_ms"].items():
+        previous_latencies = previous_results["latency_ms"].get(operation)
+        if previous_latencies is None:
+            continue
+
+        changes = "  ".join(f"{key} {latencies[key]:8.2f}ms {change(latencies[key], previous_latencies[key])}" for key in ["p50", "p95", "p99"])
+        print(f"{operation:<16} {changes}")
+
+    for operation, throughputs in results["throughput_per_second"].items():
+        previous_throughputs = previous_results["throughput_per_second"].get(operation, {})
+
+        for concurrency, throughput in throughputs.items():
+            if concurrency in previous_throughputs:
+                print(f"{operation:<16} {concurrency:>3} threads {throughput:9.1f}/s {change(throughput, previous_throughputs[concurrency])}")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark geocoding over a synthetic TIGER dataset")
+    parser.add_argument("--dbname", default=BENCHMARK_DB_NAME, help="database the fixture is loaded into, it is dropped by --load-fixture")
+    parser.add_argument("--load-fixture", action="store_true", help="drop and create the benchmark database and load the fixture")
+    parser.add_argument("--calls", type=int, default=500, help="measured calls per operation and concurrency")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8], help="numbers of threads to measure throughput with")
+    parser.add_argument("--output", help="json file to write the results to, printed when not given")
+    parser.add_argument("--compare", help="json file of a previous run to compare the results with")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = parse_arguments()
+
+    if arguments.load_fixture:
+        create_fixture(arguments.dbname)
+    else:
+        use_database(arguments.dbname)
+
+    results = run_suite(arguments.calls, arguments.concurrency)
+
+    if arguments.output:
+        with open(arguments.output, "w") as f:
+            json.dump(results, f, indent=4, sort_keys=True)
+    else:
+        json.dump(results, sys.stdout, indent=4, sort_keys=True)
+        print()
+
+    if arguments.compare:
+        with open(arguments.compare) as f:
+            print_comparison(results, json.load(f))
@@ -0,0 +1,145 @@
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+
+
+# Default limits of GeocodeCache, ttl is in seconds
+CACHE_MAX_ENTRIES = 100_000
+CACHE_TTL = 24 * 60 * 60
+
+# Default size of the grid cells of ReverseGeocodeCache in meters
+REVERSE_CACHE_CELL_SIZE = 5
+
+METERS_PER_DEGREE_LATITUDE = 111_320
+
+REGEX_non_alphanumeric_pattern = re.compile("[^0-9A-Z]+")
+
+
+def normalize_address_key(address):
+    """
+    Returns a canonical form of address used as cache key, casing, punctuation and repeated whitespace are ignored
+    so "60 TEMPLE PL, BOSTON, MA" and "60 Temple Pl Boston MA" share the same key
+    """
+
+    return REGEX_non_alphanumeric_pattern.sub(" ", address.upper()).strip()
+
+
+def coordinates_key(latitude, longitude):
+    """
+    Returns the cache key of a coordinate pair, coordinates are rounded to 6 decimal places which is about 10 cm
+    """
+
+    return f"{latitude:.6f} {longitude:.6f}"
+
+
+class GeocodeCache:
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL):
+        """
+        Bounded in memory LRU cache for geocoding results with a time to live for every entry
+
+        Entries are stored per namespace so results of different query types never mix,
+        ttl=None keeps entries until they are evicted
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, namespace, key):
+        """
+        Returns the cached value or None when key is not cached or its entry has expired
+        """
+
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._entries[(namespace, key)]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end((namespace, key))
+            self.hits += 1
+            return value
+
+    def get_many(self, namespace, keys):
+        return [self.get(namespace, key) for key in keys]
+
+    def set(self, namespace, key, value):
+        expires_at = None if self.ttl is None else time.monotonic() + self.ttl
+
+        with self._lock:
+            self._entries[(namespace, key)] = (value, expires_at)
+            self._entries.move_to_end((namespace, key))
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def set_many(self, namespace, key_value_pairs):
+        for key, value in key_value_pairs:
+            self.set(namespace, key, value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """Returns a dictionary with the size of the cache and its hit, miss and eviction counters"""
+
+        lookups = self.hits + self.misses
+
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+def grid_cell_key(latitude, longitude, cell_size):
+    """
+    Returns the key of the grid cell of about cell_size x cell_size meters that contains the coordinates
+    """
+
+    latitude_step = cell_size / METERS_PER_DEGREE_LATITUDE
+    row = math.floor(latitude / latitude_step)
+
+    # A degree of longitude gets shorter towards the poles, using the latitude of the row keeps cells about cell_size wide
+    row_latitude = (row + 0.5) * latitude_step
+    longitude_step = latitude_step / max(math.cos(math.radians(row_latitude)), 1e-6)
+    column = math.floor(longitude / longitude_step)
+
+    return f"{row} {column}"
+
+
+class ReverseGeocodeCache(GeocodeCache):
+    def __init__(self, cell_size=REVERSE_CACHE_CELL_SIZE, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL):
+        """
+        Bounded LRU cache for reverse geocoding results that snaps coordinates to a grid of cell_size meters,
+        every point inside a cell reuses the result of the first point reverse geocoded in that cell
+        """
+        super().__init__(max_entries=max_entries, ttl=ttl)
+        self.cell_size = cell_size
+
+    def get_point(self, latitude, longitude):
+        return self.get("reverse", grid_cell_key(latitude, longitude, self.cell_size))
+
+    def set_point(self, latitude, longitude, street_data):
+        self.set("reverse", grid_cell_key(latitude, longitude, self.cell_size), street_data)
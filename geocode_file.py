@@ -0,0 +1,380 @@
+"""
+Geocodes a csv or parquet file of addresses in chunks and writes the results incrementally
+
+Every input column is kept and geocoded_address, latitude, longitude, rating and confidence are added (and stage with --cascade),
+a .parquet output is written as a directory of part files. Progress is checkpointed after every chunk
+so running the same command again after the job was killed resumes where it stopped
+
+python -m geocode_file addresses.csv geocoded.csv --address-column address
+python -m geocode_file addresses.parquet geocoded.parquet --chunk-size 10000
+python -m geocode_file addresses.csv geocoded.csv --processes 8 --chunk-size 100000
+"""
+
+import argparse
+import csv
+import json
+import os
+import time
+from pathlib import Path
+
+from geocoder import GEOCODE_BATCH_SIZE, Database
+from parallel_geocoder import SHARD_SIZE, ParallelGeocoder
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+# Number of rows read, geocoded and written between two checkpoints
+CHUNK_SIZE = 5000
+
+
+def is_parquet(file_path):
+    return Path(file_path).suffix.lower() == ".parquet"
+
+
+def require_pyarrow():
+    if pa is None:
+        raise Exception("pyarrow is required to read or write parquet files, install it with pip install pyarrow")
+
+
+def read_csv_chunks(file_path, chunk_size, skip_rows=0):
+    """
+    Yields lists of at most chunk_size rows as dictionaries, the first skip_rows rows are skipped
+    """
+
+    with open(file_path, newline="") as f:
+        chunk = []
+        for row_number, row in enumerate(csv.DictReader(f)):
+            if row_number < skip_rows:
+                continue
+
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+
+        if chunk:
+            yield chunk
+
+
+def read_parquet_chunks(file_path, chunk_size, skip_rows=0):
+    """
+    Yields lists of at most chunk_size rows as dictionaries, the first skip_rows rows are skipped
+    and row groups that are skipped completely are never read
+    """
+
+    require_pyarrow()
+    parquet_file = pq.ParquetFile(file_path)
+
+    row_groups = []
+    for row_group in range(parquet_file.num_row_groups):
+        number_of_rows = parquet_file.metadata.row_group(row_group).num_rows
+        if skip_rows >= number_of_rows:
+            skip_rows -= number_of_rows
+        else:
+            row_groups.append(row_group)
+
+    if not row_groups:
+        return
+
+    for batch in parquet_file.iter_batches(batch_size=chunk_size, row_groups=row_groups):
+        if skip_rows >= batch.num_rows:
+            skip_rows -= batch.num_rows
+            continue
+
+        rows = batch.slice(skip_rows).to_pylist()
+        skip_rows = 0
+        yield rows
+
+
+def read_chunks(file_path, chunk_size, skip_rows=0):
+    if is_parquet(file_path):
+        return read_parquet_chunks(file_path, chunk_size, skip_rows)
+
+    return read_csv_chunks(file_path, chunk_size, skip_rows)
+
+
+def geocode_rows(db, rows, address_column, state_column=None, **geocode_many_arguments):
+    """
+    Geocodes the address column of rows, with state_column the rows are geocoded state by state
+    and the search of every row is restricted to its state
+    """
+
+    if state_column is None:
+        return db.geocode_many([row[address_column] or "" for row in rows], **geocode_many_arguments)
+
+    indexes_by_state = {}
+    for index, row in enumerate(rows):
+        indexes_by_state.setdefault(row[state_column] or None, []).append(index)
+
+    geocoded_data_list = [None] * len(rows)
+    for state, indexes in indexes_by_state.items():
+        addresses = [rows[index][address_column] or "" for index in indexes]
+        for index, geocoded_data in zip(indexes, db.geocode_many(addresses, state=state, **geocode_many_arguments)):
+            geocoded_data_list[index] = geocoded_data
+
+    return geocoded_data_list
+
+
+def add_geocoded_data(rows, geocoded_data_list):
+    for row, geocoded_data in zip(rows, geocoded_data_list):
+        row["geocoded_address"] = geocoded_data.address
+        row["latitude"] = geocoded_data.latitude
+        row["longitude"] = geocoded_data.longitude
+        row["rating"] = geocoded_data.rating
+        row["confidence"] = geocoded_data.confidence.value
+
+        if geocoded_data.stage is not None:
+            row["stage"] = geocoded_data.stage
+
+    return rows
+
+
+class CsvWriter:
+    def __init__(self, file_path, output_bytes=None):
+        """
+        Appends rows to a csv file, output_bytes is the size of the file at the last checkpoint
+        and anything written after it is discarded, None starts a new file
+        """
+        self.file_path = file_path
+        self.writer = None
+
+        if output_bytes is None:
+            self.file = open(file_path, "w", newline="")
+            self.write_header = True
+        else:
+            self.file = open(file_path, "r+", newline="")
+            self.file.truncate(output_bytes)
+            self.file.seek(output_bytes)
+            self.write_header = False
+
+    def write(self, rows):
+        if self.writer is None:
+            self.writer = csv.DictWriter(self.file, fieldnames=list(rows[0].keys()))
+            if self.write_header:
+                self.writer.writeheader()
+
+        self.writer.writerows(rows)
+
+    def flush(self):
+        """Makes everything written so far durable and returns the state to store in the checkpoint"""
+
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return {'output_bytes': self.file.tell()}
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    def __init__(self, directory_path, parts=None):
+        """
+        Writes every chunk as a new part file in directory_path, parts is the number of part files at the last checkpoint
+        and part files written after it are deleted, None starts a new directory
+        """
+        require_pyarrow()
+        self.directory_path = Path(directory_path)
+        self.directory_path.mkdir(parents=True, exist_ok=True)
+        self.parts = parts or 0
+        self.schema = None
+
+        for part_file in self.directory_path.glob("part-*.parquet"):
+            if parts is None or int(part_file.stem.split("-")[1]) >= parts:
+                part_file.unlink()
+
+        if self.parts:
+            # Every part shares the schema of the first one so the directory can be read as one dataset
+            self.schema = pq.read_schema(self.part_file_path(0))
+
+    def part_file_path(self, part):
+        return self.directory_path / f"part-{part:05d}.parquet"
+
+    def write(self, rows):
+        if self.schema is None:
+            schema = pa.Table.from_pylist(rows).schema
+            # Columns that are empty in the first chunk have no type yet
+            fields = [pa.field(field.name, pa.string()) if pa.types.is_null(field.type) else field for field in schema]
+            self.schema = pa.schema(fields)
+            self.schema = self.schema.set(self.schema.get_field_index("latitude"), pa.field("latitude", pa.float64()))
+            self.schema = self.schema.set(self.schema.get_field_index("longitude"), pa.field("longitude", pa.float64()))
+            self.schema = self.schema.set(self.schema.get_field_index("rating"), pa.field("rating", pa.int32()))
+
+        pq.write_table(pa.Table.from_pylist(rows, schema=self.schema), self.part_file_path(self.parts))
+        self.parts += 1
+
+    def flush(self):
+        return {'parts': self.parts}
+
+    def close(self):
+        pass
+
+
+def read_checkpoint(checkpoint_path):
+    if not checkpoint_path.exists():
+        return None
+
+    with open(checkpoint_path) as f:
+        return json.load(f)
+
+
+def get_checkpoint_run(input_path, address_column, state_column, pagc_normalize_address, deduplicate, cascade):
+    """
+    Returns what is stored in the checkpoint about the run, a run only resumes a checkpoint of the same input file
+    geocoded with the same options as the rows already written would be geocoded differently otherwise
+    """
+
+    return {
+        'input_path': str(Path(input_path).resolve()),
+        'options': {
+            'address_column': address_column,
+            'state_column': state_column,
+            'pagc_normalize_address': pagc_normalize_address,
+            'deduplicate': deduplicate,
+            'cascade': cascade,
+        },
+    }
+
+
+def write_checkpoint(checkpoint_path, checkpoint):
+    # Writing to a temporary file and renaming it means a killed job never leaves a half written checkpoint
+    temporary_path = checkpoint_path.with_name(checkpoint_path.name + ".tmp")
+    with open(temporary_path, "w") as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(temporary_path, checkpoint_path)
+
+
+def geocode_file(
+    input_path,
+    output_path,
+    address_column="address",
+    state_column=None,
+    chunk_size=CHUNK_SIZE,
+    batch_size=GEOCODE_BATCH_SIZE,
+    pagc_normalize_address=False,
+    deduplicate=False,
+    cascade=False,
+    restart=False,
+    db=None,
+):
+    """
+    Geocodes every row of input_path and writes it to output_path, resuming from the checkpoint of a previous run
+    unless restart is True
+
+    db is anything with a geocode_many method like Database or parallel_geocoder.ParallelGeocoder
+    """
+
+    if db is None:
+        db = Database()
+
+    checkpoint_path = Path(f"{output_path}.checkpoint")
+    checkpoint = None if restart else read_checkpoint(checkpoint_path)
+    run = get_checkpoint_run(input_path, address_column, state_column, pagc_normalize_address, deduplicate, cascade)
+
+    # Checked before the writer is created so the output of the other run isnt truncated
+    if checkpoint is not None and (checkpoint.get("input_path"), checkpoint.get("options")) != (run["input_path"], run["options"]):
+        raise Exception(
+            f"{checkpoint_path} was written for {checkpoint.get('input_path')} with the options {checkpoint.get('options')}, "
+            f"not {run['input_path']} with {run['options']}, use --restart to start over"
+        )
+
+    if checkpoint is None:
+        rows_done = 0
+        writer = ParquetWriter(output_path) if is_parquet(output_path) else CsvWriter(output_path)
+    else:
+        rows_done = checkpoint["rows_done"]
+        print(f"Resuming after {rows_done} rows")
+        if is_parquet(output_path):
+            writer = ParquetWriter(output_path, checkpoint["parts"])
+        else:
+            writer = CsvWriter(output_path, checkpoint["output_bytes"])
+
+    start = time.perf_counter()
+    rows_this_run = 0
+
+    try:
+        for rows in read_chunks(input_path, chunk_size, skip_rows=rows_done):
+            geocoded_data_list = geocode_rows(
+                db,
+                rows,
+                address_column,
+                state_column,
+                pagc_normalize_address=pagc_normalize_address,
+                batch_size=batch_size,
+                deduplicate=deduplicate,
+                cascade=cascade,
+            )
+
+            writer.write(add_geocoded_data(rows, geocoded_data_list))
+            checkpoint = writer.flush()
+
+            rows_done += len(rows)
+            rows_this_run += len(rows)
+            checkpoint["rows_done"] = rows_done
+            checkpoint.update(run)
+            write_checkpoint(checkpoint_path, checkpoint)
+
+            elapsed = time.perf_counter() - start
+            if deduplicate:
+                print(f"{rows_done} rows geocoded - {rows_this_run / elapsed:.1f} rows/s - {db.get_deduplication_ratio():.1%} duplicates", end="\r")
+            else:
+                print(f"{rows_done} rows geocoded - {rows_this_run / elapsed:.1f} rows/s", end="\r")
+
+    finally:
+        writer.close()
+
+    print(f"\nDone - {rows_done} rows geocoded")
+
+    return rows_done
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Geocode a csv or parquet file of addresses")
+    parser.add_argument("input_path", help="csv or parquet file with an address column")
+    parser.add_argument("output_path", help="csv file or parquet directory to write, a .checkpoint file is kept next to it")
+    parser.add_argument("--address-column", default="address", help="name of the column with the address to geocode")
+    parser.add_argument("--state-column", help="name of a column with the state abbreviation, restricts the search of every row to its state")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="rows geocoded between two checkpoints")
+    parser.add_argument("--batch-size", type=int, default=GEOCODE_BATCH_SIZE, help="addresses sent to the server in one statement")
+    parser.add_argument("--pagc", action="store_true", help="normalize addresses with pagc_normalize_address before geocoding")
+    parser.add_argument("--cascade", action="store_true", help="geocode again with pagc_normalize_address only the rows without a good match")
+    parser.add_argument("--deduplicate", action="store_true", help="normalize every batch first and geocode each distinct normalized address once")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start from the first row")
+    parser.add_argument("--processes", type=int, default=1, help="worker processes, each chunk is sharded by state over them")
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE, help="addresses of one state a worker process geocodes in one task")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = parse_arguments()
+
+    if arguments.processes > 1:
+        db = ParallelGeocoder(arguments.processes, arguments.shard_size)
+    else:
+        db = Database()
+
+    try:
+        geocode_file(
+            arguments.input_path,
+            arguments.output_path,
+            address_column=arguments.address_column,
+            state_column=arguments.state_column,
+            chunk_size=arguments.chunk_size,
+            batch_size=arguments.batch_size,
+            pagc_normalize_address=arguments.pagc,
+            deduplicate=arguments.deduplicate,
+            cascade=arguments.cascade,
+            restart=arguments.restart,
+            db=db,
+        )
+
+    finally:
+        db.close()
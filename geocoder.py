@@ -1,25 +1,71 @@
+import asyncio
+import functools
+import itertools
+import math
 import os
+import re
+import threading
+import time
+from collections import deque, namedtuple
+from contextlib import contextmanager
 from enum import Enum
 
 import psycopg
 from dotenv import load_dotenv
+from psycopg_pool import AsyncConnectionPool, ConnectionPool
 
+from cache import coordinates_key, normalize_address_key
+from replicas import ReplicaRouter
 
-load_dotenv(".env")
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
-db_parameters = {
-    "host": os.getenv("DB_HOST"),
-    "port": os.getenv("DB_PORT"),
-    "dbname": os.getenv("DB_NAME"),
-    "user": os.getenv("DB_USER"),
-    "password": os.getenv("DB_PASSWORD"),
-    "autocommit": True,
-}
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+
+# Filled from .env by get_db_parameters the first time a Database or AsyncDatabase connects, not when geocoder is imported
+# or a Database is created, it is empty until then so read it through get_db_parameters() instead of directly
+db_parameters = {}
+
+
+def get_db_parameters():
+    """
+    Returns the connection parameters, .env is loaded the first time they are needed
+    """
+
+    if not db_parameters:
+        load_dotenv(".env")
+
+        db_parameters.update({
+            "host": os.getenv("DB_HOST"),
+            "port": os.getenv("DB_PORT"),
+            "dbname": os.getenv("DB_NAME"),
+            "user": os.getenv("DB_USER"),
+            "password": os.getenv("DB_PASSWORD"),
+            "autocommit": True,
+        })
+
+    return db_parameters
+
+
+def get_replica_dsns():
+    """
+    Returns the replicas of DB_REPLICAS in .env, a comma separated list of host:port or connection URIs
+    """
+
+    get_db_parameters()
+
+    return [replica.strip() for replica in os.getenv("DB_REPLICAS", "").split(",") if replica.strip()]
 
 
 def drop_and_create_new_database():
-    db_name = db_parameters["dbname"]
-    temp = db_parameters.copy()
+    db_name = get_db_parameters()["dbname"]
+    temp = get_db_parameters().copy()
     temp["dbname"] = "postgres"
     connection = psycopg.connect(**temp)
 
@@ -38,28 +84,718 @@ class GeocodingConfidence(Enum):
     EXCELLENT = "excellent"
     FAIR = "fair"
     POOR = "poor"
+    # Only the zip code or place of the address was located, at its centroid
+    LOCALITY = "locality"
     NO_MATCH = "no match"
 
 
+# Categories of the confidence column of columnar results, the column holds the position of the category in this list
+CONFIDENCE_CATEGORIES = [confidence.value for confidence in GeocodingConfidence]
+
+
+class GeocodeResult(namedtuple("GeocodeResult", ["address", "latitude", "longitude", "rating", "confidence", "stage", "timings"], defaults=[None, None])):
+    """
+    Result of geocoding one address, stage and timings are only set by the cascade mode
+
+    Fields can also be read by name like result["latitude"] as results used to be dictionaries
+    """
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            if key not in self._fields:
+                raise KeyError(key)
+            return getattr(self, key)
+
+        return super().__getitem__(key)
+
+    def to_dict(self):
+        """Returns the result as the dictionary the geocoding methods used to return"""
+
+        geocoded_data = self._asdict()
+        if self.stage is None:
+            del geocoded_data["stage"]
+            del geocoded_data["timings"]
+
+        return geocoded_data
+
+
+class ReverseGeocodeResult(namedtuple("ReverseGeocodeResult", ["street_1", "street_2", "street_3"])):
+    """
+    Result of reverse geocoding one point, fields can also be read by name like result["street_1"]
+    """
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            if key not in self._fields:
+                raise KeyError(key)
+            return getattr(self, key)
+
+        return super().__getitem__(key)
+
+    def to_dict(self):
+        return self._asdict()
+
+
+# Results are immutable so every failed lookup shares the same one
+NO_MATCH_RESULT = GeocodeResult(None, None, None, None, GeocodingConfidence.NO_MATCH)
+NO_STREET_RESULT = ReverseGeocodeResult(None, None, None)
+
+# Connection pool limits used by Database(pooled=True), max_idle is in seconds
+POOL_MIN_SIZE = 1
+POOL_MAX_SIZE = 10
+POOL_MAX_IDLE = 300
+
+# Number of geocode queries AsyncDatabase.geocode_all runs at the same time
+ASYNC_CONCURRENCY = 10
+
+# Geocoding queries are parameterized so they can be prepared once per connection and reused,
+# parameters are the address, max_results and the restrict_region geometry as EWKT or NULL
+GEOCODE_SQL = "SELECT pprint_addy(addy), ST_Y(geomout) As lat, ST_X(geomout) As lon, rating FROM geocode(%s, %s, ST_GeomFromEWKT(%s))"
+PAGC_GEOCODE_SQL = """
+    SELECT pprint_addy(addy), ST_Y(geomout) As lat, ST_X(geomout) As lon, rating
+    FROM geocode(pagc_normalize_address(%s), %s, ST_GeomFromEWKT(%s))"""
+
+# With Database(address_hits=True) geocoding goes through tiger_cache.geocode() of address_hits.py, it answers addresses
+# stored in tiger_cache.address_hits without calling geocode(), parameters are the same as the ones of GEOCODE_SQL
+ADDRESS_HITS_GEOCODE_SQL = "SELECT pprint, latitude, longitude, rating FROM tiger_cache.geocode(%s, %s, ST_GeomFromEWKT(%s), false)"
+ADDRESS_HITS_PAGC_GEOCODE_SQL = "SELECT pprint, latitude, longitude, rating FROM tiger_cache.geocode(%s, %s, ST_GeomFromEWKT(%s), true)"
+
+# Rows of an older TIGER year are overwritten with the result of the current one
+ADD_ADDRESS_HITS_SQL = """
+    INSERT INTO tiger_cache.address_hits(norm_key, pagc, tiger_year, pprint, latitude, longitude, rating)
+    SELECT t.norm_key, %s, tiger_cache.current_tiger_year(), t.pprint, t.latitude, t.longitude, t.rating
+    FROM unnest(%s::text[], %s::text[], %s::float8[], %s::float8[], %s::integer[]) AS t(norm_key, pprint, latitude, longitude, rating)
+    ON CONFLICT (norm_key, pagc) DO UPDATE
+    SET tiger_year = EXCLUDED.tiger_year, pprint = EXCLUDED.pprint, latitude = EXCLUDED.latitude,
+    longitude = EXCLUDED.longitude, rating = EXCLUDED.rating, updated_at = now()"""
+
+# In cascade mode results with a higher rating than this (POOR) or no match are geocoded again with pagc_normalize_address
+CASCADE_RATING_THRESHOLD = 50
+
+# Only the best candidate is used so by default the server stops after finding one
+GEOCODE_MAX_RESULTS = 1
+
+# Candidates Database.get_candidates asks geocode() for by default
+GEOCODE_CANDIDATES = 5
+
+# Rows fetched from a server side cursor per round trip, only this many are held in memory at a time
+CANDIDATES_FETCH_SIZE = 100
+
+# Candidates come back ranked by rating, the best one first
+GEOCODE_CANDIDATES_SQL = GEOCODE_SQL + " ORDER BY rating"
+PAGC_GEOCODE_CANDIDATES_SQL = PAGC_GEOCODE_SQL + " ORDER BY rating"
+
+# Addresses without a street, a zip code alone or a place and state with an optional zip code,
+# are answered from the centroids of tiger_data.locality_centroid instead of geocode(), the place text of an address
+# with a zip code has to be the place of the zip code as a street without a house number like "Main St, RI 02895" parses the same,
+# a zip code that crosses states or places has a row for each so they are ordered to always return the same one
+ZIP_ONLY_PATTERN = re.compile(r"^\s*(?P<zip>\d{5})(?:-\d{4})?\s*$")
+LOCALITY_PATTERN = re.compile(r"^\s*(?:(?P<place>[A-Za-z][A-Za-z .'-]*?)\s*,?\s+)?(?P<state>[A-Za-z]{2})\.?(?:\s*,?\s*(?P<zip>\d{5})(?:-\d{4})?)?\s*$")
+LOCALITY_ZIP_SQL = """
+    SELECT place, stusps, zip, latitude, longitude FROM tiger_data.locality_centroid
+    WHERE kind = 'zip' AND zip = %s AND (%s::text IS NULL OR stusps = upper(%s)) AND (%s::text IS NULL OR lower(place) = lower(%s))
+    ORDER BY stusps, place LIMIT 1"""
+LOCALITY_PLACE_SQL = """
+    SELECT place, stusps, zip, latitude, longitude FROM tiger_data.locality_centroid
+    WHERE kind = 'place' AND stusps = upper(%s) AND lower(place) = lower(%s) LIMIT 1"""
+
+# Looks up a batch of parsed (place, state, zip) addresses with one statement, every input gets one row back and the
+# centroid columns are NULL when it isnt in the table, only one of the two branches can match an input
+LOCALITY_MANY_SQL = """
+    SELECT l.ordinality, c.place, c.stusps, c.zip, c.latitude, c.longitude
+    FROM unnest(%s::text[], %s::text[], %s::text[]) WITH ORDINALITY AS l(place, state, zip, ordinality)
+    LEFT JOIN LATERAL (
+        (SELECT place, stusps, zip, latitude, longitude FROM tiger_data.locality_centroid
+        WHERE l.zip IS NOT NULL AND kind = 'zip' AND zip = l.zip AND (l.state IS NULL OR stusps = upper(l.state))
+        AND (l.place IS NULL OR lower(place) = lower(l.place)) ORDER BY stusps, place LIMIT 1)
+        UNION ALL
+        (SELECT place, stusps, zip, latitude, longitude FROM tiger_data.locality_centroid
+        WHERE l.zip IS NULL AND kind = 'place' AND stusps = upper(l.state) AND lower(place) = lower(l.place) LIMIT 1)
+    ) AS c ON true
+    ORDER BY l.ordinality"""
+
+# The regions are bounding boxes, a full state or county polygon would cost more to send with every query than pruning saves
+STATE_REGION_SQL = "SELECT ST_AsEWKT(ST_Envelope(the_geom)) FROM tiger_data.state_all WHERE stusps = upper(%s)"
+COUNTY_REGION_SQL = """
+    SELECT ST_AsEWKT(ST_Envelope(c.the_geom)) FROM tiger_data.county_all AS c
+    INNER JOIN tiger_data.state_all AS s ON s.statefp = c.statefp
+    WHERE s.stusps = upper(%s) AND (lower(c.name) = lower(%s) OR lower(c.namelsad) = lower(%s))"""
+ZIP_REGION_SQL = "SELECT ST_AsEWKT(ST_Envelope(ST_Collect(the_geom))) FROM tiger.edges WHERE zipl = %s"
+REVERSE_GEOCODE_SQL = """
+    SELECT pprint_addy(r.addy[1]) As st1, pprint_addy(r.addy[2]) As st2, pprint_addy(r.addy[3])
+    FROM reverse_geocode(ST_SetSRID(ST_MakePoint(%s, %s), 4269)) AS r"""
+
+# LEFT JOIN keeps points without any match so every input gets exactly one row back,
+# coordinates are sent as binary float8 arrays
+REVERSE_GEOCODE_MANY_SQL = """
+    SELECT p.ordinality, pprint_addy(r.addy[1]), pprint_addy(r.addy[2]), pprint_addy(r.addy[3])
+    FROM unnest(%b::float8[], %b::float8[]) WITH ORDINALITY AS p(latitude, longitude, ordinality)
+    LEFT JOIN LATERAL reverse_geocode(ST_SetSRID(ST_MakePoint(p.longitude, p.latitude), 4269)) AS r ON true
+    ORDER BY p.ordinality"""
+
+# Number of geocode statements Database.geocode_stream keeps in flight on its connection
+PIPELINE_WINDOW = 50
+
+# Number of addresses sent to the server in one statement by Database.geocode_many
+GEOCODE_BATCH_SIZE = 500
+
+# Number of coordinate pairs sent to the server in one statement by Database.reverse_geocode_many
+REVERSE_GEOCODE_BATCH_SIZE = 1000
+
+
+def get_confidence_from_rating(rating):
+    """
+    Converts the rating returned by geocode() into a GeocodingConfidence, lower ratings are better
+    """
+
+    if rating in {0, 1}:
+        return GeocodingConfidence.EXCELLENT
+    elif rating <= 50:
+        return GeocodingConfidence.FAIR
+    else:
+        return GeocodingConfidence.POOR
+
+
+def build_geocoded_data(result):
+    """
+    Builds the GeocodeResult returned by the geocoding methods from a (pprint_addy, lat, lon, rating) row,
+    result is None or its rating is None when geocoding failed
+    """
+
+    if result is None or result[3] is None:
+        return NO_MATCH_RESULT
+
+    # Converting the rating into a confidence score
+    return GeocodeResult(result[0], result[1], result[2], result[3], get_confidence_from_rating(result[3]))
+
+
+def parse_locality(address):
+    """
+    Returns (place, state, zip_code) of an address without a street, the ones it doesnt have are None,
+    or None when address has a street or only a state
+    """
+
+    match = ZIP_ONLY_PATTERN.match(address)
+    if match:
+        return None, None, match["zip"]
+
+    match = LOCALITY_PATTERN.match(address)
+    if match is None or not (match["place"] or match["zip"]):
+        return None
+
+    return match["place"], match["state"], match["zip"]
+
+
+def build_locality_data(result):
+    """
+    Builds the GeocodeResult of a (place, stusps, zip, latitude, longitude) row of tiger_data.locality_centroid,
+    its confidence is LOCALITY and it has no rating as no street was matched
+    """
+
+    place, stusps, zip_code, latitude, longitude = result
+    address = f"{place}, {stusps}" if place else stusps
+
+    if zip_code:
+        address = f"{address} {zip_code}"
+
+    return GeocodeResult(address, latitude, longitude, None, GeocodingConfidence.LOCALITY)
+
+
+def build_street_data(result):
+    """
+    Builds the ReverseGeocodeResult returned by the reverse geocoding methods from a (st1, st2, st3) row,
+    result is None when reverse geocoding failed
+    """
+
+    if result is None:
+        return NO_STREET_RESULT
+
+    return ReverseGeocodeResult(result[0], result[1], result[2])
+
+
+def build_geocode_columns(rows):
+    """
+    Builds columns from a list of (pprint_addy, lat, lon, rating) rows or GeocodeResults without creating an object per row
+
+    Returns a dictionary with the address, latitude, longitude, rating, confidence and matched columns, with numpy latitude
+    and longitude are float64 arrays with NaN, rating is an int32 array with -1 and confidence is an int8 array of positions
+    in CONFIDENCE_CATEGORIES, without numpy the columns are lists with None
+
+    LOCALITY results have no rating but are matched, their confidence stays LOCALITY
+    """
+
+    addresses = [row[0] for row in rows]
+    ratings = [row[3] for row in rows]
+    localities = [isinstance(row, GeocodeResult) and row.confidence == GeocodingConfidence.LOCALITY for row in rows]
+
+    if np is None:
+        confidences = [
+            CONFIDENCE_CATEGORIES.index(
+                GeocodingConfidence.LOCALITY.value if locality
+                else GeocodingConfidence.NO_MATCH.value if rating is None
+                else get_confidence_from_rating(rating).value
+            )
+            for rating, locality in zip(ratings, localities)
+        ]
+
+        return {
+            'address': addresses,
+            'latitude': [row[1] for row in rows],
+            'longitude': [row[2] for row in rows],
+            'rating': ratings,
+            'confidence': confidences,
+            'matched': [rating is not None or locality for rating, locality in zip(ratings, localities)],
+        }
+
+    # None becomes NaN in a float64 array
+    ratings = np.array(ratings, dtype=np.float64)
+    localities = np.array(localities, dtype=bool)
+    rated = ~np.isnan(ratings)
+    matched = rated | localities
+
+    confidences = np.select(
+        [localities, ~rated, ratings <= 1, ratings <= 50],
+        [
+            CONFIDENCE_CATEGORIES.index(GeocodingConfidence.LOCALITY.value),
+            CONFIDENCE_CATEGORIES.index(GeocodingConfidence.NO_MATCH.value),
+            CONFIDENCE_CATEGORIES.index(GeocodingConfidence.EXCELLENT.value),
+            CONFIDENCE_CATEGORIES.index(GeocodingConfidence.FAIR.value),
+        ],
+        CONFIDENCE_CATEGORIES.index(GeocodingConfidence.POOR.value),
+    ).astype(np.int8)
+
+    return {
+        'address': np.array(addresses, dtype=object),
+        'latitude': np.array([row[1] for row in rows], dtype=np.float64),
+        'longitude': np.array([row[2] for row in rows], dtype=np.float64),
+        'rating': np.where(rated, ratings, -1).astype(np.int32),
+        'confidence': confidences,
+        'matched': matched,
+    }
+
+
+def to_record_batch(columns):
+    """
+    Converts the columns of geocode_many(columnar=True) into a pyarrow RecordBatch that can be written to parquet directly,
+    addresses without a match are null, so is the rating of LOCALITY matches, and confidence is a dictionary column
+    with the GeocodingConfidence values
+    """
+
+    if pa is None:
+        raise Exception("pyarrow is required to build record batches, install it with pip install pyarrow")
+
+    not_matched = None if np is None else ~np.asarray(columns["matched"], dtype=bool)
+    not_rated = None if np is None else np.asarray(columns["rating"]) < 0
+
+    arrays = [
+        pa.array(columns["address"], type=pa.string()),
+        pa.array(columns["latitude"], type=pa.float64(), mask=not_matched),
+        pa.array(columns["longitude"], type=pa.float64(), mask=not_matched),
+        pa.array(columns["rating"], type=pa.int32(), mask=not_rated),
+        pa.DictionaryArray.from_arrays(pa.array(columns["confidence"], type=pa.int8()), pa.array(CONFIDENCE_CATEGORIES, type=pa.string())),
+    ]
+    names = ["address", "latitude", "longitude", "rating", "confidence"]
+
+    if "stage" in columns:
+        arrays.append(pa.array(columns["stage"], type=pa.string()))
+        names.append("stage")
+
+    return pa.RecordBatch.from_arrays(arrays, names=names)
+
+
+def is_better_geocoded_data(geocoded_data, other_geocoded_data):
+    """
+    Returns True when geocoded_data is a better match than other_geocoded_data, lower ratings are better
+    """
+
+    if geocoded_data.confidence == GeocodingConfidence.NO_MATCH:
+        return False
+
+    if other_geocoded_data.confidence == GeocodingConfidence.NO_MATCH:
+        return True
+
+    return geocoded_data.rating < other_geocoded_data.rating
+
+
+def needs_pagc_fallback(geocoded_data, rating_threshold):
+    # pagc_normalize_address doesnt change how an address without a street is parsed
+    if geocoded_data.confidence == GeocodingConfidence.LOCALITY:
+        return False
+
+    return geocoded_data.confidence == GeocodingConfidence.NO_MATCH or geocoded_data.rating > rating_threshold
+
+
+def get_cache_namespace(pagc_normalize_address=None, region_key=None):
+    # Every query type and region has its own cache space as they can geocode the same address differently
+    namespace = "pagc" if pagc_normalize_address else "default"
+
+    if region_key:
+        namespace = f"{namespace} {region_key}"
+
+    return namespace
+
+
+def chunks(iterable, size):
+    """
+    Yields lists of at most size items from iterable without materializing the whole iterable
+    """
+
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+def get_geocode_many_sql(pagc_normalize_address=False, address_hits=False):
+    """
+    Returns the statement geocoding an array of addresses with one row per address in input order,
+    parameters are the addresses and the restrict_region geometry as EWKT or NULL
+
+    With address_hits=True the addresses go through tiger_cache.geocode() and the rows also have
+    whether they came from tiger_cache.address_hits and the normalized address key
+    """
+
+    if address_hits:
+        return f"""
+            SELECT g.pprint, g.latitude, g.longitude, g.rating, g.cached, g.norm_key
+            FROM unnest(%s::text[]) WITH ORDINALITY AS a(address, ordinality)
+            LEFT JOIN LATERAL tiger_cache.geocode(a.address, 1, ST_GeomFromEWKT(%s), {'true' if pagc_normalize_address else 'false'}) AS g ON true
+            ORDER BY a.ordinality"""
+
+    if pagc_normalize_address:
+        geocode_function = "geocode(pagc_normalize_address(a.address), 1, ST_GeomFromEWKT(%s))"
+    else:
+        geocode_function = "geocode(a.address, 1, ST_GeomFromEWKT(%s))"
+
+    # LEFT JOIN keeps addresses without any match so every input gets exactly one row back, rating is NULL for them
+    return f"""
+        SELECT pprint_addy(g.addy), ST_Y(g.geomout) As lat, ST_X(g.geomout) As lon, g.rating
+        FROM unnest(%s::text[]) WITH ORDINALITY AS a(address, ordinality)
+        LEFT JOIN LATERAL {geocode_function} AS g ON true
+        ORDER BY a.ordinality"""
+
+
+def get_candidates_many_sql(pagc_normalize_address=False):
+    """
+    Returns the statement geocoding an array of addresses with a row per candidate, ordered by input position and rating,
+    parameters are the addresses, max_results and the restrict_region geometry as EWKT or NULL
+    """
+
+    if pagc_normalize_address:
+        geocode_function = "geocode(pagc_normalize_address(a.address), %s, ST_GeomFromEWKT(%s))"
+    else:
+        geocode_function = "geocode(a.address, %s, ST_GeomFromEWKT(%s))"
+
+    # Addresses without any candidate have no rows
+    return f"""
+        SELECT a.ordinality, pprint_addy(g.addy), ST_Y(g.geomout) As lat, ST_X(g.geomout) As lon, g.rating
+        FROM unnest(%s::text[]) WITH ORDINALITY AS a(address, ordinality)
+        INNER JOIN LATERAL {geocode_function} AS g ON true
+        ORDER BY a.ordinality, g.rating"""
+
+
+def build_geocoded_data_many(results):
+    # Cached GeocodeResults are already built
+    return [result if isinstance(result, GeocodeResult) else build_geocoded_data(result) for result in results]
+
+
+def get_result_confidences(result):
+    """
+    Returns the confidence value of every row of a geocoding or reverse geocoding result for GeocoderMetrics,
+    reverse geocoding rows are "match" or "no match"
+    """
+
+    if isinstance(result, GeocodeResult):
+        return [result.confidence.value]
+
+    if isinstance(result, ReverseGeocodeResult):
+        return ["no match" if result.street_1 is None else "match"]
+
+    if isinstance(result, list):
+        return [geocoded_data.confidence.value for geocoded_data in result]
+
+    # Columns of geocode_many(columnar=True) and reverse_geocode_many
+    if "confidence" in result:
+        return [CONFIDENCE_CATEGORIES[confidence] for confidence in result["confidence"]]
+
+    return ["match" if matched else "no match" for matched in result["matched"]]
+
+
+def measured(operation):
+    """
+    Decorator recording the latency, result confidences and errors of a method in self.metrics when it is set,
+    without metrics the only overhead is checking the attribute
+    """
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self.metrics is None:
+                return method(self, *args, **kwargs)
+
+            return self.metrics.call(operation, get_result_confidences, method, self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+async def iterate_async(iterable):
+    for item in iterable:
+        yield item
+
+
+async def aenumerate(async_iterable):
+    index = 0
+    async for item in async_iterable:
+        yield index, item
+        index += 1
+
+
 class Database:
-    def __init__(self):
-        """Interface to database"""
-        # print(db_parameters)
-        self.connection = psycopg.connect(**db_parameters)
+    def __init__(
+        self,
+        pooled=False,
+        min_size=POOL_MIN_SIZE,
+        max_size=POOL_MAX_SIZE,
+        max_idle=POOL_MAX_IDLE,
+        prepare=True,
+        cache=None,
+        reverse_cache=None,
+        metrics=None,
+        replicas=None,
+        routing="round_robin",
+        address_hits=False,
+    ):
+        """
+        Interface to database
 
-        version = -1
-        with self.connection.cursor() as cursor:
-            data = cursor.execute("SELECT current_setting('server_version');").fetchone()
-            version = float(data[0])
+        By default a single connection is opened, with pooled=True connections are borrowed from a bounded pool
+        for every query so the same object can be shared by multiple threads
 
-        if version < 15:
-            print(version)
-            raise Exception("Use postgresql 15 or new")
-            exit()
+        Geocoding queries are prepared on the server the first time they run on a connection and reused after that,
+        pass prepare=False when connecting through a pooler that doesnt support prepared statements like pgbouncer in transaction mode
+
+        cache is an optional cache.GeocodeCache or persistent_cache.PersistentGeocodeCache, repeated addresses and coordinates
+        are answered from it without calling geocode() or reverse_geocode()
+
+        reverse_cache is an optional cache.ReverseGeocodeCache, reverse_geocode uses it instead of cache and reuses the result
+        of any point in the same grid cell
+
+        metrics is an optional metrics.GeocoderMetrics that records the latency, confidences and errors of the geocoding calls
+        and reads the pool and cache stats
+
+        Nothing is opened here, the connection or pool is opened and the server version checked by the first query
+        so short lived workers that never query dont pay for a connection
+
+        replicas is a list of read replicas of the primary as host:port, connection strings or dictionaries, DB_REPLICAS of .env
+        by default. Geocoding and reverse geocoding queries are routed over them with routing "round_robin" or "least_outstanding",
+        see replicas.ReplicaRouter, while execute and get_connection always use the primary
+
+        With address_hits=True geocoding reads through the tiger_cache.address_hits table of address_hits.py, which has to be
+        created first, and geocode_many writes the addresses it geocoded into it so every client of the database reuses them
+        """
+        self.single_connection = None
+        self.pool = None
+        self.pooled = pooled
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.connected = False
+        self.connect_lock = threading.Lock()
+
+        # None reads DB_REPLICAS of .env on the first geocoding query, the router is created by open_replicas then
+        self.replicas = replicas
+        self.routing = routing
+        self.replica_router = None
+        self.replicas_opened = False
+        self.prepare = prepare
+        self.cache = cache
+        self.reverse_cache = reverse_cache
+        self.metrics = metrics
+        self.address_hits = address_hits
+        # restrict_region geometries by (state, county, zip_code), looked up once per process
+        self.regions = {}
+        # turned off when tiger_data.locality_centroid wasnt created by the loader
+        self.locality_lookup = True
+        # server side cursors of get_candidates need names that are unique on their connection
+        self.cursor_ids = itertools.count()
+        # rows normalized and distinct normalized addresses geocoded by geocode_many(deduplicate=True)
+        self.deduplication_stats = {'rows': 0, 'distinct': 0}
+        # addresses geocoded and seconds spent by every stage of the cascade mode
+        self.cascade_stats = {
+            'default': {'addresses': 0, 'seconds': 0.0},
+            'pagc': {'addresses': 0, 'seconds': 0.0},
+        }
+        # pooled Database objects are shared by threads, += on the stats isnt atomic
+        self.stats_lock = threading.Lock()
+
+        if metrics is not None:
+            self.add_metrics_gauges()
+
+    def connect(self):
+        """
+        Opens the connection or the pool and checks the server version, does nothing when it is already open
+
+        .env is read here the first time
+        """
+
+        if self.connected:
+            return
+
+        # Threads sharing a pooled Database can make their first query at the same time
+        with self.connect_lock:
+            if self.connected:
+                return
+
+            if not self.pooled:
+                connection = psycopg.connect(**get_db_parameters())
+            else:
+                # check_connection runs a health check on every checkout and replaces broken connections
+                self.pool = ConnectionPool(
+                    kwargs=get_db_parameters(),
+                    min_size=self.min_size,
+                    max_size=self.max_size,
+                    max_idle=self.max_idle,
+                    check=ConnectionPool.check_connection,
+                    open=False,
+                )
+                self.pool.open()
+                connection = self.pool.getconn()
+
+            try:
+                data = connection.execute("SELECT current_setting('server_version');").fetchone()
+                version = float(data[0])
+
+            finally:
+                if self.pool is not None:
+                    self.pool.putconn(connection)
+
+            if version < 15:
+                print(version)
+                self.close_connection(connection)
+                raise Exception("Use postgresql 15 or new")
+
+            self.single_connection = connection if self.pool is None else None
+            self.connected = True
+
+    def close_connection(self, connection):
+        if self.pool is None:
+            connection.close()
+        else:
+            self.pool.close()
+
+    @property
+    def connection(self):
+        """
+        The connection of a Database without a pool, opened on first use
+        """
+
+        self.connect()
+        return self.single_connection
+
+    def get_pool_stats(self):
+        if self.pool is None:
+            return {}
+
+        return {key.removeprefix("pool_"): value for key, value in self.pool.get_stats().items()}
+
+    def get_replica_stats(self):
+        return self.replica_router.stats() if self.replica_router is not None else {}
+
+    def add_metrics_gauges(self):
+        # The pool and the replica router are only created by the first query so the gauges are empty until then
+        if self.pooled:
+            self.metrics.add_gauges("pool", self.get_pool_stats)
+
+        if self.cache is not None:
+            self.metrics.add_gauges("cache", self.cache.stats)
+
+        if self.reverse_cache is not None:
+            self.metrics.add_gauges("reverse_cache", self.reverse_cache.stats)
+
+        if self.replicas is None or self.replicas:
+            self.metrics.add_gauges("replicas", self.get_replica_stats)
+
+    @contextmanager
+    def get_connection(self):
+        """
+        Yields the connection to run queries on, in pooled mode a connection is borrowed from the pool
+        and returned to it when the block ends
+        """
+
+        self.connect()
+
+        if self.pool is None:
+            yield self.single_connection
+        else:
+            with self.pool.connection() as connection:
+                yield connection
+
+    @contextmanager
+    def get_read_connection(self):
+        """
+        Yields the connection to run a read only geocoding query on, of a replica when there are replicas
+        and of the primary like get_connection otherwise
+        """
+
+        self.open_replicas()
+
+        if self.replica_router is None:
+            with self.get_connection() as connection:
+                yield connection
+            return
+
+        with self.replica_router.connection(self.get_connection) as connection:
+            yield connection
+
+    def open_replicas(self):
+        """
+        Creates and opens the replica router the first time, with the replicas of DB_REPLICAS when replicas werent given,
+        replica_router stays None without replicas
+        """
+
+        if self.replicas_opened:
+            return
+
+        with self.connect_lock:
+            if self.replicas_opened:
+                return
+
+            replicas = self.replicas if self.replicas is not None else get_replica_dsns()
+            if replicas:
+                self.replica_router = ReplicaRouter(replicas, get_db_parameters(), self.routing, self.min_size, self.max_size, self.max_idle)
+                self.replica_router.open()
+
+            self.replicas_opened = True
+
+    def close(self):
+        """Closes the connection or the pool and all its connections, nothing happens when no query was made"""
+
+        # A closed router cant be reopened, open_replicas creates a new one
+        if self.replica_router is not None:
+            self.replica_router.close()
+            self.replica_router = None
+        self.replicas_opened = False
+
+        if not self.connected:
+            return
+
+        self.close_connection(self.single_connection)
+        self.connected = False
 
     def execute(self, query, parameters=None):
         try:
-            with self.connection.cursor() as cursor:
+            with self.get_connection() as connection, connection.cursor() as cursor:
                 cursor.execute(query, parameters)
 
         except psycopg.errors.UniqueViolation as e:
@@ -72,90 +808,918 @@ class Database:
             print(query)
             raise e
 
-    def get_geocoded_data(self, address, pagc_normalize_address=None):
+    def get_cached_geocoded_data(self, address, pagc_normalize_address=None, region_key=None):
         """
-        Tries to geocode given address and returns a dictionary containing the geocoded information
-        if geocoding was successful
+        Returns the cached GeocodeResult of address, or None when there is no cache or address is not cached
         """
 
-        result = None
-        geocoded_data = {
-            'address': None,
-            'latitude': None,
-            'longitude': None,
-            'rating': None,
-            'confidence': GeocodingConfidence.NO_MATCH,
-        }
+        return self.get_cached_geocoded_data_many([address], pagc_normalize_address, region_key)[0]
 
-        if pagc_normalize_address:
-            sql_query = "SELECT pprint_addy(addy), ST_Y(geomout) As lat, ST_X(geomout) As lon, rating FROM geocode(pagc_normalize_address(%s))"
+    def get_cached_geocoded_data_many(self, addresses, pagc_normalize_address=None, region_key=None):
+        """
+        Looks up a list of addresses in the cache with one call and returns a list with the cached GeocodeResult
+        or None for every address
+        """
+
+        if self.cache is None:
+            return [None] * len(addresses)
+
+        namespace = get_cache_namespace(pagc_normalize_address, region_key)
+        # Results are immutable so they are shared with the cache instead of copied
+        return self.cache.get_many(namespace, [normalize_address_key(address) for address in addresses])
+
+    def set_cached_geocoded_data(self, address, geocoded_data, pagc_normalize_address=None, region_key=None):
+        self.set_cached_geocoded_data_many([(address, geocoded_data)], pagc_normalize_address, region_key)
+
+    def set_cached_geocoded_data_many(self, address_geocoded_data_pairs, pagc_normalize_address=None, region_key=None):
+        if self.cache is None:
+            return
+
+        namespace = get_cache_namespace(pagc_normalize_address, region_key)
+        self.cache.set_many(namespace, [(normalize_address_key(address), geocoded_data) for address, geocoded_data in address_geocoded_data_pairs])
+
+    def get_region(self, state=None, county=None, zip_code=None):
+        """
+        Returns (region_key, region) where region is the EWKT of the bounding box of the most specific of zip_code, county and state,
+        it is looked up in tiger_data.state_all, tiger_data.county_all or the edges of the zip code the first time and cached after that
+
+        Both are None when nothing is given, region is None when the state, county or zip code is not in the loaded data
+        so the search isnt restricted
+        """
+
+        if zip_code:
+            region_key = f"zip {zip_code}"
+            sql_query = ZIP_REGION_SQL
+            parameters = [zip_code]
+
+        elif county:
+            if not state:
+                raise ValueError("county can only be used together with state")
+
+            region_key = f"county {state.upper()} {county.lower()}"
+            sql_query = COUNTY_REGION_SQL
+            parameters = [state, county, county]
+
+        elif state:
+            region_key = f"state {state.upper()}"
+            sql_query = STATE_REGION_SQL
+            parameters = [state]
 
         else:
-            sql_query = "SELECT pprint_addy(addy), ST_Y(geomout) As lat, ST_X(geomout) As lon, rating FROM geocode(%s)"
+            return None, None
+
+        if region_key not in self.regions:
+            try:
+                with self.get_read_connection() as connection, connection.cursor() as cursor:
+                    cursor.execute(sql_query, parameters)
+                    result = cursor.fetchone()
+
+            except psycopg.Error as e:
+                raise e
+
+            self.regions[region_key] = result[0] if result else None
+
+        return region_key, self.regions[region_key]
+
+    @measured("geocode")
+    def get_geocoded_data(
+        self,
+        address,
+        pagc_normalize_address=None,
+        max_results=GEOCODE_MAX_RESULTS,
+        state=None,
+        county=None,
+        zip_code=None,
+        cascade=False,
+        cascade_rating_threshold=CASCADE_RATING_THRESHOLD,
+        locality=True,
+    ):
+        """
+        Tries to geocode given address and returns a GeocodeResult with the geocoded information,
+        its confidence is NO_MATCH when geocoding failed
+
+        Addresses without a street like "02895", "RI 02895" or "Boston, MA" are answered with the centroid of the zip code
+        or place from tiger_data.locality_centroid and LOCALITY confidence without calling geocode(), locality=False turns this off
+
+        max_results is the number of candidates geocode() builds before the best one is picked, when the state, county
+        or zip code of the address is already known passing it restricts the search to that region which is much faster
+
+        With cascade=True the address is geocoded without pagc_normalize_address first and only geocoded again with it
+        when there is no match or the rating is above cascade_rating_threshold, the result then also has the stage
+        that answered ("default" or "pagc") and timings with the seconds spent in every stage that ran
+        """
+
+        if cascade:
+            timings = {}
+
+            start = time.perf_counter()
+            geocoded_data = self.get_geocoded_data(address, False, max_results, state, county, zip_code, locality=locality)
+            timings["default"] = time.perf_counter() - start
+            stage = "default"
+
+            self.add_cascade_stats("default", 1, timings["default"])
+
+            if needs_pagc_fallback(geocoded_data, cascade_rating_threshold):
+                start = time.perf_counter()
+                pagc_geocoded_data = self.get_geocoded_data(address, True, max_results, state, county, zip_code, locality=locality)
+                timings["pagc"] = time.perf_counter() - start
+
+                self.add_cascade_stats("pagc", 1, timings["pagc"])
+
+                if is_better_geocoded_data(pagc_geocoded_data, geocoded_data):
+                    geocoded_data = pagc_geocoded_data
+                    stage = "pagc"
+
+            return geocoded_data._replace(stage=stage, timings=timings)
+
+        if locality and self.locality_lookup:
+            geocoded_data = self.get_locality_data(address)
+            if geocoded_data is not None:
+                return geocoded_data
+
+        region_key, region = self.get_region(state, county, zip_code)
+
+        geocoded_data = self.get_cached_geocoded_data(address, pagc_normalize_address, region_key)
+        if geocoded_data is not None:
+            return geocoded_data
+
+        result = None
+
+        sql_query = self.get_geocode_sql(pagc_normalize_address)
 
         try:
-            with self.connection.cursor() as cursor:
+            with self.get_read_connection() as connection, connection.cursor() as cursor:
                 cursor.execute(
                     sql_query,
-                    [address],
+                    [address, max_results, region],
+                    prepare=self.prepare,
                 )
                 result = cursor.fetchone()
 
         except psycopg.Error as e:
             raise e
 
-        if result:
-            address = result[0]
-            rating = result[3]
-            latitude = result[1]
-            longitude = result[2]
-
-            # Converting the rating into a confidence score
-            if rating in {0, 1}:
-                confidence = GeocodingConfidence.EXCELLENT
-            elif rating <= 50:
-                confidence = GeocodingConfidence.FAIR
+        geocoded_data = build_geocoded_data(result)
+        self.set_cached_geocoded_data(address, geocoded_data, pagc_normalize_address, region_key)
+
+        return geocoded_data
+
+    def add_cascade_stats(self, stage, addresses, seconds):
+        with self.stats_lock:
+            self.cascade_stats[stage]["addresses"] += addresses
+            self.cascade_stats[stage]["seconds"] += seconds
+
+    def get_locality_data(self, address):
+        """
+        Returns the LOCALITY GeocodeResult of an address without a street from tiger_data.locality_centroid,
+        None when address has a street or its zip code or place isnt in the table
+
+        Text before the state of an address with a zip code is only accepted when it is the place of the zip code,
+        anything else like a street without a house number goes to geocode()
+        """
+
+        locality = parse_locality(address)
+        if locality is None:
+            return None
+
+        place, state, zip_code = locality
+
+        if zip_code:
+            sql_query = LOCALITY_ZIP_SQL
+            parameters = [zip_code, state, state, place, place]
+        else:
+            sql_query = LOCALITY_PLACE_SQL
+            parameters = [state, place]
+
+        try:
+            with self.get_read_connection() as connection, connection.cursor() as cursor:
+                cursor.execute(sql_query, parameters, prepare=self.prepare)
+                result = cursor.fetchone()
+
+        except psycopg.errors.UndefinedTable:
+            print("tiger_data.locality_centroid doesnt exist, load the states again to answer addresses without a street from it")
+            self.locality_lookup = False
+            return None
+
+        if result is None:
+            return None
+
+        return build_locality_data(result)
+
+    def get_locality_data_many(self, addresses):
+        """
+        Returns a list with the LOCALITY GeocodeResult of every address without a street like get_locality_data
+        or None for the others, the addresses without a street are looked up with one statement
+        """
+
+        localities = [parse_locality(address) for address in addresses]
+        locality_indexes = [index for index, locality in enumerate(localities) if locality is not None]
+
+        locality_data_list = [None] * len(addresses)
+        if not locality_indexes:
+            return locality_data_list
+
+        places, states, zip_codes = (list(column) for column in zip(*(localities[index] for index in locality_indexes)))
+
+        try:
+            with self.get_read_connection() as connection, connection.cursor() as cursor:
+                cursor.execute(LOCALITY_MANY_SQL, [places, states, zip_codes], prepare=self.prepare)
+                results = cursor.fetchall()
+
+        except psycopg.errors.UndefinedTable:
+            print("tiger_data.locality_centroid doesnt exist, load the states again to answer addresses without a street from it")
+            self.locality_lookup = False
+            return locality_data_list
+
+        for index, result in zip(locality_indexes, results):
+            # The centroid columns are NULL when the zip code or place isnt in the table
+            if result[5] is not None:
+                locality_data_list[index] = build_locality_data(result[1:])
+
+        return locality_data_list
+
+    def get_geocode_sql(self, pagc_normalize_address=None):
+        if self.address_hits:
+            return ADDRESS_HITS_PAGC_GEOCODE_SQL if pagc_normalize_address else ADDRESS_HITS_GEOCODE_SQL
+
+        return PAGC_GEOCODE_SQL if pagc_normalize_address else GEOCODE_SQL
+
+    @measured("geocode_many")
+    def geocode_many(
+        self,
+        addresses,
+        pagc_normalize_address=False,
+        batch_size=GEOCODE_BATCH_SIZE,
+        state=None,
+        county=None,
+        zip_code=None,
+        deduplicate=False,
+        cascade=False,
+        cascade_rating_threshold=CASCADE_RATING_THRESHOLD,
+        columnar=False,
+        locality=True,
+    ):
+        """
+        Geocodes a sequence of addresses with one statement per batch instead of one round trip per address
+        and returns a list of GeocodeResults like get_geocoded_data, in input order
+
+        Addresses without a street are answered from tiger_data.locality_centroid with LOCALITY confidence like in
+        get_geocoded_data, with one more statement per batch that has any, locality=False turns this off
+
+        state, county and zip_code restrict the search for every address of the batch like in get_geocoded_data,
+        with deduplicate=True every batch is normalized first and each distinct normalized address is geocoded once
+
+        With cascade=True only the addresses of a batch the default query didnt match well enough are geocoded again
+        with pagc_normalize_address, every result has the stage that answered it and cascade_stats the time spent per stage
+
+        With columnar=True the rows are returned as the columns of build_geocode_columns without building a result per row,
+        to_record_batch turns them into a pyarrow RecordBatch
+        """
+
+        if cascade:
+            geocoded_data_list = []
+            arguments = {'batch_size': batch_size, 'state': state, 'county': county, 'zip_code': zip_code, 'deduplicate': deduplicate, 'locality': locality}
+
+            for batch in chunks(addresses, batch_size):
+                start = time.perf_counter()
+                batch_geocoded_data = self.geocode_many(batch, False, **arguments)
+                self.add_cascade_stats("default", len(batch), time.perf_counter() - start)
+
+                batch_geocoded_data = [geocoded_data._replace(stage="default") for geocoded_data in batch_geocoded_data]
+
+                fallback_indexes = [index for index, geocoded_data in enumerate(batch_geocoded_data) if needs_pagc_fallback(geocoded_data, cascade_rating_threshold)]
+
+                if fallback_indexes:
+                    start = time.perf_counter()
+                    fallback_geocoded_data = self.geocode_many([batch[index] for index in fallback_indexes], True, **arguments)
+                    self.add_cascade_stats("pagc", len(fallback_indexes), time.perf_counter() - start)
+
+                    for index, pagc_geocoded_data in zip(fallback_indexes, fallback_geocoded_data):
+                        if is_better_geocoded_data(pagc_geocoded_data, batch_geocoded_data[index]):
+                            batch_geocoded_data[index] = pagc_geocoded_data._replace(stage="pagc")
+
+                geocoded_data_list.extend(batch_geocoded_data)
+
+            if columnar:
+                columns = build_geocode_columns(geocoded_data_list)
+                columns["stage"] = [geocoded_data.stage for geocoded_data in geocoded_data_list]
+                return columns
+
+            return geocoded_data_list
+
+        region_key, region = self.get_region(state, county, zip_code)
+
+        # (pprint_addy, lat, lon, rating) rows from the server or GeocodeResults from the cache
+        rows = []
+
+        for batch in chunks(addresses, batch_size):
+            if locality and self.locality_lookup:
+                batch_rows = self.get_locality_data_many(batch)
+            else:
+                batch_rows = [None] * len(batch)
+
+            # Addresses without a street were answered from the centroids, the others are looked up in the cache
+            street_indexes = [index for index, row in enumerate(batch_rows) if row is None]
+            cached_rows = self.get_cached_geocoded_data_many([batch[index] for index in street_indexes], pagc_normalize_address, region_key)
+            for index, row in zip(street_indexes, cached_rows):
+                batch_rows[index] = row
+
+            # Only addresses that are not cached are sent to the server
+            missing_indexes = [index for index in street_indexes if batch_rows[index] is None]
+
+            if missing_indexes:
+                missing_addresses = [batch[index] for index in missing_indexes]
+
+                if deduplicate:
+                    missing_rows = self.query_geocode_many_deduplicated(missing_addresses, pagc_normalize_address, region)
+                else:
+                    missing_rows = self.query_geocode_many(missing_addresses, pagc_normalize_address, region)
+
+                if self.cache is not None:
+                    missing_rows = build_geocoded_data_many(missing_rows)
+                    self.set_cached_geocoded_data_many(zip(missing_addresses, missing_rows), pagc_normalize_address, region_key)
+
+                for index, row in zip(missing_indexes, missing_rows):
+                    batch_rows[index] = row
+
+            rows.extend(batch_rows)
+
+        if columnar:
+            return build_geocode_columns(rows)
+
+        return build_geocoded_data_many(rows)
+
+    def query_geocode_many(self, addresses, pagc_normalize_address=False, region=None):
+        """
+        Geocodes a list of addresses with a single statement and returns a list of (pprint_addy, lat, lon, rating) rows
+        in input order, all four are None for addresses without a match
+        """
+
+        try:
+            with self.get_read_connection() as connection, connection.cursor() as cursor:
+                cursor.execute(get_geocode_many_sql(pagc_normalize_address, self.address_hits), [list(addresses), region], prepare=self.prepare)
+                rows = cursor.fetchall()
+
+        except psycopg.Error as e:
+            raise e
+
+        if self.address_hits:
+            # Restricted searches can find another best match so they dont replace the hit of the unrestricted search
+            if region is None:
+                self.add_address_hits(rows, pagc_normalize_address)
+            return [row[:4] for row in rows]
+
+        return rows
+
+    def add_address_hits(self, rows, pagc_normalize_address=False):
+        """
+        Writes the matched rows of a tiger_cache.geocode() batch that didnt come from tiger_cache.address_hits into it,
+        on the primary as replicas are read only
+        """
+
+        # ON CONFLICT cant update the same row twice in one statement so only one row of a key is kept
+        new_rows = {row[5]: row for row in rows if row[4] is False and row[3] is not None}
+        if not new_rows:
+            return
+
+        columns = list(zip(*new_rows.values()))
+
+        try:
+            with self.get_connection() as connection, connection.cursor() as cursor:
+                cursor.execute(
+                    ADD_ADDRESS_HITS_SQL,
+                    [bool(pagc_normalize_address), list(new_rows.keys()), list(columns[0]), list(columns[1]), list(columns[2]), list(columns[3])],
+                    prepare=self.prepare,
+                )
+
+        except psycopg.Error as e:
+            raise e
+
+    def query_geocode_many_deduplicated(self, addresses, pagc_normalize_address=False, region=None):
+        """
+        Normalizes a list of addresses with one statement, geocodes every distinct normalized address once with a second one
+        and returns the (pprint_addy, lat, lon, rating) rows in input order like query_geocode_many, the rows seen
+        and distinct addresses geocoded are added to deduplication_stats
+        """
+
+        normalize_function = "pagc_normalize_address" if pagc_normalize_address else "normalize_address"
+
+        # The text form of norm_addy is the grouping key and is cast back to norm_addy to geocode it
+        normalize_sql_query = f"""
+            SELECT a.ordinality, n::text
+            FROM unnest(%s::text[]) WITH ORDINALITY AS a(address, ordinality), LATERAL {normalize_function}(a.address) AS n
+            ORDER BY a.ordinality"""
+
+        geocode_sql_query = """
+            SELECT pprint_addy(g.addy), ST_Y(g.geomout) As lat, ST_X(g.geomout) As lon, g.rating
+            FROM unnest(%s::text[]) WITH ORDINALITY AS d(addy, ordinality)
+            LEFT JOIN LATERAL geocode(d.addy::norm_addy, 1, ST_GeomFromEWKT(%s)) AS g ON true
+            ORDER BY d.ordinality"""
+
+        # The normalized addresses are already the keys of tiger_cache.address_hits
+        if self.address_hits:
+            geocode_sql_query = f"""
+                SELECT g.pprint, g.latitude, g.longitude, g.rating, g.cached, g.norm_key
+                FROM unnest(%s::text[]) WITH ORDINALITY AS d(addy, ordinality)
+                LEFT JOIN LATERAL tiger_cache.geocode_key(d.addy, 1, ST_GeomFromEWKT(%s), {'true' if pagc_normalize_address else 'false'}) AS g ON true
+                ORDER BY d.ordinality"""
+
+        try:
+            with self.get_read_connection() as connection, connection.cursor() as cursor:
+                cursor.execute(normalize_sql_query, [list(addresses)], prepare=self.prepare)
+                normalized_addresses = [result[1] for result in cursor.fetchall()]
+
+                # dict keeps the first position of every normalized address
+                distinct_normalized_addresses = list(dict.fromkeys(normalized_addresses))
+
+                cursor.execute(geocode_sql_query, [distinct_normalized_addresses, region], prepare=self.prepare)
+                results = cursor.fetchall()
+
+        except psycopg.Error as e:
+            raise e
+
+        if self.address_hits:
+            if region is None:
+                self.add_address_hits(results, pagc_normalize_address)
+            results = [result[:4] for result in results]
+
+        rows_by_normalized_address = dict(zip(distinct_normalized_addresses, results))
+
+        with self.stats_lock:
+            self.deduplication_stats["rows"] += len(normalized_addresses)
+            self.deduplication_stats["distinct"] += len(distinct_normalized_addresses)
+
+        # Rows are tuples so duplicates can share the same one
+        return [rows_by_normalized_address[normalized_address] for normalized_address in normalized_addresses]
+
+    def get_candidates(
+        self,
+        address,
+        max_results=GEOCODE_CANDIDATES,
+        pagc_normalize_address=None,
+        state=None,
+        county=None,
+        zip_code=None,
+        fetch_size=CANDIDATES_FETCH_SIZE,
+    ):
+        """
+        Generator yielding up to max_results ranked candidates of address as GeocodeResults, the best one first,
+        nothing is yielded when there is no match
+
+        Candidates are read from a server side cursor fetch_size rows at a time so only those are held in memory,
+        the cursor runs in a transaction that keeps the connection busy until the generator is exhausted or closed
+        """
+
+        region_key, region = self.get_region(state, county, zip_code)
+
+        if pagc_normalize_address:
+            sql_query = PAGC_GEOCODE_CANDIDATES_SQL
+
+        else:
+            sql_query = GEOCODE_CANDIDATES_SQL
+
+        yield from self.fetch_candidates(sql_query, [address, max_results, region], fetch_size)
+
+    def get_candidates_many(
+        self,
+        addresses,
+        max_results=GEOCODE_CANDIDATES,
+        pagc_normalize_address=False,
+        batch_size=GEOCODE_BATCH_SIZE,
+        state=None,
+        county=None,
+        zip_code=None,
+        fetch_size=CANDIDATES_FETCH_SIZE,
+    ):
+        """
+        Generator yielding (input_index, candidate) pairs for the candidates of every address of any iterable,
+        in input order and ranked by rating per address, addresses without a match have no pairs
+
+        Addresses are sent in batches of batch_size with one statement each and the candidates are read from a server side
+        cursor fetch_size rows at a time, so memory doesnt grow with the number of addresses or max_results
+        """
+
+        region_key, region = self.get_region(state, county, zip_code)
+        sql_query = get_candidates_many_sql(pagc_normalize_address)
+        offset = 0
+
+        for batch in chunks(addresses, batch_size):
+            for row in self.fetch_candidates(sql_query, [batch, max_results, region], fetch_size, with_ordinality=True):
+                # ordinality starts at 1 in every batch
+                yield offset + row[0] - 1, build_geocoded_data(row[1:])
+
+            offset += len(batch)
+
+    def fetch_candidates(self, sql_query, parameters, fetch_size, with_ordinality=False):
+        """
+        Runs sql_query on a named server side cursor and yields GeocodeResults, or the raw rows with_ordinality=True
+        """
+
+        try:
+            # Server side cursors only live inside a transaction and the connections are in autocommit mode
+            with self.get_read_connection() as connection, connection.transaction():
+                with connection.cursor(name=f"geocode_candidates_{next(self.cursor_ids)}") as cursor:
+                    cursor.itersize = fetch_size
+                    cursor.execute(sql_query, parameters)
+
+                    for row in cursor:
+                        yield row if with_ordinality else build_geocoded_data(row)
+
+        except psycopg.Error as e:
+            raise e
+
+    def get_deduplication_ratio(self):
+        """
+        Returns the share of rows geocode_many(deduplicate=True) didnt have to geocode because they normalized to an address
+        already geocoded in the same batch
+        """
+
+        with self.stats_lock:
+            rows, distinct = self.deduplication_stats["rows"], self.deduplication_stats["distinct"]
+
+        if not rows:
+            return 0.0
+
+        return 1 - distinct / rows
+
+    def geocode_stream(self, addresses, window=PIPELINE_WINDOW, pagc_normalize_address=None, state=None, county=None, zip_code=None):
+        """
+        Generator that geocodes addresses from any iterable over a single connection in pipeline mode,
+        keeping up to window statements in flight, and yields the GeocodeResults in input order
+
+        Only window results are held in memory at a time, in pooled mode the connection is borrowed
+        until the generator is exhausted or closed, the latency metrics record the time every address spent in the pipeline
+        """
+
+        region_key, region = self.get_region(state, county, zip_code)
+
+        sql_query = self.get_geocode_sql(pagc_normalize_address)
+
+        # Holds (address, cursor, start) for queries sent to the server and (address, geocoded_data, start) for cache hits
+        in_flight = deque()
+
+        def get_result(address, cursor_or_geocoded_data, start):
+            if isinstance(cursor_or_geocoded_data, GeocodeResult):
+                geocoded_data = cursor_or_geocoded_data
+
             else:
-                confidence = GeocodingConfidence.POOR
+                # fetchone waits for this statement while the newer ones keep running on the server
+                with cursor_or_geocoded_data as cursor:
+                    geocoded_data = build_geocoded_data(cursor.fetchone())
 
-            geocoded_data["address"] = address
-            geocoded_data["latitude"] = latitude
-            geocoded_data["longitude"] = longitude
-            geocoded_data["rating"] = rating
-            geocoded_data["confidence"] = confidence
+                self.set_cached_geocoded_data(address, geocoded_data, pagc_normalize_address, region_key)
 
-        return geocoded_data
+            if self.metrics is not None:
+                self.metrics.observe("geocode_stream", time.perf_counter() - start, [geocoded_data.confidence.value])
 
+            return geocoded_data
+
+        try:
+            with self.get_read_connection() as connection, connection.pipeline():
+                for address in addresses:
+                    start = time.perf_counter()
+                    geocoded_data = self.get_cached_geocoded_data(address, pagc_normalize_address, region_key)
+
+                    if geocoded_data is None:
+                        cursor = connection.cursor()
+                        cursor.execute(sql_query, [address, GEOCODE_MAX_RESULTS, region], prepare=self.prepare)
+                        in_flight.append((address, cursor, start))
+                    else:
+                        in_flight.append((address, geocoded_data, start))
+
+                    if len(in_flight) >= window:
+                        yield get_result(*in_flight.popleft())
+
+                while in_flight:
+                    yield get_result(*in_flight.popleft())
+
+        except psycopg.Error as e:
+            if self.metrics is not None:
+                self.metrics.observe_error("geocode_stream", 0.0, e)
+            raise e
+
+    @measured("reverse_geocode")
     def reverse_geocode(self, latutude, longitude):
         """
-        Tries to reverse geocode given coordinates and returns a dictionary containing matched streets
-        if reverse geocoding was successful
+        Tries to reverse geocode given coordinates and returns a ReverseGeocodeResult with the matched streets,
+        they are None when reverse geocoding failed
         """
 
+        if self.reverse_cache is not None:
+            street_data = self.reverse_cache.get_point(latutude, longitude)
+            if street_data is not None:
+                return street_data
+
+        elif self.cache is not None:
+            street_data = self.cache.get("reverse", coordinates_key(latutude, longitude))
+            if street_data is not None:
+                return street_data
+
         result = None
-        street_data = {
-            'street_1': None,
-            'street_2': None,
-            'street_3': None,
-        }
 
-        # dont use this query in production, use parametrized version as this query is vulnerable to sql injection
-        sql_query = f"""
-            SELECT pprint_addy(r.addy[1]) As st1, pprint_addy(r.addy[2]) As st2, pprint_addy(r.addy[3])
-            FROM reverse_geocode(ST_GeomFromText('POINT({longitude} {latutude})')) AS r"""
         try:
-            with self.connection.cursor() as cursor:
+            with self.get_read_connection() as connection, connection.cursor() as cursor:
                 cursor.execute(
-                    sql_query,
+                    REVERSE_GEOCODE_SQL,
+                    [longitude, latutude],
+                    prepare=self.prepare,
                 )
                 result = cursor.fetchone()
 
         except psycopg.Error as e:
             raise e
 
-        if result:
-            street_data['street_1'] = result[0]
-            street_data['street_2'] = result[1]
-            street_data['street_3'] = result[2]
+        street_data = build_street_data(result)
+
+        if self.reverse_cache is not None:
+            self.reverse_cache.set_point(latutude, longitude, street_data)
+
+        elif self.cache is not None:
+            self.cache.set("reverse", coordinates_key(latutude, longitude), street_data)
+
+        return street_data
+
+    @measured("reverse_geocode_many")
+    def reverse_geocode_many(self, latitudes, longitudes, batch_size=REVERSE_GEOCODE_BATCH_SIZE):
+        """
+        Reverse geocodes arrays or sequences of latitudes and longitudes with one statement per batch, coordinates are sent
+        as binary float8 arrays
+
+        Returns a dictionary of columns aligned to the input, street_1, street_2 and street_3 hold the matched streets or None
+        and matched is True where a street was found, columns are numpy arrays when numpy is installed and lists otherwise
+        """
+
+        if np is not None:
+            latitudes = np.asarray(latitudes, dtype=np.float64).tolist()
+            longitudes = np.asarray(longitudes, dtype=np.float64).tolist()
+        else:
+            latitudes = [float(latitude) for latitude in latitudes]
+            longitudes = [float(longitude) for longitude in longitudes]
+
+        if len(latitudes) != len(longitudes):
+            raise ValueError("latitudes and longitudes must have the same length")
+
+        number_of_points = len(latitudes)
+        street_1 = [None] * number_of_points
+        street_2 = [None] * number_of_points
+        street_3 = [None] * number_of_points
+
+        # NaN and infinite coordinates cant match anything so they are never sent
+        valid_indexes = [index for index in range(number_of_points) if math.isfinite(latitudes[index]) and math.isfinite(longitudes[index])]
+
+        for batch_indexes in chunks(valid_indexes, batch_size):
+            batch_latitudes = [latitudes[index] for index in batch_indexes]
+            batch_longitudes = [longitudes[index] for index in batch_indexes]
+
+            try:
+                with self.get_read_connection() as connection, connection.cursor(binary=True) as cursor:
+                    cursor.execute(REVERSE_GEOCODE_MANY_SQL, [batch_latitudes, batch_longitudes], prepare=self.prepare)
+                    results = cursor.fetchall()
+
+            except psycopg.Error as e:
+                raise e
+
+            for index, result in zip(batch_indexes, results):
+                street_1[index] = result[1]
+                street_2[index] = result[2]
+                street_3[index] = result[3]
+
+        matched = [street is not None for street in street_1]
+
+        if np is not None:
+            return {
+                'street_1': np.array(street_1, dtype=object),
+                'street_2': np.array(street_2, dtype=object),
+                'street_3': np.array(street_3, dtype=object),
+                'matched': np.array(matched, dtype=bool),
+            }
+
+        return {
+            'street_1': street_1,
+            'street_2': street_2,
+            'street_3': street_3,
+            'matched': matched,
+        }
+
+
+class AsyncDatabase:
+    def __init__(self, min_size=POOL_MIN_SIZE, max_size=POOL_MAX_SIZE, max_idle=POOL_MAX_IDLE, prepare=True, metrics=None):
+        """
+        Asyncio interface to database, queries run on connections borrowed from an async pool
+
+        The pool is opened by open() or by using the object as an async context manager,
+        metrics is an optional metrics.GeocoderMetrics like in Database
+        """
+        self.prepare = prepare
+        self.metrics = metrics
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.pool = None
+
+        if metrics is not None:
+            metrics.add_gauges("pool", self.get_pool_stats)
+
+    def get_pool_stats(self):
+        if self.pool is None:
+            return {}
+
+        return {key.removeprefix("pool_"): value for key, value in self.pool.get_stats().items()}
+
+    async def open(self):
+        """
+        Creates and opens the pool, .env is read here the first time
+        """
+
+        self.pool = AsyncConnectionPool(
+            kwargs=get_db_parameters(),
+            min_size=self.min_size,
+            max_size=self.max_size,
+            max_idle=self.max_idle,
+            check=AsyncConnectionPool.check_connection,
+            open=False,
+        )
+        await self.pool.open()
+
+        version = -1
+        async with self.pool.connection() as connection:
+            cursor = await connection.execute("SELECT current_setting('server_version');")
+            data = await cursor.fetchone()
+            version = float(data[0])
+
+        if version < 15:
+            await self.pool.close()
+            raise Exception("Use postgresql 15 or new")
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def get_geocoded_data(self, address, pagc_normalize_address=None, max_results=GEOCODE_MAX_RESULTS):
+        """
+        Tries to geocode given address and returns a GeocodeResult with the geocoded information,
+        its confidence is NO_MATCH when geocoding failed
+        """
+
+        result = None
+
+        if pagc_normalize_address:
+            sql_query = PAGC_GEOCODE_SQL
+
+        else:
+            sql_query = GEOCODE_SQL
+
+        start = time.perf_counter()
+
+        try:
+            async with self.pool.connection() as connection, connection.cursor() as cursor:
+                await cursor.execute(sql_query, [address, max_results, None], prepare=self.prepare)
+                result = await cursor.fetchone()
+
+        except psycopg.Error as e:
+            if self.metrics is not None:
+                self.metrics.observe_error("geocode", time.perf_counter() - start, e)
+            raise e
+
+        geocoded_data = build_geocoded_data(result)
+
+        if self.metrics is not None:
+            self.metrics.observe("geocode", time.perf_counter() - start, get_result_confidences(geocoded_data))
+
+        return geocoded_data
+
+    async def reverse_geocode(self, latitude, longitude):
+        """
+        Tries to reverse geocode given coordinates and returns a ReverseGeocodeResult with the matched streets,
+        they are None when reverse geocoding failed
+        """
+
+        result = None
+
+        start = time.perf_counter()
+
+        try:
+            async with self.pool.connection() as connection, connection.cursor() as cursor:
+                await cursor.execute(REVERSE_GEOCODE_SQL, [longitude, latitude], prepare=self.prepare)
+                result = await cursor.fetchone()
+
+        except psycopg.Error as e:
+            if self.metrics is not None:
+                self.metrics.observe_error("reverse_geocode", time.perf_counter() - start, e)
+            raise e
+
+        street_data = build_street_data(result)
+
+        if self.metrics is not None:
+            self.metrics.observe("reverse_geocode", time.perf_counter() - start, get_result_confidences(street_data))
 
         return street_data
+
+    async def geocode_many(self, addresses, pagc_normalize_address=False):
+        """
+        Geocodes a list of addresses with a single statement and returns a list of GeocodeResults
+        like get_geocoded_data, in input order
+        """
+
+        start = time.perf_counter()
+
+        try:
+            async with self.pool.connection() as connection, connection.cursor() as cursor:
+                await cursor.execute(get_geocode_many_sql(pagc_normalize_address), [list(addresses), None], prepare=self.prepare)
+                results = await cursor.fetchall()
+
+        except psycopg.Error as e:
+            if self.metrics is not None:
+                self.metrics.observe_error("geocode_many", time.perf_counter() - start, e)
+            raise e
+
+        geocoded_data_list = build_geocoded_data_many(results)
+
+        if self.metrics is not None:
+            self.metrics.observe("geocode_many", time.perf_counter() - start, get_result_confidences(geocoded_data_list))
+
+        return geocoded_data_list
+
+    async def reverse_geocode_many(self, coordinates):
+        """
+        Reverse geocodes a list of (latitude, longitude) pairs with a single statement and returns a list of ReverseGeocodeResults
+        like reverse_geocode, in input order, pairs that arent finite numbers are not sent and get no match
+        """
+
+        valid_indexes = [index for index, (latitude, longitude) in enumerate(coordinates) if math.isfinite(latitude) and math.isfinite(longitude)]
+        street_data_list = [NO_STREET_RESULT] * len(coordinates)
+
+        if not valid_indexes:
+            return street_data_list
+
+        start = time.perf_counter()
+
+        try:
+            async with self.pool.connection() as connection, connection.cursor(binary=True) as cursor:
+                await cursor.execute(
+                    REVERSE_GEOCODE_MANY_SQL,
+                    [[float(coordinates[index][0]) for index in valid_indexes], [float(coordinates[index][1]) for index in valid_indexes]],
+                    prepare=self.prepare,
+                )
+                results = await cursor.fetchall()
+
+        except psycopg.Error as e:
+            if self.metrics is not None:
+                self.metrics.observe_error("reverse_geocode_many", time.perf_counter() - start, e)
+            raise e
+
+        for index, result in zip(valid_indexes, results):
+            street_data_list[index] = build_street_data(result[1:] if result[1] is not None else None)
+
+        if self.metrics is not None:
+            confidences = ["no match" if street_data.street_1 is None else "match" for street_data in street_data_list]
+            self.metrics.observe("reverse_geocode_many", time.perf_counter() - start, confidences)
+
+        return street_data_list
+
+    async def geocode_all(self, addresses, concurrency=ASYNC_CONCURRENCY, pagc_normalize_address=None):
+        """
+        Geocodes addresses from an iterable or async iterable with at most concurrency queries in flight
+        and yields (index, geocoded_data) tuples as they finish, index is the position of the address in the input
+        """
+
+        semaphore = asyncio.Semaphore(concurrency)
+        pending = set()
+
+        async def geocode(index, address):
+            try:
+                return index, await self.get_geocoded_data(address, pagc_normalize_address)
+            finally:
+                semaphore.release()
+
+        if hasattr(addresses, "__aiter__"):
+            indexed_addresses = aenumerate(addresses)
+        else:
+            indexed_addresses = aenumerate(iterate_async(addresses))
+
+        try:
+            async for index, address in indexed_addresses:
+                # Waiting for a free slot keeps memory bounded by concurrency for any input size
+                await semaphore.acquire()
+                pending.add(asyncio.ensure_future(geocode(index, address)))
+
+                done = {task for task in pending if task.done()}
+                pending -= done
+                for task in done:
+                    yield task.result()
+
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+
+        finally:
+            for task in pending:
+                task.cancel()
@@ -0,0 +1,232 @@
+import math
+import threading
+import time
+from collections import Counter
+
+
+# Upper bounds in seconds of the latency histogram buckets, percentiles are interpolated inside a bucket
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.002, 0.003, 0.005, 0.0075, 0.01, 0.015, 0.02, 0.03, 0.05, 0.075,
+    0.1, 0.15, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 3, 5, 7.5, 10, 15, 30, 60,
+)
+
+
+class LatencyHistogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """
+        Fixed bucket latency histogram, memory and the cost of an observation dont depend on the number of observations
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        # Buckets are few and short calls are the most common so a linear scan is as fast as bisect here
+        for index, upper_bound in enumerate(self.buckets):
+            if seconds <= upper_bound:
+                break
+        else:
+            index = len(self.buckets)
+
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q):
+        """
+        Returns an estimate of the q quantile (0 to 1) in seconds, None when nothing was observed
+        """
+
+        if not self.count:
+            return None
+
+        rank = q * self.count
+        cumulative = 0
+
+        for index, count in enumerate(self.counts):
+            if cumulative + count >= rank and count:
+                lower_bound = self.buckets[index - 1] if index else 0.0
+                # The largest observation is a tighter bound than the bucket the largest observations fell in
+                upper_bound = min(self.buckets[index], self.max) if index < len(self.buckets) else self.max
+                return lower_bound + (upper_bound - lower_bound) * (rank - cumulative) / count
+
+            cumulative += count
+
+        return self.max
+
+
+class GeocoderMetrics:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """
+        Collects latency histograms, result counts by confidence and error counts of the geocoding calls of a Database,
+        pass it as Database(metrics=...) and read it with summary() or to_prometheus()
+
+        Callbacks added with add_callback are called after every recorded call with (operation, seconds, confidences, error)
+        to forward the measurements to another metrics system, error is None for calls that succeeded
+        """
+        self.buckets = buckets
+        self.histograms = {}
+        self.rows = Counter()
+        self.confidences = Counter()
+        self.errors = Counter()
+        self.callbacks = []
+        # functions returning a dictionary of current values, evaluated when the metrics are read
+        self.gauges = {}
+
+        self.lock = threading.Lock()
+        # Depth of measured calls of the current thread, only the outermost call is recorded
+        self.local = threading.local()
+
+    def add_callback(self, callback):
+        self.callbacks.append(callback)
+
+    def add_gauges(self, name, function):
+        """
+        Registers a function returning a dictionary of numbers, every item is exported as the geocoder_<name>_<key> gauge
+        """
+
+        self.gauges[name] = function
+
+    def observe(self, operation, seconds, confidences=()):
+        """
+        Records one call of operation that took seconds and returned results with the given confidences
+        """
+
+        with self.lock:
+            histogram = self.histograms.get(operation)
+            if histogram is None:
+                histogram = self.histograms[operation] = LatencyHistogram(self.buckets)
+
+            histogram.observe(seconds)
+            self.rows[operation] += len(confidences)
+            for confidence in confidences:
+                self.confidences[(operation, confidence)] += 1
+
+        for callback in self.callbacks:
+            callback(operation, seconds, confidences, None)
+
+    def observe_error(self, operation, seconds, error):
+        with self.lock:
+            self.errors[(operation, type(error).__name__)] += 1
+
+        for callback in self.callbacks:
+            callback(operation, seconds, (), error)
+
+    def call(self, operation, get_confidences, function, *args, **kwargs):
+        """
+        Calls function and records its latency and the confidences get_confidences returns for its result,
+        calls made while another call is measured on the same thread are not recorded again
+        """
+
+        if getattr(self.local, "depth", 0):
+            return function(*args, **kwargs)
+
+        self.local.depth = 1
+        start = time.perf_counter()
+
+        try:
+            result = function(*args, **kwargs)
+
+        except Exception as e:
+            self.observe_error(operation, time.perf_counter() - start, e)
+            raise
+
+        finally:
+            self.local.depth = 0
+
+        self.observe(operation, time.perf_counter() - start, get_confidences(result))
+
+        return result
+
+    def read_gauges(self):
+        values = {}
+
+        for name, function in self.gauges.items():
+            for key, value in function().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    values[f"geocoder_{name}_{key}"] = value
+
+        return values
+
+    def summary(self):
+        """
+        Returns a dictionary with the calls, rows, p50, p95, p99, mean and max latency in seconds, confidences and errors
+        of every operation and the current gauge values
+        """
+
+        with self.lock:
+            operations = {}
+
+            for operation, histogram in self.histograms.items():
+                operations[operation] = {
+                    'calls': histogram.count,
+                    'rows': self.rows[operation],
+                    'p50': histogram.percentile(0.50),
+                    'p95': histogram.percentile(0.95),
+                    'p99': histogram.percentile(0.99),
+                    'mean': histogram.sum / histogram.count,
+                    'max': histogram.max,
+                    'confidences': {},
+                    'errors': {},
+                }
+
+            for (operation, confidence), count in self.confidences.items():
+                operations[operation]["confidences"][confidence] = count
+
+            for (operation, error), count in self.errors.items():
+                operations.setdefault(operation, {'calls': 0, 'rows': 0, 'confidences': {}, 'errors': {}})
+                operations[operation]["errors"][error] = count
+
+        return {'operations': operations, 'gauges': self.read_gauges()}
+
+    def to_prometheus(self, openmetrics=False):
+        """
+        Returns the metrics in the Prometheus text exposition format, or the OpenMetrics format with openmetrics=True
+        """
+
+        # OpenMetrics names counter families without the _total suffix of their samples
+        def counter_family(name):
+            return name[: -len("_total")] if openmetrics else name
+
+        lines = [
+            "# HELP geocoder_call_duration_seconds Latency of geocoder calls",
+            "# TYPE geocoder_call_duration_seconds histogram",
+        ]
+
+        with self.lock:
+            for operation, histogram in sorted(self.histograms.items()):
+                cumulative = 0
+                for upper_bound, count in zip(self.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f'geocoder_call_duration_seconds_bucket{{operation="{operation}",le="{upper_bound}"}} {cumulative}')
+
+                lines.append(f'geocoder_call_duration_seconds_bucket{{operation="{operation}",le="+Inf"}} {histogram.count}')
+                lines.append(f'geocoder_call_duration_seconds_sum{{operation="{operation}"}} {histogram.sum}')
+                lines.append(f'geocoder_call_duration_seconds_count{{operation="{operation}"}} {histogram.count}')
+
+            lines.append(f"# HELP {counter_family('geocoder_rows_total')} Addresses or coordinates geocoded")
+            lines.append(f"# TYPE {counter_family('geocoder_rows_total')} counter")
+            for operation, count in sorted(self.rows.items()):
+                lines.append(f'geocoder_rows_total{{operation="{operation}"}} {count}')
+
+            lines.append(f"# HELP {counter_family('geocoder_results_total')} Results by confidence, reverse geocoding results are match or no match")
+            lines.append(f"# TYPE {counter_family('geocoder_results_total')} counter")
+            for (operation, confidence), count in sorted(self.confidences.items()):
+                lines.append(f'geocoder_results_total{{operation="{operation}",confidence="{confidence}"}} {count}')
+
+            lines.append(f"# HELP {counter_family('geocoder_errors_total')} Calls that raised an exception")
+            lines.append(f"# TYPE {counter_family('geocoder_errors_total')} counter")
+            for (operation, error), count in sorted(self.errors.items()):
+                lines.append(f'geocoder_errors_total{{operation="{operation}",error="{error}"}} {count}')
+
+        for name, value in sorted(self.read_gauges().items()):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value if math.isfinite(value) else 'NaN'}")
+
+        if openmetrics:
+            lines.append("# EOF")
+
+        return "\n".join(lines) + "\n"
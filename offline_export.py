@@ -0,0 +1,303 @@
+"""
+Exports the streets of a loaded state, tiger_data.<st>_edges with their featnames names, place names and addr house number
+ranges, into a directory of .npy arrays the offline geocoders load or memory map without a database
+
+Strings are one utf-8 buffer with offsets and the house number ranges are indexed by sorted fixed width "STREET|ZIP" keys,
+so every array can be memory mapped and searched in place by any number of processes
+
+python -m offline_export exports RI MA       writes exports/ri and exports/ma
+"""
+
+import argparse
+import json
+import re
+import time
+from pathlib import Path
+
+import psycopg
+
+from geocoder import Database
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Changed whenever the arrays change so an old export isnt read wrongly
+EXPORT_FORMAT_VERSION = 2
+
+# Columns of the edge_strings array, positions in the strings table or -1 when the edge doesnt have the value
+EDGE_STRING_COLUMNS = ["predir", "name", "suftype", "sufdir", "location_left", "location_right", "zip_left", "zip_right"]
+
+# Side column of the ranges array
+LEFT_SIDE = 0
+RIGHT_SIDE = 1
+
+# USPS abbreviations of the street types and directions written out most often, the street keys of the export and of
+# the addresses looked up in it are built with them so "North Main Street" and "N Main St" share a key
+STREET_ABBREVIATIONS = {
+    'NORTH': "N", 'SOUTH': "S", 'EAST': "E", 'WEST': "W",
+    'NORTHEAST': "NE", 'NORTHWEST': "NW", 'SOUTHEAST': "SE", 'SOUTHWEST': "SW",
+    'ALLEY': "ALY", 'AVENUE': "AVE", 'AV': "AVE", 'BOULEVARD': "BLVD", 'CIRCLE': "CIR", 'COURT': "CT", 'COVE': "CV",
+    'CROSSING': "XING", 'DRIVE': "DR", 'EXPRESSWAY': "EXPY", 'EXTENSION': "EXT", 'FREEWAY': "FWY", 'HIGHWAY': "HWY",
+    'HILL': "HL", 'LANE': "LN", 'LOOP': "LOOP", 'PARKWAY': "PKWY", 'PIKE': "PIKE", 'PLACE': "PL", 'PLAZA': "PLZ",
+    'POINT': "PT", 'ROAD': "RD", 'ROUTE': "RTE", 'SQUARE': "SQ", 'STREET': "ST", 'TERRACE': "TER", 'TRAIL': "TRL",
+    'TURNPIKE': "TPKE", 'WAY': "WAY",
+}
+
+REGEX_street_separator_pattern = re.compile(r"[^0-9A-Z]+")
+
+# Rows fetched from the server side cursors of the export per round trip
+EXPORT_FETCH_SIZE = 10_000
+
+# Every road edge with a name, its first linestring as little endian WKB and the place or county subdivision on both sides,
+# the primary featnames row is preferred over alternative names
+EXPORT_EDGES_SQL = """
+    SELECT e.tlid, ST_AsBinary(ST_Force2D(ST_GeometryN(e.the_geom, 1)), 'NDR'),
+    f.predirabrv, f.name, f.suftypabrv, f.sufdirabrv,
+    COALESCE(pl.name, cl.name), COALESCE(pr.name, cr.name), e.zipl, e.zipr
+    FROM tiger_data.{abbr}_edges AS e
+    INNER JOIN LATERAL (
+        SELECT fn.predirabrv, fn.name, fn.suftypabrv, fn.sufdirabrv FROM tiger_data.{abbr}_featnames AS fn
+        WHERE fn.tlid = e.tlid AND fn.name IS NOT NULL ORDER BY fn.paflag = 'P' DESC LIMIT 1
+    ) AS f ON true
+    LEFT JOIN tiger_data.{abbr}_faces AS fl ON fl.tfid = e.tfidl
+    LEFT JOIN tiger_data.{abbr}_place AS pl ON pl.statefp = fl.statefp AND pl.placefp = fl.placefp
+    LEFT JOIN tiger_data.{abbr}_cousub AS cl ON cl.statefp = fl.statefp AND cl.countyfp = fl.countyfp AND cl.cousubfp = fl.cousubfp
+    LEFT JOIN tiger_data.{abbr}_faces AS fr ON fr.tfid = e.tfidr
+    LEFT JOIN tiger_data.{abbr}_place AS pr ON pr.statefp = fr.statefp AND pr.placefp = fr.placefp
+    LEFT JOIN tiger_data.{abbr}_cousub AS cr ON cr.statefp = fr.statefp AND cr.countyfp = fr.countyfp AND cr.cousubfp = fr.cousubfp
+    WHERE e.roadflg = 'Y'
+    ORDER BY e.tlid"""
+
+# House numbers with letters or dashes cant be interpolated and are left out
+EXPORT_RANGES_SQL = """
+    SELECT a.tlid, a.side, a.fromhn::integer, a.tohn::integer, a.zip
+    FROM tiger_data.{abbr}_addr AS a
+    WHERE a.fromhn ~ '^[0-9]{{1,9}}$' AND a.tohn ~ '^[0-9]{{1,9}}$'
+    ORDER BY a.tlid"""
+
+
+def require_numpy():
+    if np is None:
+        raise Exception("numpy is required for the offline geocoders, install it with pip install numpy")
+
+
+def get_linestring_coordinates(wkb):
+    """
+    Returns the (longitude, latitude) rows of a 2D little endian WKB linestring, after its byte order, type and point count
+    """
+
+    return np.frombuffer(wkb, dtype="<f8", offset=9).reshape(-1, 2)
+
+
+def normalize_street(street):
+    """
+    Returns the key form of a street, upper case words without punctuation with STREET_ABBREVIATIONS applied
+    """
+
+    words = REGEX_street_separator_pattern.sub(" ", street.upper()).split()
+    return " ".join(STREET_ABBREVIATIONS.get(word, word) for word in words)
+
+
+def get_street_key(street, zip_code):
+    return f"{normalize_street(street)}|{zip_code}".encode()
+
+
+class StringTable:
+    def __init__(self, data, offsets):
+        """
+        Strings of an export stored as one utf-8 buffer, string i is data[offsets[i]:offsets[i + 1]]
+        """
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, string_id):
+        return bytes(self.data[self.offsets[string_id]:self.offsets[string_id + 1]]).decode()
+
+
+def build_string_arrays(strings):
+    encoded = [string.encode() for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(string) for string in encoded])
+
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def build_export_arrays(edge_rows, range_rows):
+    """
+    Builds the arrays of an export from (tlid, coordinates, predir, name, suftype, sufdir, location_left, location_right,
+    zip_left, zip_right) edge rows, where coordinates are (longitude, latitude) rows, and (tlid, side, fromhn, tohn, zip)
+    range rows, both ordered by tlid
+
+    Returns the arrays of the export, the strings of the edges and ranges are stored once and referenced by position
+    """
+
+    require_numpy()
+
+    string_ids = {}
+
+    def get_string_id(value):
+        if value is None:
+            return -1
+        if value not in string_ids:
+            string_ids[value] = len(string_ids)
+        return string_ids[value]
+
+    tlids = []
+    coordinates = []
+    vertex_offsets = [0]
+    edge_strings = []
+    edge_values = []
+
+    for tlid, edge_coordinates, *values in edge_rows:
+        tlids.append(tlid)
+        edge_values.append(values)
+        coordinates.append(edge_coordinates)
+        vertex_offsets.append(vertex_offsets[-1] + len(edge_coordinates))
+        edge_strings.append([get_string_id(value) for value in values])
+
+    edge_indexes = {tlid: index for index, tlid in enumerate(tlids)}
+
+    ranges = []
+    range_zips = []
+    street_keys = []
+    for tlid, side, from_number, to_number, zip_code in range_rows:
+        edge_index = edge_indexes.get(tlid)
+        # Ranges of edges that arent roads or have no name
+        if edge_index is None:
+            continue
+
+        side = LEFT_SIDE if side == "L" else RIGHT_SIDE
+        ranges.append((edge_index, side, from_number, to_number))
+        range_zips.append(get_string_id(zip_code))
+
+        predir, name, suftype, sufdir, _, _, zip_left, zip_right = edge_values[edge_index]
+        street = " ".join(part for part in [predir, name, suftype, sufdir] if part)
+        street_keys.append(get_street_key(street, zip_code or (zip_left if side == LEFT_SIDE else zip_right) or ""))
+
+    ranges = np.array(ranges, dtype=np.int64).reshape(-1, 4)
+    order = np.argsort(ranges[:, 0], kind="stable")
+
+    # range_offsets[i]:range_offsets[i + 1] are the ranges of edge i
+    range_offsets = np.searchsorted(ranges[order, 0], np.arange(len(tlids) + 1))
+
+    # street_key_ranges[j] is the position in ranges of the range with street_keys[j], keys are sorted for searchsorted
+    street_keys = np.array(street_keys, dtype=bytes) if street_keys else np.zeros(0, dtype="S1")
+    position_in_ranges = np.empty(len(order), dtype=np.int64)
+    position_in_ranges[order] = np.arange(len(order))
+    key_order = np.argsort(street_keys, kind="stable")
+
+    string_data, string_offsets = build_string_arrays(list(string_ids))
+
+    arrays = {
+        'tlids': np.array(tlids, dtype=np.int64),
+        'vertices': np.concatenate(coordinates).astype(np.float64) if coordinates else np.zeros((0, 2)),
+        'vertex_offsets': np.array(vertex_offsets, dtype=np.int64),
+        'edge_strings': np.array(edge_strings, dtype=np.int32).reshape(-1, len(EDGE_STRING_COLUMNS)),
+        'ranges': ranges[order].astype(np.int32),
+        'range_zips': np.array(range_zips, dtype=np.int32)[order],
+        'range_offsets': range_offsets.astype(np.int64),
+        'street_keys': street_keys[key_order],
+        'street_key_ranges': position_in_ranges[key_order],
+        'string_data': string_data,
+        'string_offsets': string_offsets,
+    }
+
+    return arrays
+
+
+def fetch_rows(db, sql_query):
+    """
+    Yields the rows of sql_query from a server side cursor so a large state isnt held in memory twice
+    """
+
+    with db.get_connection() as connection, connection.transaction():
+        with connection.cursor(name=f"offline_export_{next(db.cursor_ids)}") as cursor:
+            cursor.itersize = EXPORT_FETCH_SIZE
+            cursor.execute(sql_query)
+            yield from cursor
+
+
+def export_state(db, state, directory):
+    """
+    Writes the streets of state (its abbreviation) to directory and returns the number of edges and ranges written
+    """
+
+    require_numpy()
+    abbr = state.lower()
+
+    try:
+        edge_rows = (
+            (row[0], get_linestring_coordinates(row[1]), *row[2:])
+            for row in fetch_rows(db, EXPORT_EDGES_SQL.format(abbr=abbr))
+        )
+        # Edges are consumed before the ranges are fetched, both come from their own cursor
+        edge_rows = list(edge_rows)
+        range_rows = fetch_rows(db, EXPORT_RANGES_SQL.format(abbr=abbr))
+
+        arrays = build_export_arrays(edge_rows, range_rows)
+
+    except psycopg.Error as e:
+        raise e
+
+    write_export(directory, arrays, {'state': state.upper()})
+
+    return len(arrays["tlids"]), len(arrays["ranges"])
+
+
+def write_export(directory, arrays, metadata):
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    for name, array in arrays.items():
+        np.save(directory / f"{name}.npy", array)
+
+    with open(directory / "metadata.json", "w") as f:
+        json.dump({**metadata, 'format_version': EXPORT_FORMAT_VERSION}, f)
+
+
+def load_export(directory, mmap_mode="r"):
+    """
+    Returns (arrays, strings, metadata) of an export, with mmap_mode="r" the arrays are memory mapped
+    so only the pages that are used are read and processes loading the same export share them
+    """
+
+    require_numpy()
+    directory = Path(directory)
+
+    with open(directory / "metadata.json") as f:
+        metadata = json.load(f)
+
+    if metadata.get("format_version") != EXPORT_FORMAT_VERSION:
+        raise Exception(f"{directory} was exported with another format version, export the state again")
+
+    arrays = {path.stem: np.load(path, mmap_mode=mmap_mode) for path in directory.glob("*.npy")}
+    strings = StringTable(arrays["string_data"], arrays["string_offsets"])
+
+    return arrays, strings, metadata
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Export the streets of loaded states for the offline geocoders")
+    parser.add_argument("directory", help="directory the export of every state is written to, in a subdirectory named after it")
+    parser.add_argument("states", nargs="+", help="state abbreviations")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = parse_arguments()
+
+    db = Database()
+
+    for state in arguments.states:
+        start = time.perf_counter()
+        number_of_edges, number_of_ranges = export_state(db, state, Path(arguments.directory) / state.lower())
+        print(f"Exported {number_of_edges} edges and {number_of_ranges} house number ranges of {state} in {time.perf_counter() - start:.1f}s")
+
+    db.close()
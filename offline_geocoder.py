@@ -0,0 +1,279 @@
+"""
+Geocodes clean, fully specified street addresses of exported states without the database, and everything else with it
+
+An address like "115 Cass Ave, Woonsocket, RI 02895" is looked up by its street and zip code in the sorted street keys
+of the offline_export export of its state, the range containing its house number gives the edge and the point is
+interpolated along it. Addresses without a zip code, with a street or house number that isnt in the export,
+or of a state that wasnt exported go to Database.get_geocoded_data
+
+The arrays are memory mapped read only, worker processes that load the same export share its pages in the OS cache
+instead of holding a copy each, and only the pages of the keys and edges that are looked up are read
+
+geocoder = OfflineGeocoder(["exports/ri", "exports/ma"], db=Database())
+geocoder.get_geocoded_data("115 Cass Ave, Woonsocket, RI 02895")
+"""
+
+import math
+import re
+import threading
+
+from cache import METERS_PER_DEGREE_LATITUDE
+from geocoder import NO_MATCH_RESULT, GeocodeResult, GeocodingConfidence
+from offline_export import LEFT_SIDE, get_street_key, load_export, normalize_street, require_numpy
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Meters a point is moved from the center line of the street towards the side of its house number, like geocode() does
+SIDE_OFFSET_METERS = 10
+
+# Rating of the offline matches, the street, zip code and house number range all matched exactly
+OFFLINE_RATING = 0
+
+# House number, street and optional place, then state and zip code, the parts can be separated by commas or spaces
+REGEX_street_address_pattern = re.compile(
+    r"^\s*(?P<number>\d{1,9})\s+(?P<street>.+?)[\s,]+(?P<state>[A-Za-z]{2})[\s,]+(?P<zip>\d{5})(?:-\d{4})?\s*$"
+)
+
+# Units dont change the point and the words after them are the place
+REGEX_unit_pattern = re.compile(r"\s+(?:APT|APARTMENT|UNIT|STE|SUITE|#)\s*\S+\s*", re.IGNORECASE)
+
+
+def parse_street_address(address):
+    """
+    Returns (house number, street candidates, place, state, zip code) of an address with a house number, state and zip code,
+    None for other addresses, every candidate is a (street, dropped words) pair
+
+    Without a comma between the street and the place they cant be told apart, the candidates are then the street
+    with fewer and fewer of its last words, longest first and never a single word, the dropped words have to be
+    the place of the matched street for it to count
+    """
+
+    match = REGEX_street_address_pattern.match(address)
+    if match is None:
+        return None
+
+    street, _, place = match["street"].partition(",")
+    place = place.strip(" ,") or None
+
+    unit = REGEX_unit_pattern.search(street)
+    if unit is not None:
+        street, place = street[:unit.start()], place or street[unit.end():].strip() or None
+
+    words = street.split()
+    if place is not None or len(words) < 2:
+        candidates = [(street, None)]
+    else:
+        candidates = [(" ".join(words[:end]), " ".join(words[end:]) or None) for end in range(len(words), 1, -1)]
+
+    return int(match["number"]), candidates, place, match["state"].upper(), match["zip"]
+
+
+class StreetIndex:
+    def __init__(self, directory):
+        """
+        Memory maps the export of one state from directory, nothing is copied into the process
+        """
+        require_numpy()
+
+        self.arrays, self.strings, metadata = load_export(directory, mmap_mode="r")
+        self.state = metadata["state"]
+
+    def get_string(self, string_id):
+        return self.strings[string_id] if string_id >= 0 else None
+
+    def find_range(self, street, zip_code, number):
+        """
+        Returns the position in ranges of the first range of street in zip_code that contains number with the same parity
+        as its ends, None when there is none
+        """
+
+        street_keys = self.arrays["street_keys"]
+        key = get_street_key(street, zip_code)
+
+        # searchsorted compares keys truncated to the width of the array, a longer key isnt in it
+        if len(key) > street_keys.dtype.itemsize:
+            return None
+
+        key = np.array(key, dtype=street_keys.dtype)
+        start = np.searchsorted(street_keys, key, side="left")
+        end = np.searchsorted(street_keys, key, side="right")
+
+        for range_index in self.arrays["street_key_ranges"][start:end]:
+            _, _, from_number, to_number = (int(value) for value in self.arrays["ranges"][range_index])
+
+            if min(from_number, to_number) <= number <= max(from_number, to_number) and (number - from_number) % 2 == 0:
+                return int(range_index)
+
+        return None
+
+    def interpolate(self, range_index, number):
+        """
+        Returns (latitude, longitude) of number along the edge of the range, moved SIDE_OFFSET_METERS to its side
+        """
+
+        edge, side, from_number, to_number = (int(value) for value in self.arrays["ranges"][range_index])
+        vertex_offsets = self.arrays["vertex_offsets"]
+        vertices = np.array(self.arrays["vertices"][vertex_offsets[edge]:vertex_offsets[edge + 1]], dtype=np.float64)
+
+        position = (number - from_number) / (to_number - from_number) if to_number != from_number else 0.5
+
+        # Longitudes are scaled so both axes are in degrees of latitude, which is planar enough along one edge
+        longitude_scale = math.cos(math.radians(vertices[0, 1]))
+        points = np.column_stack([vertices[:, 0] * longitude_scale, vertices[:, 1]])
+
+        vectors = np.diff(points, axis=0)
+        lengths = np.hypot(vectors[:, 0], vectors[:, 1])
+        distance = position * lengths.sum()
+
+        segment = min(int(np.searchsorted(np.cumsum(lengths), distance)), len(lengths) - 1)
+        segment_start = lengths[:segment].sum()
+        fraction = (distance - segment_start) / lengths[segment] if lengths[segment] > 0 else 0.0
+
+        x, y = points[segment] + fraction * vectors[segment]
+
+        # The left normal of the direction of the edge points to its left side
+        if lengths[segment] > 0:
+            normal_x, normal_y = -vectors[segment, 1] / lengths[segment], vectors[segment, 0] / lengths[segment]
+            offset = SIDE_OFFSET_METERS / METERS_PER_DEGREE_LATITUDE * (1 if side == LEFT_SIDE else -1)
+            x, y = x + normal_x * offset, y + normal_y * offset
+
+        return float(y), float(x / longitude_scale)
+
+    def get_location(self, range_index):
+        """
+        Returns the place or county subdivision on the side of the range
+        """
+
+        edge, side, _, _ = (int(value) for value in self.arrays["ranges"][range_index])
+        column = 4 if side == LEFT_SIDE else 5
+
+        return self.get_string(int(self.arrays["edge_strings"][edge, column]))
+
+    def format_address(self, range_index, number, place, zip_code):
+        """
+        Returns the address of the match formatted like pprint_addy, with the names of the street as they are in TIGER
+        """
+
+        edge, side, _, _ = (int(value) for value in self.arrays["ranges"][range_index])
+        predir, name, suftype, sufdir, location_left, location_right, _, _ = (
+            self.get_string(int(string_id)) for string_id in self.arrays["edge_strings"][edge]
+        )
+
+        location = (location_left if side == LEFT_SIDE else location_right) or place
+        street = " ".join(str(part) for part in [number, predir, name, suftype, sufdir] if part is not None)
+
+        return f"{street}, {location}, {self.state} {zip_code}" if location else f"{street}, {self.state} {zip_code}"
+
+    def match(self, number, streets, place, zip_code):
+        """
+        Returns the GeocodeResult of the first of the (street, dropped words) streets with a range containing number
+        in zip_code whose dropped words are its place, None without one
+        """
+
+        for street, dropped_words in streets:
+            range_index = self.find_range(street, zip_code, number)
+            if range_index is None:
+                continue
+
+            # "Oak St West Warwick" could be Oak St W in a place named Warwick, only the place of the street tells
+            if dropped_words is not None:
+                location = self.get_location(range_index)
+                if location is None or normalize_street(location) != normalize_street(dropped_words):
+                    continue
+
+            latitude, longitude = self.interpolate(range_index, number)
+            address = self.format_address(range_index, number, place, zip_code)
+            return GeocodeResult(address, latitude, longitude, OFFLINE_RATING, GeocodingConfidence.EXCELLENT)
+
+        return None
+
+
+class OfflineGeocoder:
+    def __init__(self, directories, db=None):
+        """
+        Geocodes the addresses it can match exactly in the exports of directories offline and the rest with db,
+        without db they get NO_MATCH_RESULT
+        """
+        self.indexes = {}
+        for directory in directories:
+            index = StreetIndex(directory)
+            self.indexes[index.state] = index
+
+        self.db = db
+        self.lock = threading.Lock()
+        self.offline_matches = 0
+        self.fallbacks = 0
+
+    def match(self, address):
+        """
+        Returns the GeocodeResult of address from the exports, None when it has to be geocoded by the database
+        """
+
+        parsed_address = parse_street_address(address)
+        if parsed_address is None:
+            return None
+
+        number, streets, place, state, zip_code = parsed_address
+
+        index = self.indexes.get(state)
+        if index is None:
+            return None
+
+        return index.match(number, streets, place, zip_code)
+
+    def count(self, offline_matches, fallbacks):
+        with self.lock:
+            self.offline_matches += offline_matches
+            self.fallbacks += fallbacks
+
+    def get_geocoded_data(self, address, **kwargs):
+        """
+        Returns the offline GeocodeResult of address or the one of Database.get_geocoded_data, kwargs are passed to it
+        """
+
+        geocoded_data = self.match(address)
+        if geocoded_data is not None:
+            self.count(1, 0)
+            return geocoded_data
+
+        self.count(0, 1)
+        if self.db is None:
+            return NO_MATCH_RESULT
+
+        return self.db.get_geocoded_data(address, **kwargs)
+
+    def geocode_many(self, addresses, **kwargs):
+        """
+        Returns a list of GeocodeResults in input order, the addresses that arent matched offline are geocoded together
+        with one Database.geocode_many call, kwargs are passed to it
+        """
+
+        addresses = list(addresses)
+        geocoded_data_list = [self.match(address) for address in addresses]
+        unmatched_indexes = [index for index, geocoded_data in enumerate(geocoded_data_list) if geocoded_data is None]
+        self.count(len(geocoded_data_list) - len(unmatched_indexes), len(unmatched_indexes))
+
+        if self.db is None:
+            fallback_list = [NO_MATCH_RESULT] * len(unmatched_indexes)
+        else:
+            fallback_list = self.db.geocode_many([addresses[index] for index in unmatched_indexes], **kwargs)
+
+        for index, geocoded_data in zip(unmatched_indexes, fallback_list):
+            geocoded_data_list[index] = geocoded_data
+
+        return geocoded_data_list
+
+    def stats(self):
+        """Returns a dictionary with the number of addresses matched offline and sent to the database"""
+
+        addresses = self.offline_matches + self.fallbacks
+
+        return {
+            'offline_matches': self.offline_matches,
+            'fallbacks': self.fallbacks,
+            'offline_rate': self.offline_matches / addresses if addresses else 0.0,
+        }
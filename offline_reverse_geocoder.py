@@ -0,0 +1,298 @@
+"""
+Reverse geocodes points of one state in memory from an offline_export export, without a database
+
+Road segments are indexed in a packed R-tree over numpy arrays, a point is answered with the closest streets and a house number
+interpolated along the addr range of its side of the street, in the street_1, street_2, street_3 shape of Database.reverse_geocode.
+The house numbers and the choice of street_2 and street_3 are close to reverse_geocode() but not always the same
+
+geocoder = OfflineReverseGeocoder("exports/ri")
+geocoder.reverse_geocode(41.995, -71.5287)
+"""
+
+import math
+
+from geocoder import NO_STREET_RESULT, ReverseGeocodeResult
+from offline_export import LEFT_SIDE, RIGHT_SIDE, load_export, require_numpy
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Children of every node of the packed R-tree
+RTREE_NODE_SIZE = 16
+
+# Half width in degrees of the first box searched around a point, it grows by RADIUS_GROWTH until MAX_SEARCH_RADIUS
+# or until enough streets are found, 0.001 degrees is about 110 m
+INITIAL_SEARCH_RADIUS = 0.001
+RADIUS_GROWTH = 4
+MAX_SEARCH_RADIUS = 0.02
+
+# Number of different streets returned for a point, like the addy array of reverse_geocode()
+STREETS_PER_POINT = 3
+
+
+class PackedRTree:
+    def __init__(self, boxes, node_size=RTREE_NODE_SIZE):
+        """
+        Static R-tree of boxes, an array of (min x, min y, max x, max y) rows, packed with Sort-Tile-Recursive
+        so every node except the last of a level is full
+
+        levels[0] holds the boxes in packed order and every following level the bounding boxes of node_size
+        consecutive entries of the level below, up to a single root
+        """
+        require_numpy()
+
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        self.node_size = node_size
+        self.order = self.pack(boxes)
+        self.levels = [boxes[self.order]]
+
+        while len(self.levels[-1]) > 1:
+            level = self.levels[-1]
+            starts = np.arange(0, len(level), node_size)
+            self.levels.append(np.column_stack([
+                np.minimum.reduceat(level[:, 0], starts),
+                np.minimum.reduceat(level[:, 1], starts),
+                np.maximum.reduceat(level[:, 2], starts),
+                np.maximum.reduceat(level[:, 3], starts),
+            ]))
+
+    def pack(self, boxes):
+        """
+        Returns the Sort-Tile-Recursive order of boxes, vertical slices of sqrt(number of leaves) leaves by the x of the centers
+        that are each sorted by the y of the centers
+        """
+
+        number_of_leaves = math.ceil(len(boxes) / self.node_size)
+        slice_size = math.ceil(math.sqrt(number_of_leaves)) * self.node_size
+
+        center_x = boxes[:, 0] + boxes[:, 2]
+        center_y = boxes[:, 1] + boxes[:, 3]
+        order = np.argsort(center_x, kind="stable")
+
+        # Sorting by slice first and y second orders every slice by y
+        slices = np.arange(len(boxes)) // slice_size
+        return order[np.lexsort((center_y[order], slices))]
+
+    def query(self, min_x, min_y, max_x, max_y):
+        """
+        Returns the positions in the original boxes of the ones intersecting the given box
+        """
+
+        if not len(self.order):
+            return self.order
+
+        nodes = np.zeros(1, dtype=np.int64)
+
+        for level in reversed(self.levels):
+            # The root level has a single node, below it the children of the nodes kept on the level above
+            if len(level) > 1:
+                nodes = (nodes[:, None] * self.node_size + np.arange(self.node_size)).ravel()
+                nodes = nodes[nodes < len(level)]
+
+            candidates = level[nodes]
+            nodes = nodes[
+                (candidates[:, 0] <= max_x) & (candidates[:, 2] >= min_x) & (candidates[:, 1] <= max_y) & (candidates[:, 3] >= min_y)
+            ]
+
+            if not len(nodes):
+                break
+
+        return self.order[nodes]
+
+
+class OfflineReverseGeocoder:
+    def __init__(self, directory):
+        """
+        Loads the export of a state from directory and indexes its road segments
+
+        Distances are planar, longitudes are scaled by the cosine of the middle latitude of the state which is accurate
+        to a few meters at the distances between a point and its streets
+        """
+        require_numpy()
+
+        arrays, self.strings, metadata = load_export(directory)
+        self.state = metadata["state"]
+
+        vertices = np.asarray(arrays["vertices"], dtype=np.float64)
+        vertex_offsets = np.asarray(arrays["vertex_offsets"])
+        self.edge_strings = np.asarray(arrays["edge_strings"])
+        self.ranges = np.asarray(arrays["ranges"])
+        self.range_zips = np.asarray(arrays["range_zips"])
+        self.range_offsets = np.asarray(arrays["range_offsets"])
+
+        self.longitude_scale = math.cos(math.radians(float(np.mean(vertices[:, 1])))) if len(vertices) else 1.0
+        points = np.column_stack([vertices[:, 0] * self.longitude_scale, vertices[:, 1]])
+
+        # A segment starts at every vertex except the last one of each edge
+        is_start = np.ones(len(points), dtype=bool)
+        is_start[vertex_offsets[1:] - 1] = False
+        starts = np.flatnonzero(is_start)
+
+        self.segment_edges = np.repeat(np.arange(len(vertex_offsets) - 1), np.diff(vertex_offsets) - 1)
+        self.segment_starts = points[starts]
+        self.segment_vectors = points[starts + 1] - self.segment_starts
+        self.segment_lengths = np.hypot(self.segment_vectors[:, 0], self.segment_vectors[:, 1])
+
+        # Length of the edge before every segment and total length of every edge, to place a point along its edge
+        cumulative_lengths = np.cumsum(self.segment_lengths) - self.segment_lengths
+        edge_first_segments = vertex_offsets[:-1] - np.arange(len(vertex_offsets) - 1)
+        self.segment_positions = cumulative_lengths - cumulative_lengths[np.minimum(edge_first_segments[self.segment_edges], len(cumulative_lengths) - 1)]
+        self.edge_lengths = np.bincount(self.segment_edges, weights=self.segment_lengths, minlength=len(vertex_offsets) - 1)
+
+        segment_ends = self.segment_starts + self.segment_vectors
+        self.rtree = PackedRTree(np.column_stack([
+            np.minimum(self.segment_starts[:, 0], segment_ends[:, 0]),
+            np.minimum(self.segment_starts[:, 1], segment_ends[:, 1]),
+            np.maximum(self.segment_starts[:, 0], segment_ends[:, 0]),
+            np.maximum(self.segment_starts[:, 1], segment_ends[:, 1]),
+        ]))
+
+    def get_string(self, string_id):
+        return self.strings[string_id] if string_id >= 0 else None
+
+    def find_closest_edges(self, x, y, radius):
+        """
+        Returns (edges, distances, positions, sides) of the edges with a segment within radius of the point, closest first,
+        position is the fraction of the edge before the closest point and side LEFT_SIDE or RIGHT_SIDE going along the edge
+        """
+
+        segments = self.rtree.query(x - radius, y - radius, x + radius, y + radius)
+
+        starts = self.segment_starts[segments]
+        vectors = self.segment_vectors[segments]
+        lengths = self.segment_lengths[segments]
+        offset_x = x - starts[:, 0]
+        offset_y = y - starts[:, 1]
+
+        # Fraction of the segment to the projection of the point, degenerate segments project to their start
+        squared_lengths = np.maximum(lengths * lengths, 1e-24)
+        fractions = np.clip((offset_x * vectors[:, 0] + offset_y * vectors[:, 1]) / squared_lengths, 0.0, 1.0)
+        distances = np.hypot(offset_x - fractions * vectors[:, 0], offset_y - fractions * vectors[:, 1])
+
+        keep = distances <= radius
+        segments, fractions, distances = segments[keep], fractions[keep], distances[keep]
+        crosses = (vectors[keep, 0] * offset_y[keep] - vectors[keep, 1] * offset_x[keep])
+
+        # Closest segment of every edge, ties go to the lower segment so results dont depend on the tree order
+        edges = self.segment_edges[segments]
+        order = np.lexsort((segments, distances))
+        _, first = np.unique(edges[order], return_index=True)
+        closest = order[first]
+        closest = closest[np.argsort(distances[closest], kind="stable")]
+
+        edges = edges[closest]
+        edge_lengths = np.maximum(self.edge_lengths[edges], 1e-12)
+        positions = (self.segment_positions[segments[closest]] + fractions[closest] * self.segment_lengths[segments[closest]]) / edge_lengths
+        sides = np.where(crosses[closest] > 0, LEFT_SIDE, RIGHT_SIDE)
+
+        return edges, distances[closest], positions, sides
+
+    def interpolate_house_number(self, edge, position, side):
+        """
+        Returns (house number, zip id) at position along edge on side, the range of the other side is used
+        when the edge has none on side and the number is None when it has no range at all
+        """
+
+        ranges = self.ranges[self.range_offsets[edge]:self.range_offsets[edge + 1]]
+        range_zips = self.range_zips[self.range_offsets[edge]:self.range_offsets[edge + 1]]
+        if not len(ranges):
+            return None, -1
+
+        on_side = np.flatnonzero(ranges[:, 1] == side)
+        index = on_side[0] if len(on_side) else 0
+        _, _, from_number, to_number = (int(value) for value in ranges[index])
+
+        number = from_number + round(position * (to_number - from_number))
+
+        # Both ends of a range have the parity of the side, odd or even
+        if (number - from_number) % 2:
+            number += 1 if to_number >= from_number else -1
+            number = min(max(number, min(from_number, to_number)), max(from_number, to_number))
+
+        return number, int(range_zips[index])
+
+    def format_address(self, edge, position, side):
+        """
+        Returns the address at position along edge on side formatted like pprint_addy
+        """
+
+        predir, name, suftype, sufdir, location_left, location_right, zip_left, zip_right = (
+            self.get_string(string_id) for string_id in self.edge_strings[edge]
+        )
+        number, zip_id = self.interpolate_house_number(edge, position, side)
+
+        location = location_left if side == LEFT_SIDE else location_right
+        zip_code = self.get_string(zip_id) or (zip_left if side == LEFT_SIDE else zip_right)
+
+        street = " ".join(str(part) for part in [number, predir, name, suftype, sufdir] if part is not None)
+        region = f"{self.state} {zip_code}" if zip_code else self.state
+
+        return f"{street}, {location}, {region}" if location else f"{street}, {region}"
+
+    def reverse_geocode(self, latitude, longitude):
+        """
+        Returns a ReverseGeocodeResult with the addresses of the up to three closest different streets to the point,
+        they are None when no street is within MAX_SEARCH_RADIUS
+        """
+
+        if not (math.isfinite(latitude) and math.isfinite(longitude)):
+            return NO_STREET_RESULT
+
+        x = longitude * self.longitude_scale
+        y = latitude
+        radius = INITIAL_SEARCH_RADIUS
+
+        while True:
+            edges, _, positions, sides = self.find_closest_edges(x, y, radius)
+
+            # Edges of one street share its name, only the closest edge of every street is kept
+            streets = []
+            street_names = set()
+            for edge, position, side in zip(edges, positions, sides):
+                street_name = tuple(self.edge_strings[edge, :4])
+                if street_name not in street_names:
+                    street_names.add(street_name)
+                    streets.append((edge, position, side))
+
+                if len(streets) == STREETS_PER_POINT:
+                    break
+
+            # Every segment within radius was seen, a bigger box can only add streets further away
+            if len(streets) == STREETS_PER_POINT or radius >= MAX_SEARCH_RADIUS:
+                break
+
+            radius = min(radius * RADIUS_GROWTH, MAX_SEARCH_RADIUS)
+
+        addresses = [self.format_address(edge, position, side) for edge, position, side in streets]
+        addresses += [None] * (STREETS_PER_POINT - len(addresses))
+
+        return ReverseGeocodeResult(*addresses)
+
+    def reverse_geocode_many(self, latitudes, longitudes):
+        """
+        Reverse geocodes arrays or sequences of latitudes and longitudes and returns the same dictionary of numpy columns
+        as Database.reverse_geocode_many
+        """
+
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+
+        if len(latitudes) != len(longitudes):
+            raise ValueError("latitudes and longitudes must have the same length")
+
+        street_1 = np.full(len(latitudes), None, dtype=object)
+        street_2 = np.full(len(latitudes), None, dtype=object)
+        street_3 = np.full(len(latitudes), None, dtype=object)
+
+        for index, (latitude, longitude) in enumerate(zip(latitudes.tolist(), longitudes.tolist())):
+            street_1[index], street_2[index], street_3[index] = self.reverse_geocode(latitude, longitude)
+
+        return {
+            'street_1': street_1,
+            'street_2': street_2,
+            'street_3': street_3,
+            'matched': np.array([street is not None for street in street_1], dtype=bool),
+        }
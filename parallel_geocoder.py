@@ -0,0 +1,172 @@
+import json
+import multiprocessing
+import os
+import re
+from pathlib import Path
+
+from geocoder import CASCADE_RATING_THRESHOLD, GEOCODE_BATCH_SIZE, Database, build_geocode_columns, measured
+
+
+# Number of addresses of the same state a worker geocodes in one task
+SHARD_SIZE = 2000
+
+# Filled by get_abbr_fips on first use, only the parent process shards addresses so spawned workers never read the file
+ABBR_FIPS = {}
+
+# match a state abbreviation as a separate word, optionally followed by a zip code at the end of the address
+REGEX_state_pattern = re.compile(r"\b([A-Z]{2})\b(?=[\s,]*(\d{5}(-\d{4})?)?[\s,]*(USA?)?[\s,]*$)", re.IGNORECASE)
+REGEX_any_state_pattern = re.compile(r"\b([A-Z]{2})\b")
+
+# Database of the worker process, every worker opens its own connection
+worker_db = None
+
+
+def get_abbr_fips():
+    if not ABBR_FIPS:
+        with open(Path(__file__).with_name("abbr - fips.json")) as f:
+            ABBR_FIPS.update(json.load(f))
+
+    return ABBR_FIPS
+
+
+def parse_state(address):
+    """
+    Returns the state abbreviation of address in upper case or an empty string when no state was found,
+    the abbreviation right before the zip code or at the end of the address is preferred
+
+    The state only decides which worker shard an address goes to, a wrong guess costs some cache locality but never changes the result
+    """
+
+    abbr_fips = get_abbr_fips()
+
+    match = REGEX_state_pattern.search(address)
+    if match and match.group(1).upper() in abbr_fips:
+        return match.group(1).upper()
+
+    # "115 Cass Avenue in Woonsocket, RI, United States" or a unit after the state, only upper case words are
+    # considered here so words like "In" or "Me" in the street part arent taken for a state
+    for candidate in reversed(REGEX_any_state_pattern.findall(address)):
+        if candidate.upper() in abbr_fips:
+            return candidate.upper()
+
+    return ""
+
+
+def init_worker():
+    global worker_db
+    worker_db = Database()
+
+
+def geocode_shard(shard):
+    indexes, addresses, geocode_many_arguments = shard
+
+    rows = worker_db.deduplication_stats["rows"]
+    distinct = worker_db.deduplication_stats["distinct"]
+    geocoded_data_list = worker_db.geocode_many(addresses, **geocode_many_arguments)
+
+    deduplication_stats = {
+        'rows': worker_db.deduplication_stats["rows"] - rows,
+        'distinct': worker_db.deduplication_stats["distinct"] - distinct,
+    }
+
+    return indexes, geocoded_data_list, deduplication_stats
+
+
+class ParallelGeocoder:
+    def __init__(self, processes=None, shard_size=SHARD_SIZE, metrics=None):
+        """
+        Geocodes batches of addresses over a pool of worker processes, each with its own connection
+
+        Addresses are grouped by the state parsed from them and the shards of a state are handed out one after another,
+        so at any time the workers query the tiger_data.<state>_* tables of one or two states and their indexes stay hot
+        in shared buffers instead of competing for them
+
+        metrics is an optional metrics.GeocoderMetrics that records every geocode_many call over the whole pool
+        """
+        self.processes = processes or os.cpu_count()
+        self.shard_size = shard_size
+        self.pool = multiprocessing.Pool(self.processes, initializer=init_worker)
+        self.deduplication_stats = {'rows': 0, 'distinct': 0}
+        self.metrics = metrics
+
+    @measured("geocode_many")
+    def geocode_many(
+        self,
+        addresses,
+        pagc_normalize_address=False,
+        batch_size=GEOCODE_BATCH_SIZE,
+        state=None,
+        county=None,
+        zip_code=None,
+        deduplicate=False,
+        cascade=False,
+        cascade_rating_threshold=CASCADE_RATING_THRESHOLD,
+        columnar=False,
+        locality=True,
+    ):
+        """
+        Geocodes a sequence of addresses and returns a list of GeocodeResults like Database.geocode_many, in input order,
+        or its columns with columnar=True
+        """
+
+        addresses = list(addresses)
+        geocode_many_arguments = {
+            'pagc_normalize_address': pagc_normalize_address,
+            'batch_size': batch_size,
+            'state': state,
+            'county': county,
+            'zip_code': zip_code,
+            'deduplicate': deduplicate,
+            'cascade': cascade,
+            'cascade_rating_threshold': cascade_rating_threshold,
+            'locality': locality,
+        }
+
+        indexes_by_state = {}
+        for index, address in enumerate(addresses):
+            indexes_by_state.setdefault(parse_state(address), []).append(index)
+
+        shards = []
+        # Largest states first so the pool doesnt end up waiting on one big state at the end
+        for state in sorted(indexes_by_state, key=lambda state: -len(indexes_by_state[state])):
+            state_indexes = indexes_by_state[state]
+            for start in range(0, len(state_indexes), self.shard_size):
+                indexes = state_indexes[start : start + self.shard_size]
+                shards.append((indexes, [addresses[index] for index in indexes], geocode_many_arguments))
+
+        geocoded_data_list = [None] * len(addresses)
+        for indexes, shard_geocoded_data_list, deduplication_stats in self.pool.imap_unordered(geocode_shard, shards):
+            for index, geocoded_data in zip(indexes, shard_geocoded_data_list):
+                geocoded_data_list[index] = geocoded_data
+
+            self.deduplication_stats["rows"] += deduplication_stats["rows"]
+            self.deduplication_stats["distinct"] += deduplication_stats["distinct"]
+
+        if columnar:
+            columns = build_geocode_columns(geocoded_data_list)
+            if cascade:
+                columns["stage"] = [geocoded_data.stage for geocoded_data in geocoded_data_list]
+            return columns
+
+        return geocoded_data_list
+
+    def get_deduplication_ratio(self):
+        """Returns the deduplication ratio over all workers like Database.get_deduplication_ratio"""
+
+        if not self.deduplication_stats["rows"]:
+            return 0.0
+
+        return 1 - self.deduplication_stats["distinct"] / self.deduplication_stats["rows"]
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.pool.terminate()
@@ -0,0 +1,185 @@
+import csv
+import json
+import os
+from enum import Enum
+
+import psycopg
+
+from cache import normalize_address_key
+from geocoder import Database, GeocodeResult, GeocodingConfidence, ReverseGeocodeResult
+
+
+class PersistentGeocodeCache:
+    def __init__(self, database=None, tiger_year=None):
+        """
+        Geocoding result cache stored in the tiger_cache schema of the geocoder database so it is shared by every process
+        and survives restarts, it has the same get/set interface as cache.GeocodeCache so it can be passed to Database(cache=...)
+
+        Every entry is stamped with the TIGER year of the loaded data, entries of any other year are treated as misses
+        so loading a new vintage invalidates the cache without any manual step
+        """
+        # The cache gets its own connection so its lookups never interleave with pipelined geocoding queries
+        self.database = database if database is not None else Database()
+        self.hits = 0
+        self.misses = 0
+
+        self.create_table()
+
+        if tiger_year is None:
+            tiger_year = self.get_tiger_year()
+        self.tiger_year = str(tiger_year)
+
+    def create_table(self):
+        self.database.execute("CREATE SCHEMA IF NOT EXISTS tiger_cache")
+        self.database.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tiger_cache.geocode_results(
+                namespace text NOT NULL,
+                cache_key text NOT NULL,
+                tiger_year text NOT NULL,
+                result jsonb NOT NULL,
+                created_at timestamptz NOT NULL DEFAULT now(),
+                CONSTRAINT pk_tiger_cache_geocode_results PRIMARY KEY (namespace, cache_key)
+            )
+            """
+        )
+
+    def get_tiger_year(self):
+        """
+        Returns the TIGER year the loader used, the YEAR environment variable is used when the loader variables are not set
+        """
+
+        try:
+            with self.database.get_connection() as connection, connection.cursor() as cursor:
+                cursor.execute("SELECT tiger_year FROM tiger.loader_variables LIMIT 1")
+                result = cursor.fetchone()
+
+        except psycopg.errors.UndefinedTable:
+            result = None
+
+        if result and result[0]:
+            return result[0]
+
+        return os.getenv("YEAR", "2022")
+
+    def get(self, namespace, key):
+        return self.get_many(namespace, [key])[0]
+
+    def get_many(self, namespace, keys):
+        if not keys:
+            return []
+
+        sql_query = """
+            SELECT cache_key, result FROM tiger_cache.geocode_results
+            WHERE namespace = %s AND tiger_year = %s AND cache_key = ANY(%s)"""
+
+        try:
+            with self.database.get_connection() as connection, connection.cursor() as cursor:
+                cursor.execute(sql_query, [namespace, self.tiger_year, list(keys)], prepare=self.database.prepare)
+                results = dict(cursor.fetchall())
+
+        except psycopg.Error as e:
+            raise e
+
+        values = []
+        for key in keys:
+            result = results.get(key)
+
+            if result is None:
+                self.misses += 1
+                values.append(None)
+            else:
+                self.hits += 1
+                values.append(load_result(result))
+
+        return values
+
+    def set(self, namespace, key, value):
+        self.set_many(namespace, [(key, value)])
+
+    def set_many(self, namespace, key_value_pairs):
+        # ON CONFLICT cant update the same row twice in one statement so only the last value of a key is kept
+        results = {key: json.dumps(dump_result(value)) for key, value in key_value_pairs}
+        if not results:
+            return
+
+        # Rows of an older TIGER year are overwritten with the result of the current one
+        sql_query = """
+            INSERT INTO tiger_cache.geocode_results(namespace, cache_key, tiger_year, result)
+            SELECT %s, t.cache_key, %s, t.result::jsonb FROM unnest(%s::text[], %s::text[]) AS t(cache_key, result)
+            ON CONFLICT (namespace, cache_key) DO UPDATE
+            SET tiger_year = EXCLUDED.tiger_year, result = EXCLUDED.result, created_at = now()"""
+
+        try:
+            with self.database.get_connection() as connection, connection.cursor() as cursor:
+                cursor.execute(sql_query, [namespace, self.tiger_year, list(results.keys()), list(results.values())])
+
+        except psycopg.Error as e:
+            raise e
+
+    def prepopulate(self, address_geocoded_data_pairs, pagc_normalize_address=None, batch_size=10_000):
+        """
+        Bulk loads (address, geocoded_data) pairs, for example the output of a previous run, into the cache
+        """
+
+        namespace = "pagc" if pagc_normalize_address else "default"
+        batch = []
+
+        for address, geocoded_data in address_geocoded_data_pairs:
+            batch.append((normalize_address_key(address), geocoded_data))
+
+            if len(batch) == batch_size:
+                self.set_many(namespace, batch)
+                batch = []
+
+        self.set_many(namespace, batch)
+
+    def prepopulate_from_csv(self, file_path, address_column="address", pagc_normalize_address=None):
+        """
+        Bulk loads a csv file written by geocode_file, with the input address column and the geocoded_address, latitude,
+        longitude, rating and confidence columns, into the cache
+        """
+
+        def read_rows():
+            with open(file_path, newline="") as f:
+                for row in csv.DictReader(f):
+                    geocoded_data = GeocodeResult(
+                        row["geocoded_address"] or None,
+                        float(row["latitude"]) if row["latitude"] else None,
+                        float(row["longitude"]) if row["longitude"] else None,
+                        int(row["rating"]) if row["rating"] else None,
+                        GeocodingConfidence(row["confidence"]),
+                    )
+                    yield row[address_column], geocoded_data
+
+        self.prepopulate(read_rows(), pagc_normalize_address)
+
+    def purge_stale(self):
+        """Deletes entries that were stored for another TIGER year"""
+
+        self.database.execute("DELETE FROM tiger_cache.geocode_results WHERE tiger_year <> %s", [self.tiger_year])
+
+    def clear(self):
+        self.database.execute("TRUNCATE tiger_cache.geocode_results")
+
+    def stats(self):
+        lookups = self.hits + self.misses
+
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+def dump_result(value):
+    # Enum members like GeocodingConfidence are stored by their value
+    return {key: item.value if isinstance(item, Enum) else item for key, item in value.to_dict().items()}
+
+
+def load_result(result):
+    if "confidence" in result:
+        result["confidence"] = GeocodingConfidence(result["confidence"])
+        return GeocodeResult(**result)
+
+    return ReverseGeocodeResult(**result)
@@ -0,0 +1,128 @@
+"""
+Loads the tables and indexes geocode() and reverse_geocode() read into the PostgreSQL buffer cache with pg_prewarm,
+so the first geocodes after a deploy or a server restart dont wait for them to be read from disk
+
+Indexes of every state are loaded before any table, they are smaller and every query walks them
+
+python -m prewarm                        states of GEOCODER_STATES in .env
+python -m prewarm --states RI MA --no-tables
+python -m prewarm --mode prefetch        asks the OS to read the files in the background instead
+"""
+
+import argparse
+import json
+import os
+import time
+
+from dotenv import load_dotenv
+
+from geocoder import Database
+
+
+# Tables of a state geocode() and reverse_geocode() read, the loader creates them as tiger_data.<abbr>_<section>
+PREWARM_STATE_SECTIONS = ["featnames", "edges", "addr", "faces", "place", "cousub", "zip_lookup_base", "zip_state", "zip_state_loc"]
+
+# National tables used to find the state and county of an address, the centroids of addresses without a street
+# and the addresses already geocoded
+PREWARM_NATIONAL_TABLES = ["tiger_data.state_all", "tiger_data.county_all", "tiger_data.county_all_lookup", "tiger_data.locality_centroid", "tiger_cache.address_hits"]
+
+# buffer loads into shared_buffers, read reads synchronously and prefetch asynchronously into the OS cache only
+PREWARM_MODES = ["buffer", "read", "prefetch"]
+
+# to_regclass is NULL for tables of states that are not loaded
+TABLE_INDEXES_SQL = """
+    SELECT i.indexrelid::regclass::text
+    FROM pg_index AS i
+    WHERE i.indrelid = to_regclass(%s)
+    ORDER BY pg_relation_size(i.indexrelid)"""
+
+PREWARM_SQL = "SELECT pg_prewarm(%s::regclass, %s)"
+
+
+def get_configured_states():
+    """
+    Returns the state abbreviations of GEOCODER_STATES in .env, "*" is every state
+    """
+
+    load_dotenv(".env")
+    states = os.getenv("GEOCODER_STATES", "")
+
+    if states.strip() == "*":
+        with open("abbr - fips.json") as f:
+            return list(json.load(f).keys())
+
+    return [state.strip() for state in states.split(",") if state.strip()]
+
+
+def get_prewarm_relations(db, states, tables=True):
+    """
+    Returns the existing indexes of the geocoding tables of states, followed by the tables themselves with tables=True
+    """
+
+    table_names = list(PREWARM_NATIONAL_TABLES)
+    for state in states:
+        table_names += [f"tiger_data.{state.lower()}_{section}" for section in PREWARM_STATE_SECTIONS]
+
+    indexes = []
+    existing_tables = []
+
+    with db.get_connection() as connection, connection.cursor() as cursor:
+        for table_name in table_names:
+            cursor.execute("SELECT to_regclass(%s)", [table_name])
+            if cursor.fetchone()[0] is None:
+                continue
+
+            existing_tables.append(table_name)
+            cursor.execute(TABLE_INDEXES_SQL, [table_name])
+            indexes += [row[0] for row in cursor.fetchall()]
+
+    return indexes + existing_tables if tables else indexes
+
+
+def prewarm(db, states, tables=True, mode="buffer"):
+    """
+    Prewarms the indexes and, with tables=True, the tables geocoding reads for states
+    and returns a dictionary of the blocks loaded for every relation
+
+    shared_buffers holds at most its size, relations are loaded indexes first so when everything doesnt fit
+    the tables are what gets evicted
+    """
+
+    if mode not in PREWARM_MODES:
+        raise ValueError(f"mode has to be one of {PREWARM_MODES}")
+
+    db.execute("CREATE EXTENSION IF NOT EXISTS pg_prewarm;")
+
+    relations = get_prewarm_relations(db, states, tables)
+    blocks = {}
+
+    with db.get_connection() as connection, connection.cursor() as cursor:
+        for relation in relations:
+            cursor.execute(PREWARM_SQL, [relation, mode])
+            blocks[relation] = cursor.fetchone()[0]
+
+    return blocks
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Load the geocoding tables and indexes into the buffer cache")
+    parser.add_argument("--states", nargs="+", help="state abbreviations to prewarm, GEOCODER_STATES of .env by default")
+    parser.add_argument("--no-tables", action="store_true", help="only prewarm the indexes")
+    parser.add_argument("--mode", choices=PREWARM_MODES, default="buffer", help="pg_prewarm mode")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = parse_arguments()
+    states = arguments.states or get_configured_states()
+
+    db = Database()
+    start = time.perf_counter()
+    blocks = prewarm(db, states, tables=not arguments.no_tables, mode=arguments.mode)
+    db.close()
+
+    for relation, relation_blocks in blocks.items():
+        print(f"{relation:<60} {relation_blocks:>10} blocks")
+
+    print(f"Prewarmed {len(blocks)} relations, {sum(blocks.values())} blocks of {states} in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,234 @@
+"""
+Routes the read only geocoding queries of a Database over read replicas of the primary
+
+A replica whose connection breaks or that cant be connected to by a health check is ejected for REPLICA_EJECT_SECONDS,
+after that it is tried again, while every replica is ejected the queries go to the primary. A busy replica, one whose pool
+has no free connection in time or whose query is canceled by statement_timeout, is not ejected
+"""
+
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg
+from psycopg.conninfo import conninfo_to_dict
+from psycopg_pool import ConnectionPool, PoolTimeout, TooManyRequests
+
+
+# Seconds a failing replica gets no queries before it is tried again
+REPLICA_EJECT_SECONDS = 30
+
+# Seconds between two health checks of every replica, 0 turns the background checks off
+REPLICA_CHECK_INTERVAL = 10
+
+# Seconds to wait for a connection to a replica before it counts as failing
+REPLICA_CONNECT_TIMEOUT = 2
+
+ROUTING_STRATEGIES = ["round_robin", "least_outstanding"]
+
+
+def parse_replica(replica, primary_parameters):
+    """
+    Returns the connection parameters of a replica given as "host:port", a libpq connection string or URI, or a dictionary,
+    parameters it doesnt set like the user, password and dbname are the ones of the primary
+    """
+
+    if isinstance(replica, dict):
+        parameters = replica
+
+    elif "=" in replica or "://" in replica:
+        parameters = conninfo_to_dict(replica)
+
+    else:
+        host, _, port = replica.strip().partition(":")
+        parameters = {'host': host, 'port': port or primary_parameters.get("port")}
+
+    return {**primary_parameters, **parameters}
+
+
+class Replica:
+    def __init__(self, parameters, min_size, max_size, max_idle):
+        self.name = f"{parameters.get('host')}:{parameters.get('port')}"
+        self.parameters = {**parameters, 'connect_timeout': REPLICA_CONNECT_TIMEOUT}
+        self.pool = ConnectionPool(
+            kwargs=self.parameters,
+            min_size=min_size,
+            max_size=max_size,
+            max_idle=max_idle,
+            check=ConnectionPool.check_connection,
+            open=False,
+        )
+        # Queries running on the replica now and in total, and the time.monotonic() it is ejected until
+        self.outstanding = 0
+        self.queries = 0
+        self.failures = 0
+        self.ejected_until = 0.0
+
+
+class ReplicaRouter:
+    def __init__(
+        self,
+        replicas,
+        primary_parameters,
+        strategy="round_robin",
+        min_size=1,
+        max_size=10,
+        max_idle=300,
+        eject_seconds=REPLICA_EJECT_SECONDS,
+        check_interval=REPLICA_CHECK_INTERVAL,
+    ):
+        """
+        Hands out connections to a list of replicas, each has its own pool of min_size to max_size connections
+
+        strategy "round_robin" takes the healthy replicas in turn, "least_outstanding" the one with the fewest queries running,
+        replicas are health checked every check_interval seconds in a background thread once the router is open
+        """
+        if strategy not in ROUTING_STRATEGIES:
+            raise ValueError(f"strategy has to be one of {ROUTING_STRATEGIES}")
+
+        self.replicas = [Replica(parse_replica(replica, primary_parameters), min_size, max_size, max_idle) for replica in replicas]
+        self.strategy = strategy
+        self.eject_seconds = eject_seconds
+        self.check_interval = check_interval
+
+        self.turns = itertools.count()
+        self.lock = threading.Lock()
+        self.closed = threading.Event()
+        self.check_thread = None
+
+    def open(self):
+        # wait=False so an unreachable replica doesnt block opening, it is ejected on its first query instead
+        for replica in self.replicas:
+            replica.pool.open(wait=False)
+
+        if self.check_interval:
+            self.check_thread = threading.Thread(target=self.run_health_checks, daemon=True)
+            self.check_thread.start()
+
+    def close(self):
+        self.closed.set()
+
+        for replica in self.replicas:
+            replica.pool.close()
+
+    def eject(self, replica, error):
+        with self.lock:
+            replica.failures += 1
+            replica.ejected_until = time.monotonic() + self.eject_seconds
+
+        print(f"Replica {replica.name} ejected for {self.eject_seconds}s - {error!r}")
+
+    def choose(self, skipped=()):
+        """
+        Returns the replica for the next query and counts it as outstanding, None when every replica is ejected or skipped
+        """
+
+        now = time.monotonic()
+
+        with self.lock:
+            healthy = [replica for replica in self.replicas if replica.ejected_until <= now and replica not in skipped]
+            if not healthy:
+                return None
+
+            if self.strategy == "least_outstanding":
+                # Rotating the start keeps idle replicas with the same count from always losing to the first one
+                start = next(self.turns) % len(healthy)
+                replica = min(healthy[start:] + healthy[:start], key=lambda replica: replica.outstanding)
+            else:
+                replica = healthy[next(self.turns) % len(healthy)]
+
+            replica.outstanding += 1
+            replica.queries += 1
+
+        return replica
+
+    def release(self, replica):
+        with self.lock:
+            replica.outstanding -= 1
+
+    @contextmanager
+    def connection(self, fallback):
+        """
+        Yields a connection of a healthy replica, or of fallback (a context manager factory for the primary)
+        when every replica is ejected
+
+        A replica whose pool has no free connection in time is busy, the next one is tried without ejecting it and
+        the PoolTimeout is raised when every healthy replica was busy, so load doesnt spill onto the primary. A replica whose
+        pool fails otherwise or whose connection breaks while it is used is ejected, errors of the query itself
+        like QueryCanceled are raised unchanged
+        """
+
+        busy = []
+
+        while True:
+            replica = self.choose(busy)
+
+            if replica is None:
+                if busy:
+                    raise PoolTimeout(f"every replica is busy, tried {', '.join(busy_replica.name for busy_replica in busy)}")
+
+                with fallback() as connection:
+                    yield connection
+                return
+
+            try:
+                connection = replica.pool.getconn(timeout=REPLICA_CONNECT_TIMEOUT)
+                break
+
+            except (PoolTimeout, TooManyRequests):
+                self.release(replica)
+                busy.append(replica)
+
+            except psycopg.OperationalError as e:
+                self.release(replica)
+                self.eject(replica, e)
+
+        try:
+            yield connection
+
+        except psycopg.OperationalError as e:
+            # QueryCanceled and other errors of a query leave the connection usable, only a lost connection means the replica is down
+            if connection.broken:
+                self.eject(replica, e)
+            raise e
+
+        finally:
+            replica.pool.putconn(connection)
+            self.release(replica)
+
+    def check(self):
+        """
+        Connects to every replica, ejects the ones that cant be reached and readmits ejected ones that answer again
+
+        The check opens its own connection instead of borrowing one from the pool, so a replica whose pool is only busy
+        isnt taken for a replica that is down
+        """
+
+        for replica in self.replicas:
+            try:
+                with psycopg.connect(**replica.parameters) as connection:
+                    connection.execute("SELECT 1")
+
+            except psycopg.OperationalError as e:
+                if replica.ejected_until <= time.monotonic():
+                    self.eject(replica, e)
+                continue
+
+            with self.lock:
+                replica.ejected_until = 0.0
+
+    def run_health_checks(self):
+        while not self.closed.wait(self.check_interval):
+            self.check()
+
+    def stats(self):
+        now = time.monotonic()
+        stats = {'ejected': sum(1 for replica in self.replicas if replica.ejected_until > now)}
+
+        for index, replica in enumerate(self.replicas):
+            stats[f"{index}_outstanding"] = replica.outstanding
+            stats[f"{index}_queries"] = replica.queries
+            stats[f"{index}_failures"] = replica.failures
+
+        return stats
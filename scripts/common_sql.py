@@ -19,11 +19,7 @@ def reset_schema(db):
     )
 
 
-def create_state_section_table_and_add_data(section, abbr, fips, primary_key, YEAR, dbf_files=None):
-    db = Database()
-
-    reset_schema(db)
-
+def create_state_section_table(db, section, abbr, fips, primary_key):
     db.execute(
         f"""
         CREATE TABLE tiger_data.{abbr}_{section}(
@@ -40,23 +36,21 @@ def create_state_section_table_and_add_data(section, abbr, fips, primary_key, YE
         """
     )
 
-    if dbf_files is None:
-        dbf_files = [f"tl_{YEAR}_{fips}_{section}.dbf"]
 
-    for file in dbf_files:
-        # this function is called from load_states.py so current working directory is TEMP_DIR
-        # so tl_{YEAR}_us_state.dbf is in TEMP_DIR
-        if section in {"place", "cousub", "tract", "tabblock20"}:
-            run_shp2pgsql(f"{SHP2PGSQL} -D -c -s 4269 -g the_geom -W 'latin1' {file} tiger_staging.{abbr}_{section}")
-        else:
-            run_shp2pgsql(f"{SHP2PGSQL} -D -s 4269 -g the_geom -W 'latin1' {file} tiger_staging.{abbr}_{section}")
+def load_staged_state_section_data(db, section, abbr, primary_key):
+    """
+    Moves tiger_staging.{abbr}_{section} into tiger_data.{abbr}_{section}, the staging table is the one shp2pgsql creates
+    from a TIGER dbf file or one with the same columns like the benchmark fixture builds
+    """
+
+    if section in {"place", "cousub", "tract", "bg"}:
+        db.execute(f"ALTER TABLE tiger_staging.{abbr}_{section} RENAME geoid TO {primary_key}")
 
-        if section in {"place", "cousub", "tract", "bg"}:
-            db.execute(f"ALTER TABLE tiger_staging.{abbr}_{section} RENAME geoid TO {primary_key}")
+    # why loading same thing multiple times instead of doing it just one time, whats the need other than preventing memory issue if thats an issue here
+    db.execute(f"SELECT loader_load_staged_data(lower('{abbr}_{section}'), lower('{abbr}_{section}'))")
 
-        # why loading same thing multiple times instead of doing it just one time, whats the need other than preventing memory issue if thats an issue here
-        db.execute(f"SELECT loader_load_staged_data(lower('{abbr}_{section}'), lower('{abbr}_{section}'))")
 
+def finish_state_section_table(db, section, abbr):
     if section in {"place", "cousub"}:
         db.execute(
             f"""
@@ -66,4 +60,94 @@ def create_state_section_table_and_add_data(section, abbr, fips, primary_key, YE
         )
 
     db.execute(f"VACUUM ANALYZE tiger_data.{abbr}_{section}")
+
+
+def create_state_section_table_and_add_data(section, abbr, fips, primary_key, YEAR, dbf_files=None):
+    db = Database()
+
+    reset_schema(db)
+
+    create_state_section_table(db, section, abbr, fips, primary_key)
+
+    if dbf_files is None:
+        dbf_files = [f"tl_{YEAR}_{fips}_{section}.dbf"]
+
+    for file in dbf_files:
+        # this function is called from load_states.py so current working directory is TEMP_DIR
+        # so tl_{YEAR}_us_state.dbf is in TEMP_DIR
+        if section in {"place", "cousub", "tract", "tabblock20"}:
+            run_shp2pgsql(f"{SHP2PGSQL} -D -c -s 4269 -g the_geom -W 'latin1' {file} tiger_staging.{abbr}_{section}")
+        else:
+            run_shp2pgsql(f"{SHP2PGSQL} -D -s 4269 -g the_geom -W 'latin1' {file} tiger_staging.{abbr}_{section}")
+
+        load_staged_state_section_data(db, section, abbr, primary_key)
+
+    finish_state_section_table(db, section, abbr)
     db.connection.commit()
+
+
+def create_state_all_table(db):
+    db.execute(
+        """CREATE TABLE IF NOT EXISTS tiger_data.state_all(
+            CONSTRAINT pk_state_all PRIMARY KEY (statefp),
+            CONSTRAINT uidx_state_all_stusps  UNIQUE (stusps), 
+            CONSTRAINT uidx_state_all_gid UNIQUE (gid)
+        ) INHERITS(tiger.state)
+        """
+    )
+
+
+def load_staged_state_all_data(db):
+    db.execute("SELECT loader_load_staged_data(lower('state'), lower('state_all'))")
+
+    db.execute("CREATE INDEX IF NOT EXISTS tiger_data_state_all_the_geom_gist ON tiger_data.state_all USING gist(the_geom)")
+
+    db.execute("VACUUM ANALYZE tiger_data.state_all")
+
+
+def create_county_all_table(db):
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS tiger_data.county_all(
+            CONSTRAINT pk_tiger_data_county_all PRIMARY KEY (cntyidfp),
+            CONSTRAINT uidx_tiger_data_county_all_gid UNIQUE (gid)
+        ) INHERITS(tiger.county)
+        """
+    )
+
+
+def load_staged_county_all_data(db):
+    db.execute("ALTER TABLE tiger_staging.county RENAME geoid TO cntyidfp")
+
+    db.execute("SELECT loader_load_staged_data(lower('county'), lower('county_all'))")
+
+    create_index_sql_queries = """
+    CREATE INDEX IF NOT EXISTS tiger_data_county_the_geom_gist ON tiger_data.county_all USING gist(the_geom);
+    CREATE UNIQUE INDEX IF NOT EXISTS uidx_tiger_data_county_all_statefp_countyfp ON tiger_data.county_all USING btree(statefp,countyfp);
+    """
+
+    db.execute(create_index_sql_queries)
+
+    db.execute("VACUUM ANALYZE tiger_data.county_all")
+
+    # Create table tiger_data.county_all_lookup
+    db.execute(
+        """
+        CREATE TABLE tiger_data.county_all_lookup(
+            CONSTRAINT pk_county_all_lookup PRIMARY KEY (st_code, co_code)
+        ) INHERITS (tiger.county_lookup)
+        """
+    )
+
+    # Insert data into tiger_data.county_all_lookup
+    db.execute(
+        """
+        INSERT INTO tiger_data.county_all_lookup (st_code, state, co_code, name)
+        SELECT CAST(s.statefp as integer), s.abbrev, CAST(c.countyfp as integer), c.name
+        FROM tiger_data.county_all AS c
+        INNER JOIN state_lookup AS s ON s.statefp = c.statefp
+        """
+    )
+
+    # Vacuum analyze tables
+    db.execute("VACUUM ANALYZE tiger_data.county_all_lookup")
@@ -30,6 +30,47 @@ BASE_URL = f"https://{BASE_PATH}"
 
 ABBR_FIPS = json.load(open('abbr - fips.json'))
 
+# Indexes the loader creates on every state section table, {abbr} is the lower case state abbreviation
+STATE_SECTION_INDEX_SQL = {
+    'place': """
+    CREATE INDEX IF NOT EXISTS idx_{abbr}_place_soundex_name ON tiger_data.{abbr}_place USING btree (soundex(name));
+    CREATE INDEX IF NOT EXISTS tiger_data_{abbr}_place_the_geom_gist ON tiger_data.{abbr}_place USING gist(the_geom);
+    """,
+    'cousub': """
+    CREATE INDEX IF NOT EXISTS tiger_data_{abbr}_cousub_the_geom_gist ON tiger_data.{abbr}_cousub USING gist(the_geom);
+    CREATE INDEX IF NOT EXISTS idx_tiger_data_{abbr}_cousub_countyfp ON tiger_data.{abbr}_cousub USING btree(countyfp);
+    """,
+    'faces': """
+    CREATE INDEX IF NOT EXISTS tiger_data_{abbr}_faces_the_geom_gist ON tiger_data.{abbr}_faces USING gist(the_geom);
+    CREATE INDEX IF NOT EXISTS idx_tiger_data_{abbr}_faces_tfid ON tiger_data.{abbr}_faces USING btree (tfid);
+    CREATE INDEX IF NOT EXISTS idx_tiger_data_{abbr}_faces_countyfp ON tiger_data.{abbr}_faces USING btree (countyfp);
+    """,
+    'featnames': """
+    CREATE INDEX IF NOT EXISTS idx_tiger_data_{abbr}_featnames_snd_name ON tiger_data.{abbr}_featnames USING btree (soundex(name));
+    CREATE INDEX IF NOT EXISTS idx_tiger_data_{abbr}_featnames_lname ON tiger_data.{abbr}_featnames USING btree (lower(name));
+    CREATE INDEX IF NOT EXISTS idx_tiger_data_{abbr}_featnames_tlid_statefp ON tiger_data.{abbr}_featnames USING btree (tlid,statefp);
+    """,
+    'edges': """
+    CREATE INDEX IF NOT EXISTS idx_tiger_data_{abbr}_edges_tlid ON tiger_data.{abbr}_edges USING btree (tlid);
+    CREATE INDEX IF NOT EXISTS idx_tiger_data_{abbr}_edgestfidr ON tiger_data.{abbr}_edges USING btree (tfidr);
+    CREATE INDEX IF NOT EXISTS idx_tiger_data_{abbr}_edges_tfidl ON tiger_data.{abbr}_edges USING btree (tfidl);
+    CREATE INDEX IF NOT EXISTS idx_tiger_data_{abbr}_edges_countyfp ON tiger_data.{abbr}_edges USING btree (countyfp);
+    CREATE INDEX IF NOT EXISTS tiger_data_{abbr}_edges_the_geom_gist ON tiger_data.{abbr}_edges USING gist(the_geom);
+    CREATE INDEX IF NOT EXISTS idx_tiger_data_{abbr}_edges_zipl ON tiger_data.{abbr}_edges USING btree (zipl);
+    """,
+    'addr': """
+    CREATE INDEX IF NOT EXISTS idx_tiger_data_{abbr}_addr_least_address ON tiger_data.{abbr}_addr USING btree (least_hn(fromhn,tohn));
+    CREATE INDEX IF NOT EXISTS idx_tiger_data_{abbr}_addr_tlid_statefp ON tiger_data.{abbr}_addr USING btree (tlid, statefp);
+    CREATE INDEX IF NOT EXISTS idx_tiger_data_{abbr}_addr_zip ON tiger_data.{abbr}_addr USING btree (zip);
+    """,
+    'tract': """
+    CREATE INDEX IF NOT EXISTS tiger_data_{abbr}_tract_the_geom_gist ON tiger_data.{abbr}_tract USING gist(the_geom);
+    """,
+    'tabblock20': """
+    CREATE INDEX IF NOT EXISTS tiger_data_{abbr}_tabblock20_the_geom_gist ON tiger_data.{abbr}_tabblock20 USING gist(the_geom);
+    """,
+}
+
 # match substrings that starts with "tl and ends with > in a string
 REGEX_tl_filename_pattern = re.compile('(?=\"tl)(.*?)(?<=>)')
 # match \ " > in a string
@@ -81,6 +122,10 @@ def download_extract_urls_of_all_files(section, fips):
             current_file.extractall(TEMP_DIR)
 
 
+def create_state_section_indexes(db, section, abbr):
+    db.execute(STATE_SECTION_INDEX_SQL[section].format(abbr=abbr))
+
+
 def load_state_data(abbr, fips):
     db = Database()
     abbr = abbr.lower()
@@ -102,12 +147,7 @@ def load_state_data(abbr, fips):
     download_extract(section, fips)
     create_state_section_table_and_add_data(section, abbr, fips, primary_key, YEAR)
 
-    create_index_sql_queries = f"""
-    CREATE INDEX IF NOT EXISTS idx_{abbr}_place_soundex_name ON tiger_data.{abbr}_place USING btree (soundex(name));
-    CREATE INDEX IF NOT EXISTS tiger_data_{abbr}_place_the_geom_gist ON tiger_data.{abbr}_place USING gist(the_geom);
-    """
-
-    db.execute(create_index_sql_queries)
+    create_state_section_indexes(db, section, abbr)
 
     print(f"{start_message} - Done\n")
 
@@ -124,12 +164,7 @@ def load_state_data(abbr, fips):
     download_extract(section, fips)
     create_state_section_table_and_add_data(section, abbr, fips, primary_key, YEAR)
 
-    create_index_sql_queries = f"""
-    CREATE INDEX IF NOT EXISTS tiger_data_{abbr}_cousub_the_geom_gist ON tiger_data.{abbr}_cousub USING gist(the_geom);
-    CREATE INDEX IF NOT EXISTS idx_tiger_data_{abbr}_cousub_countyfp ON tiger_data.{abbr}_cousub USING btree(countyfp);
-    """
-
-    db.execute(create_index_sql_queries)
+    create_state_section_indexes(db, section, abbr)
 
     print(f"{start_message} - Done\n")
 
@@ -146,7 +181,7 @@ def load_state_data(abbr, fips):
     download_extract(section, fips)
     create_state_section_table_and_add_data(section, abbr, fips, primary_key, YEAR)
 
-    db.execute(f"CREATE INDEX IF NOT EXISTS tiger_data_{abbr}_tract_the_geom_gist ON tiger_data.{abbr}_tract USING gist(the_geom)")
+    create_state_section_indexes(db, section, abbr)
 
     print(f"{start_message} - Done\n")
 
@@ -170,13 +205,7 @@ def load_state_data(abbr, fips):
 
     create_state_section_table_and_add_data(section, abbr, fips, primary_key, YEAR, dbf_files)
 
-    create_index_sql_queries = f"""
-    CREATE INDEX IF NOT EXISTS tiger_data_{abbr}_faces_the_geom_gist ON tiger_data.{abbr}_faces USING gist(the_geom);
-    CREATE INDEX IF NOT EXISTS idx_tiger_data_{abbr}_faces_tfid ON tiger_data.{abbr}_faces USING btree (tfid);
-    CREATE INDEX IF NOT EXISTS idx_tiger_data_{abbr}_faces_countyfp ON tiger_data.{abbr}_faces USING btree (countyfp);
-    """
-
-    db.execute(create_index_sql_queries)
+    create_state_section_indexes(db, section, abbr)
 
     print(f"{start_message} - Done\n")
 
@@ -200,13 +229,7 @@ def load_state_data(abbr, fips):
 
     create_state_section_table_and_add_data(section, abbr, fips, primary_key, YEAR, dbf_files)
 
-    create_index_sql_queries = f"""
-    CREATE INDEX IF NOT EXISTS idx_tiger_data_{abbr}_featnames_snd_name ON tiger_data.{abbr}_featnames USING btree (soundex(name));
-    CREATE INDEX IF NOT EXISTS idx_tiger_data_{abbr}_featnames_lname ON tiger_data.{abbr}_featnames USING btree (lower(name));
-    CREATE INDEX IF NOT EXISTS idx_tiger_data_{abbr}_featnames_tlid_statefp ON tiger_data.{abbr}_featnames USING btree (tlid,statefp);
-    """
-
-    db.execute(create_index_sql_queries)
+    create_state_section_indexes(db, section, abbr)
 
     print(f"{start_message} - Done\n")
 
@@ -230,16 +253,7 @@ def load_state_data(abbr, fips):
 
     create_state_section_table_and_add_data(section, abbr, fips, primary_key, YEAR, dbf_files)
 
-    create_index_sql_queries = f"""
-    CREATE INDEX IF NOT EXISTS idx_tiger_data_{abbr}_edges_tlid ON tiger_data.{abbr}_edges USING btree (tlid);
-    CREATE INDEX IF NOT EXISTS idx_tiger_data_{abbr}_edgestfidr ON tiger_data.{abbr}_edges USING btree (tfidr);
-    CREATE INDEX IF NOT EXISTS idx_tiger_data_{abbr}_edges_tfidl ON tiger_data.{abbr}_edges USING btree (tfidl);
-    CREATE INDEX IF NOT EXISTS idx_tiger_data_{abbr}_edges_countyfp ON tiger_data.{abbr}_edges USING btree (countyfp);
-    CREATE INDEX IF NOT EXISTS tiger_data_{abbr}_edges_the_geom_gist ON tiger_data.{abbr}_edges USING gist(the_geom);
-    CREATE INDEX IF NOT EXISTS idx_tiger_data_{abbr}_edges_zipl ON tiger_data.{abbr}_edges USING btree (zipl);
-    """
-
-    db.execute(create_index_sql_queries)
+    create_state_section_indexes(db, section, abbr)
 
     print(f"{start_message} - Done\n")
 
@@ -263,13 +277,7 @@ def load_state_data(abbr, fips):
 
     create_state_section_table_and_add_data(section, abbr, fips, primary_key, YEAR, dbf_files)
 
-    create_index_sql_queries = f"""
-    CREATE INDEX IF NOT EXISTS idx_tiger_data_{abbr}_addr_least_address ON tiger_data.{abbr}_addr USING btree (least_hn(fromhn,tohn));
-    CREATE INDEX IF NOT EXISTS idx_tiger_data_{abbr}_addr_tlid_statefp ON tiger_data.{abbr}_addr USING btree (tlid, statefp);
-    CREATE INDEX IF NOT EXISTS idx_tiger_data_{abbr}_addr_zip ON tiger_data.{abbr}_addr USING btree (zip);
-    """
-
-    db.execute(create_index_sql_queries)
+    create_state_section_indexes(db, section, abbr)
 
     print(f"{start_message} - Done\n")
 
@@ -289,7 +297,7 @@ def load_state_data(abbr, fips):
     download_extract(section, fips)
     create_state_section_table_and_add_data(section, abbr, fips, primary_key, YEAR)
 
-    db.execute(f"CREATE INDEX IF NOT EXISTS tiger_data_{abbr}_tabblock20_the_geom_gist ON tiger_data.{abbr}_tabblock20 USING gist(the_geom)")
+    create_state_section_indexes(db, section, abbr)
 
     print(f"{start_message} - Done\n")
 
@@ -403,6 +411,73 @@ def load_zip_tables_data(abbr, fips):
 
     print(f"{start_message} - Done\n")
 
+    ########################
+    # Locality centroids
+    ########################
+
+    start_message = "Started to setup locality centroids"
+    print(start_message)
+
+    create_locality_centroid_table(db)
+
+    # Rows of a state are replaced so loading a state again doesnt duplicate them
+    db.execute("DELETE FROM tiger_data.locality_centroid WHERE stusps = %s", [abbr.upper()])
+
+    # A zip code is located at the centroid of its edges and named after the first place it has in zip_state_loc
+    db.execute(
+        f"""
+        INSERT INTO tiger_data.locality_centroid(kind, stusps, zip, place, latitude, longitude)
+        SELECT 'zip', '{abbr.upper()}', c.zip,
+        (SELECT z.place FROM tiger_data.{abbr}_zip_state_loc AS z WHERE z.zip = c.zip ORDER BY z.place LIMIT 1),
+        ST_Y(c.center), ST_X(c.center)
+        FROM (
+            SELECT e.zipl AS zip, ST_Centroid(ST_Collect(e.the_geom)) AS center
+            FROM tiger_data.{abbr}_edges AS e WHERE e.zipl IS NOT NULL GROUP BY e.zipl
+        ) AS c
+        """
+    )
+
+    # A place is located at its census internal point, when several places share a name the largest one is kept
+    db.execute(
+        f"""
+        INSERT INTO tiger_data.locality_centroid(kind, stusps, zip, place, latitude, longitude)
+        SELECT DISTINCT ON (lower(p.name)) 'place', '{abbr.upper()}',
+        (SELECT z.zip FROM tiger_data.{abbr}_zip_state_loc AS z WHERE z.place = p.name ORDER BY z.zip LIMIT 1),
+        p.name,
+        COALESCE(p.intptlat::float8, ST_Y(ST_PointOnSurface(p.the_geom))),
+        COALESCE(p.intptlon::float8, ST_X(ST_PointOnSurface(p.the_geom)))
+        FROM tiger_data.{abbr}_place AS p
+        ORDER BY lower(p.name), p.aland DESC NULLS LAST
+        """
+    )
+
+    db.execute("vacuum analyze tiger_data.locality_centroid")
+
+    print(f"{start_message} - Done\n")
+
+
+def create_locality_centroid_table(db):
+    """
+    Creates the table of zip code and place centroids Database.get_geocoded_data answers zip code only
+    and city and state only addresses from, every state adds its rows in load_zip_tables_data
+    """
+
+    db.execute(
+        """
+        CREATE TABLE IF NOT EXISTS tiger_data.locality_centroid(
+            kind text NOT NULL,
+            stusps varchar(2) NOT NULL,
+            zip varchar(5),
+            place varchar(100),
+            latitude float8 NOT NULL,
+            longitude float8 NOT NULL
+        )
+        """
+    )
+
+    db.execute("CREATE INDEX IF NOT EXISTS idx_tiger_data_locality_centroid_zip ON tiger_data.locality_centroid USING btree(zip) WHERE kind = 'zip'")
+    db.execute("CREATE INDEX IF NOT EXISTS idx_tiger_data_locality_centroid_place ON tiger_data.locality_centroid USING btree(stusps, lower(place)) WHERE kind = 'place'")
+
 
 def load_states_data_caller():
     current_working_directory = os.getcwd()
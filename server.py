@@ -0,0 +1,298 @@
+"""
+HTTP geocoding service, concurrent requests are collected into micro batches that run as one set based statement
+so one database connection answers many requests at a time
+
+GET /geocode?address=60 TEMPLE PL, BOSTON, MA          {"address": ..., "latitude": ..., "longitude": ..., "rating": ..., "confidence": ...}
+GET /geocode?address=...&pagc=1                       same, address is normalized with pagc_normalize_address
+GET /reverse?latitude=42.005&longitude=-71.496         {"street_1": ..., "street_2": ..., "street_3": ...}
+GET /metrics                                          Prometheus text format
+GET /health
+
+python -m server --port 8080 --batch-size 100 --batch-delay 5
+"""
+
+import argparse
+import asyncio
+import json
+import math
+from urllib.parse import parse_qs, urlsplit
+
+from geocoder import POOL_MAX_IDLE, AsyncDatabase
+from metrics import GeocoderMetrics
+
+
+# A batch is sent to the database when it has this many requests or its first request waited this many milliseconds
+BATCH_SIZE = 100
+BATCH_DELAY = 5
+
+# Connections of the server, every batch uses one of them
+SERVER_POOL_SIZE = 4
+
+# Requests with a longer request line and headers are rejected
+MAX_HEADER_BYTES = 16 * 1024
+
+# Requests with a longer body are rejected before it is read, no endpoint uses a body
+MAX_BODY_BYTES = 64 * 1024
+
+STATUS_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+
+class MicroBatcher:
+    def __init__(self, run_batch, batch_size=BATCH_SIZE, batch_delay=BATCH_DELAY):
+        """
+        Collects items submitted by concurrent callers and runs them with one run_batch call per batch,
+        a batch is flushed when it has batch_size items or batch_delay milliseconds after its first item arrived
+
+        run_batch is a coroutine function taking a list of items and returning a list of results in the same order,
+        every caller gets the result of its own item back or the exception run_batch raised
+        """
+        self.run_batch = run_batch
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay / 1000
+
+        self.items = []
+        self.futures = []
+        self.timer = None
+        self.running = set()
+
+        self.batches = 0
+        self.batched_items = 0
+
+    async def submit(self, item):
+        future = asyncio.get_running_loop().create_future()
+        self.items.append(item)
+        self.futures.append(future)
+
+        if len(self.items) >= self.batch_size:
+            self.flush()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().call_later(self.batch_delay, self.flush)
+
+        return await future
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+        if not self.items:
+            return
+
+        items, futures = self.items, self.futures
+        self.items, self.futures = [], []
+
+        # Batches run concurrently, the connection pool bounds how many reach the database at the same time
+        task = asyncio.ensure_future(self.run(items, futures))
+        self.running.add(task)
+        task.add_done_callback(self.running.discard)
+
+    async def run(self, items, futures):
+        self.batches += 1
+        self.batched_items += len(items)
+
+        try:
+            results = await self.run_batch(items)
+
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for future, result in zip(futures, results):
+            # A caller that disconnected cancelled its future
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'items': self.batched_items,
+            'average_batch_size': self.batched_items / self.batches if self.batches else 0.0,
+        }
+
+
+class GeocodingServer:
+    def __init__(self, db, batch_size=BATCH_SIZE, batch_delay=BATCH_DELAY, metrics=None):
+        """
+        Serves forward and reverse geocoding over HTTP from an open AsyncDatabase,
+        metrics is the metrics.GeocoderMetrics of db if it has one and is served on /metrics
+        """
+        self.db = db
+        self.metrics = metrics
+        self.batchers = {
+            'default': MicroBatcher(lambda addresses: db.geocode_many(addresses, False), batch_size, batch_delay),
+            'pagc': MicroBatcher(lambda addresses: db.geocode_many(addresses, True), batch_size, batch_delay),
+            'reverse': MicroBatcher(db.reverse_geocode_many, batch_size, batch_delay),
+        }
+
+        if metrics is not None:
+            for name, batcher in self.batchers.items():
+                metrics.add_gauges(f"batcher_{name}", batcher.stats)
+
+    async def handle_geocode(self, parameters):
+        address = parameters.get("address", "").strip()
+        if not address:
+            return 400, {'error': "address is required"}
+
+        batcher = self.batchers["pagc" if parameters.get("pagc") in {"1", "true"} else "default"]
+        geocoded_data = await batcher.submit(address)
+
+        return 200, {**geocoded_data.to_dict(), 'confidence': geocoded_data.confidence.value}
+
+    async def handle_reverse(self, parameters):
+        try:
+            latitude = float(parameters["latitude"])
+            longitude = float(parameters["longitude"])
+        except (KeyError, ValueError):
+            return 400, {'error': "latitude and longitude are required numbers"}
+
+        if not (math.isfinite(latitude) and math.isfinite(longitude)):
+            return 400, {'error': "latitude and longitude are required numbers"}
+
+        street_data = await self.batchers["reverse"].submit((latitude, longitude))
+
+        return 200, street_data.to_dict()
+
+    async def handle_request(self, method, target):
+        """
+        Returns (status, content type, body) of a request
+        """
+
+        url = urlsplit(target)
+        parameters = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+        if method != "GET":
+            return 405, "application/json", json.dumps({'error': "only GET is supported"}).encode()
+
+        if url.path == "/metrics":
+            body = self.metrics.to_prometheus() if self.metrics is not None else ""
+            return 200, "text/plain; version=0.0.4", body.encode()
+
+        if url.path == "/geocode":
+            status, data = await self.handle_geocode(parameters)
+        elif url.path == "/reverse":
+            status, data = await self.handle_reverse(parameters)
+        elif url.path == "/health":
+            status, data = 200, {'status': "ok"}
+        else:
+            status, data = 404, {'error': f"{url.path} not found"}
+
+        return status, "application/json", json.dumps(data).encode()
+
+    async def handle_connection(self, reader, writer):
+        """
+        Serves the requests of one connection, HTTP/1.1 connections are kept alive until the client closes them
+        """
+
+        try:
+            while True:
+                try:
+                    header = await reader.readuntil(b"\r\n\r\n")
+                except asyncio.IncompleteReadError:
+                    break
+                except asyncio.LimitOverrunError:
+                    await self.write_response(writer, 400, "application/json", b'{"error": "headers too long"}', False)
+                    break
+
+                lines = header.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ")
+                except ValueError:
+                    await self.write_response(writer, 400, "application/json", b'{"error": "bad request line"}', False)
+                    break
+
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+
+                # A body isnt used by any endpoint but has to be read so the next request starts at the right place
+                # isdigit alone accepts latin-1 digits like superscripts that int() doesnt
+                content_length = headers.get("content-length", "0")
+                if not (content_length.isascii() and content_length.isdecimal()):
+                    await self.write_response(writer, 400, "application/json", b'{"error": "bad content-length"}', False)
+                    break
+
+                content_length = int(content_length)
+                if content_length > MAX_BODY_BYTES:
+                    await self.write_response(writer, 413, "application/json", b'{"error": "body too large"}', False)
+                    break
+
+                if content_length:
+                    try:
+                        await reader.readexactly(content_length)
+                    except asyncio.IncompleteReadError:
+                        break
+
+                connection_header = headers.get("connection", "").lower()
+                keep_alive = connection_header != "close" if version == "HTTP/1.1" else connection_header == "keep-alive"
+
+                try:
+                    status, content_type, body = await self.handle_request(method, target)
+                except Exception as e:
+                    print(f"{method} {target} failed - {e!r}")
+                    status, content_type, body = 500, "application/json", json.dumps({'error': str(e)}).encode()
+
+                await self.write_response(writer, status, content_type, body, keep_alive)
+
+                if not keep_alive:
+                    break
+
+        except ConnectionError:
+            pass
+
+        finally:
+            writer.close()
+
+    async def write_response(self, writer, status, content_type, body, keep_alive):
+        head = (
+            f"HTTP/1.1 {status} {STATUS_REASONS[status]}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_HEADER_BYTES)
+        print(f"Geocoding server listening on http://{host}:{port}")
+
+        async with server:
+            await server.serve_forever()
+
+
+async def main(host, port, batch_size, batch_delay, pool_size):
+    metrics = GeocoderMetrics()
+
+    async with AsyncDatabase(min_size=pool_size, max_size=pool_size, max_idle=POOL_MAX_IDLE, metrics=metrics) as db:
+        await GeocodingServer(db, batch_size, batch_delay, metrics).serve(host, port)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="HTTP geocoding service with request micro batching")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="requests sent to the database in one statement")
+    parser.add_argument("--batch-delay", type=float, default=BATCH_DELAY, help="milliseconds the first request of a batch waits for more requests")
+    parser.add_argument("--pool-size", type=int, default=SERVER_POOL_SIZE, help="database connections, batches beyond it wait for a free one")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = parse_arguments()
+
+    try:
+        asyncio.run(main(arguments.host, arguments.port, arguments.batch_size, arguments.batch_delay, arguments.pool_size))
+    except KeyboardInterrupt:
+        pass
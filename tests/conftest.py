@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The modules are imported from the project root like the scripts and benchmarks do
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,89 @@
+from contextlib import contextmanager
+
+from geocoder import ADD_ADDRESS_HITS_SQL, Database
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, sql_query, parameters=None, prepare=None):
+        self.connection.executed.append((sql_query, parameters))
+
+    def fetchall(self):
+        return self.connection.rows
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+def make_database(rows):
+    db = Database(replicas=[], address_hits=True)
+    connection = FakeConnection(rows)
+
+    @contextmanager
+    def get_connection():
+        yield connection
+
+    db.get_connection = get_connection
+    return db, connection
+
+
+def get_address_hit_writes(connection):
+    return [parameters for sql_query, parameters in connection.executed if sql_query == ADD_ADDRESS_HITS_SQL]
+
+
+def test_unrestricted_batch_stores_new_hits():
+    rows = [("60 Temple Pl, Boston, MA 02111", 42.35, -71.06, 0, False, "60,,TEMPLE,Pl,,,BOSTON,MA,,t,")]
+    db, connection = make_database(rows)
+
+    assert db.query_geocode_many(["60 TEMPLE PL, BOSTON, MA"]) == [rows[0][:4]]
+    assert len(get_address_hit_writes(connection)) == 1
+
+
+def test_restricted_batch_doesnt_change_stored_hits():
+    rows = [("60 Temple Pl, Boston, MA 02111", 42.35, -71.06, 0, False, "60,,TEMPLE,Pl,,,BOSTON,MA,,t,")]
+    db, connection = make_database(rows)
+
+    assert db.query_geocode_many(["60 TEMPLE PL, BOSTON, MA"], region="SRID=4269;POINT(-71 42)") == [rows[0][:4]]
+    assert get_address_hit_writes(connection) == []
+
+
+def test_restricted_deduplicated_batch_doesnt_change_stored_hits():
+    normalized_address = "60,,TEMPLE,Pl,,,BOSTON,MA,,t,"
+    db, connection = make_database([(1, normalized_address)])
+
+    # Both statements of the deduplicated path read the same fake rows, the second one needs the geocode_key columns
+    connection.rows = [(1, normalized_address)]
+    original_cursor = connection.cursor
+
+    def cursor():
+        fake_cursor = original_cursor()
+        original_execute = fake_cursor.execute
+
+        def execute(sql_query, parameters=None, prepare=None):
+            original_execute(sql_query, parameters, prepare)
+            if "geocode_key" in sql_query:
+                connection.rows = [("60 Temple Pl, Boston, MA 02111", 42.35, -71.06, 0, False, normalized_address)]
+
+        fake_cursor.execute = execute
+        return fake_cursor
+
+    connection.cursor = cursor
+
+    results = db.query_geocode_many_deduplicated(["60 TEMPLE PL, BOSTON, MA"], region="SRID=4269;POINT(-71 42)")
+
+    assert results == [("60 Temple Pl, Boston, MA 02111", 42.35, -71.06, 0)]
+    assert get_address_hit_writes(connection) == []
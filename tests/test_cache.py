@@ -0,0 +1,88 @@
+import cache
+from cache import METERS_PER_DEGREE_LATITUDE, GeocodeCache, ReverseGeocodeCache, grid_cell_key, normalize_address_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_normalize_address_key_ignores_case_punctuation_and_spacing():
+    assert normalize_address_key("60 TEMPLE PL, BOSTON, MA") == "60 TEMPLE PL BOSTON MA"
+    assert normalize_address_key("  60 Temple Pl.   Boston,MA ") == "60 TEMPLE PL BOSTON MA"
+    assert normalize_address_key("60 Temple Pl, Boston, MA") != normalize_address_key("61 Temple Pl, Boston, MA")
+
+
+def test_least_recently_used_entry_is_evicted():
+    geocode_cache = GeocodeCache(max_entries=2)
+    geocode_cache.set("default", "a", 1)
+    geocode_cache.set("default", "b", 2)
+
+    # Reading a makes b the least recently used entry
+    assert geocode_cache.get("default", "a") == 1
+    geocode_cache.set("default", "c", 3)
+
+    assert geocode_cache.get("default", "b") is None
+    assert geocode_cache.get_many("default", ["a", "c"]) == [1, 3]
+    assert geocode_cache.stats()["evictions"] == 1
+
+
+def test_namespaces_dont_share_entries():
+    geocode_cache = GeocodeCache()
+    geocode_cache.set("default", "a", 1)
+
+    assert geocode_cache.get("pagc", "a") is None
+    assert geocode_cache.get("default", "a") == 1
+
+
+def test_entries_expire_after_their_ttl(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    geocode_cache = GeocodeCache(ttl=60)
+    geocode_cache.set("default", "a", 1)
+
+    clock.now += 59
+    assert geocode_cache.get("default", "a") == 1
+
+    clock.now += 2
+    assert geocode_cache.get("default", "a") is None
+    assert len(geocode_cache) == 0
+    assert geocode_cache.stats() == {'entries': 0, 'hits': 1, 'misses': 1, 'evictions': 0, 'hit_rate': 0.5}
+
+
+def test_entries_without_ttl_dont_expire(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    geocode_cache = GeocodeCache(ttl=None)
+    geocode_cache.set("default", "a", 1)
+
+    clock.now += 10 ** 9
+    assert geocode_cache.get("default", "a") == 1
+
+
+def test_points_of_one_grid_cell_share_a_key():
+    # 1 m apart inside a 5 m cell, the row and column are far from a cell edge
+    latitude = 42.0000225
+    longitude = -71.0000303
+
+    assert grid_cell_key(latitude, longitude, 5) == grid_cell_key(latitude + 1 / METERS_PER_DEGREE_LATITUDE, longitude, 5)
+    assert grid_cell_key(latitude, longitude, 5) != grid_cell_key(latitude + 10 / METERS_PER_DEGREE_LATITUDE, longitude, 5)
+
+
+def test_grid_cells_are_about_as_wide_as_tall():
+    # 4 m of longitude at 60 degrees north is twice as many degrees as at the equator
+    step = 4 / METERS_PER_DEGREE_LATITUDE
+
+    assert grid_cell_key(60.0, 0.1, 5).split()[1] == grid_cell_key(60.0, 0.1 + step, 5).split()[1]
+    assert grid_cell_key(60.0, 0.1, 5).split()[1] != grid_cell_key(60.0, 0.1 + 3 * step, 5).split()[1]
+
+
+def test_reverse_cache_reuses_the_result_of_a_nearby_point():
+    reverse_cache = ReverseGeocodeCache(cell_size=50)
+    reverse_cache.set_point(42.0001, -71.0001, "street")
+
+    assert reverse_cache.get_point(42.00011, -71.00011) == "street"
+    assert reverse_cache.get_point(42.01, -71.0001) is None
@@ -0,0 +1,98 @@
+import csv
+import json
+
+import pytest
+
+from geocode_file import geocode_file
+from geocoder import GeocodeResult, GeocodingConfidence
+
+
+class FakeDatabase:
+    """Matches every address with its length as rating, fails once it has geocoded fail_after addresses"""
+
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+        self.addresses = []
+
+    def geocode_many(self, addresses, **kwargs):
+        if self.fail_after is not None and len(self.addresses) + len(addresses) > self.fail_after:
+            raise KeyboardInterrupt
+
+        self.addresses.extend(addresses)
+        return [GeocodeResult(address.upper(), 41.0, -71.0, len(address), GeocodingConfidence.POOR) for address in addresses]
+
+
+def write_input(tmp_path, number_of_rows=10):
+    input_path = tmp_path / "addresses.csv"
+    with open(input_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "address"])
+        writer.writerows([[index, f"{index} Main St"] for index in range(number_of_rows)])
+
+    return input_path
+
+
+def read_output(output_path):
+    with open(output_path, newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def test_csv_output_resumes_after_the_last_checkpoint(tmp_path):
+    input_path = write_input(tmp_path)
+    output_path = tmp_path / "geocoded.csv"
+
+    # Killed while geocoding the third chunk, and the output has half a row written after the second checkpoint
+    with pytest.raises(KeyboardInterrupt):
+        geocode_file(input_path, output_path, chunk_size=3, db=FakeDatabase(fail_after=7))
+    with open(output_path, "a") as f:
+        f.write("6,6 Main St,6 MAIN")
+
+    db = FakeDatabase()
+    assert geocode_file(input_path, output_path, chunk_size=3, db=db) == 10
+
+    assert db.addresses == [f"{index} Main St" for index in range(6, 10)]
+    rows = read_output(output_path)
+    assert [row["id"] for row in rows] == [str(index) for index in range(10)]
+    assert rows[6]["geocoded_address"] == "6 MAIN ST"
+    assert rows[6]["rating"] == "9"
+
+
+def test_parquet_output_resumes_after_the_last_checkpoint(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    input_path = write_input(tmp_path)
+    output_path = tmp_path / "geocoded.parquet"
+
+    with pytest.raises(KeyboardInterrupt):
+        geocode_file(input_path, output_path, chunk_size=3, db=FakeDatabase(fail_after=7))
+    # A part file written after the last checkpoint
+    (output_path / "part-00002.parquet").write_bytes(b"not parquet")
+
+    db = FakeDatabase()
+    assert geocode_file(input_path, output_path, chunk_size=3, db=db) == 10
+
+    assert db.addresses == [f"{index} Main St" for index in range(6, 10)]
+    table = pq.read_table(output_path)
+    assert table.column("id").to_pylist() == [str(index) for index in range(10)]
+    assert table.column("rating").to_pylist() == [len(f"{index} Main St") for index in range(10)]
+
+
+def test_checkpoint_of_other_options_isnt_resumed(tmp_path):
+    input_path = write_input(tmp_path)
+    output_path = tmp_path / "geocoded.csv"
+
+    with pytest.raises(KeyboardInterrupt):
+        geocode_file(input_path, output_path, chunk_size=3, db=FakeDatabase(fail_after=7))
+    output_bytes = output_path.stat().st_size
+
+    with pytest.raises(Exception, match="--restart"):
+        geocode_file(input_path, output_path, chunk_size=3, pagc_normalize_address=True, db=FakeDatabase())
+    other_path = tmp_path / "other"
+    other_path.mkdir()
+    with pytest.raises(Exception, match="--restart"):
+        geocode_file(write_input(other_path), output_path, chunk_size=3, db=FakeDatabase())
+
+    # The output of the checkpointed run is left alone
+    assert output_path.stat().st_size == output_bytes
+    assert json.loads((tmp_path / "geocoded.csv.checkpoint").read_text())["rows_done"] == 6
+
+    assert geocode_file(input_path, output_path, chunk_size=3, pagc_normalize_address=True, restart=True, db=FakeDatabase()) == 10
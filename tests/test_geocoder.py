@@ -0,0 +1,281 @@
+import threading
+from contextlib import contextmanager
+
+import pytest
+
+import geocoder
+from cache import GeocodeCache
+from geocoder import AsyncDatabase, Database, GeocodingConfidence
+from metrics import GeocoderMetrics
+
+
+class FakeCursor:
+    """
+    Stands in for geocode() over one connection, ratings maps an address to its (default rating, pagc rating)
+    and None or a missing address is no match
+    """
+
+    def __init__(self, ratings):
+        self.ratings = ratings
+        self.executed = []
+        self.prepared = []
+        self.result = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def geocode(self, address, pagc_normalize_address):
+        rating = self.ratings.get(address, (None, None))[pagc_normalize_address]
+        if rating is None:
+            return None, None, None, None
+
+        return f"{address} {'pagc' if pagc_normalize_address else 'default'}", 41.0, -71.0, rating
+
+    def execute(self, sql_query, parameters=None, prepare=None):
+        pagc_normalize_address = "pagc_normalize_address" in sql_query
+        self.executed.append((pagc_normalize_address, parameters[0]))
+        self.prepared.append((sql_query, prepare))
+
+        # normalize_address of query_geocode_many_deduplicated is stood in for by upper case
+        if "n::text" in sql_query:
+            self.result = [(ordinality, address.upper()) for ordinality, address in enumerate(parameters[0], 1)]
+        elif isinstance(parameters[0], list):
+            self.result = [self.geocode(address, pagc_normalize_address) for address in parameters[0]]
+        else:
+            self.result = self.geocode(parameters[0], pagc_normalize_address)
+
+    def fetchone(self):
+        return self.result
+
+    def fetchall(self):
+        return self.result
+
+
+class FakeConnection:
+    def __init__(self, ratings):
+        self.ratings = ratings
+        self.cursors = []
+
+    def cursor(self):
+        cursor = FakeCursor(self.ratings)
+        self.cursors.append(cursor)
+        return cursor
+
+    @property
+    def executed(self):
+        return [statement for cursor in self.cursors for statement in cursor.executed]
+
+    @property
+    def prepared(self):
+        return [statement for cursor in self.cursors for statement in cursor.prepared]
+
+
+def make_database(ratings, **kwargs):
+    db = Database(replicas=[], **kwargs)
+    connection = FakeConnection(ratings)
+
+    @contextmanager
+    def get_connection():
+        yield connection
+
+    db.get_connection = get_connection
+    return db, connection
+
+
+@pytest.fixture
+def unread_env(monkeypatch):
+    def load_dotenv(path):
+        raise AssertionError(f"{path} was read before the first connection")
+
+    monkeypatch.setattr(geocoder, "db_parameters", {})
+    monkeypatch.setattr(geocoder, "load_dotenv", load_dotenv)
+    monkeypatch.setenv("DB_REPLICAS", "host=replica-1")
+
+
+def test_creating_a_database_doesnt_read_env(unread_env):
+    metrics = GeocoderMetrics()
+
+    db = Database(pooled=True, metrics=metrics)
+
+    assert db.pool is None
+    assert db.replica_router is None
+    assert metrics.read_gauges() == {}
+    assert geocoder.db_parameters == {}
+
+
+def test_creating_an_async_database_doesnt_read_env(unread_env):
+    metrics = GeocoderMetrics()
+
+    db = AsyncDatabase(metrics=metrics)
+
+    assert db.pool is None
+    assert metrics.read_gauges() == {}
+
+
+def test_cascade_stats_add_up_across_threads():
+    db, _ = make_database({})
+
+    def add_stats():
+        for _ in range(1000):
+            db.add_cascade_stats("default", 1, 0.5)
+
+    threads = [threading.Thread(target=add_stats) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert db.cascade_stats["default"] == {'addresses': 8000, 'seconds': 4000.0}
+
+
+def test_deduplicate_geocodes_every_normalized_address_once():
+    db, connection = make_database({"1 MAIN ST": (5, None)})
+
+    geocoded_data_list = db.geocode_many(["1 Main St", "2 Oak St", "1 main st", "1 MAIN ST"], deduplicate=True)
+
+    assert [geocoded_data.rating for geocoded_data in geocoded_data_list] == [5, None, 5, 5]
+    assert connection.executed[-1] == (False, ["1 MAIN ST", "2 OAK ST"])
+    assert db.deduplication_stats == {'rows': 4, 'distinct': 2}
+    assert db.get_deduplication_ratio() == 0.5
+
+
+def test_deduplication_stats_add_up_across_threads():
+    db, _ = make_database({})
+
+    def geocode_batches():
+        for _ in range(200):
+            db.geocode_many(["1 Main St", "1 main st"], deduplicate=True)
+
+    threads = [threading.Thread(target=geocode_batches) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert db.deduplication_stats == {'rows': 3200, 'distinct': 1600}
+
+
+def test_geocode_many_keeps_input_order_across_batches():
+    addresses = [f"{number} Main St" for number in range(7)]
+    db, connection = make_database({address: (number, None) for number, address in enumerate(addresses) if number % 3})
+
+    geocoded_data_list = db.geocode_many(iter(addresses), batch_size=3)
+
+    assert [statement[1] for statement in connection.executed] == [addresses[0:3], addresses[3:6], addresses[6:7]]
+    assert [geocoded_data.rating for geocoded_data in geocoded_data_list] == [None, 1, 2, None, 4, 5, None]
+    assert [geocoded_data.address for geocoded_data in geocoded_data_list][1] == "1 Main St default"
+    assert geocoded_data_list[0].confidence == GeocodingConfidence.NO_MATCH
+
+
+def test_geocode_many_of_nothing_sends_nothing():
+    db, connection = make_database({})
+
+    assert db.geocode_many([]) == []
+    assert connection.executed == []
+
+
+def test_geocode_many_doesnt_send_an_empty_last_batch():
+    addresses = [f"{number} Main St" for number in range(6)]
+    db, connection = make_database({})
+
+    assert len(db.geocode_many(addresses, batch_size=3)) == 6
+    assert [statement[1] for statement in connection.executed] == [addresses[0:3], addresses[3:6]]
+
+
+@pytest.mark.parametrize("prepare", [True, False])
+def test_geocoding_statements_are_prepared_unless_turned_off(prepare):
+    db, connection = make_database({}, prepare=prepare)
+
+    db.get_geocoded_data("1 Main St")
+    db.get_geocoded_data("2 Main St")
+    db.geocode_many(["3 Main St", "4 Main St"])
+
+    assert all(statement_prepare is prepare for _, statement_prepare in connection.prepared)
+
+
+def test_addresses_are_parameters_so_one_statement_is_prepared():
+    db, connection = make_database({})
+
+    db.get_geocoded_data("1 Main St")
+    db.get_geocoded_data("2 Oak St")
+
+    first_sql_query, second_sql_query = (sql_query for sql_query, _ in connection.prepared)
+    assert first_sql_query == second_sql_query
+    assert "Main" not in first_sql_query
+
+
+def test_cached_addresses_arent_sent_again():
+    db, connection = make_database({"60 Temple Pl, Boston, MA": (0, None)}, cache=GeocodeCache())
+
+    first_geocoded_data = db.get_geocoded_data("60 Temple Pl, Boston, MA")
+    geocoded_data_list = db.geocode_many(["60 TEMPLE PL BOSTON MA", "1 Main St"])
+
+    assert geocoded_data_list[0] is first_geocoded_data
+    assert connection.executed == [(False, "60 Temple Pl, Boston, MA"), (False, ["1 Main St"])]
+
+
+CASCADE_RATINGS = {
+    "1 Good St": (5, None),
+    "2 Better Pagc St": (20, 3),
+    "3 Worse Pagc St": (20, 30),
+    "4 Pagc Only St": (None, 40),
+    "5 Nowhere St": (None, None),
+}
+
+
+def test_cascade_batch_keeps_the_better_stage():
+    db, connection = make_database(CASCADE_RATINGS)
+    addresses = list(CASCADE_RATINGS)
+
+    geocoded_data_list = db.geocode_many(addresses, cascade=True, cascade_rating_threshold=10)
+
+    assert [(geocoded_data.rating, geocoded_data.stage) for geocoded_data in geocoded_data_list] == [
+        (5, "default"),
+        (3, "pagc"),
+        (20, "default"),
+        (40, "pagc"),
+        (None, "default"),
+    ]
+    # Only the addresses above the threshold or without a match are geocoded again
+    assert connection.executed == [(False, addresses), (True, addresses[1:])]
+    assert db.cascade_stats["default"]["addresses"] == 5
+    assert db.cascade_stats["pagc"]["addresses"] == 4
+
+
+def test_cascade_of_one_address_keeps_the_better_stage():
+    db, connection = make_database(CASCADE_RATINGS)
+
+    geocoded_data_by_address = {address: db.get_geocoded_data(address, cascade=True, cascade_rating_threshold=10) for address in CASCADE_RATINGS}
+
+    assert geocoded_data_by_address["1 Good St"].stage == "default"
+    assert set(geocoded_data_by_address["1 Good St"].timings) == {"default"}
+    assert geocoded_data_by_address["2 Better Pagc St"].stage == "pagc"
+    assert set(geocoded_data_by_address["2 Better Pagc St"].timings) == {"default", "pagc"}
+    assert geocoded_data_by_address["3 Worse Pagc St"].stage == "default"
+    assert geocoded_data_by_address["4 Pagc Only St"].stage == "pagc"
+    assert geocoded_data_by_address["5 Nowhere St"].confidence == GeocodingConfidence.NO_MATCH
+    assert [address for pagc_normalize_address, address in connection.executed if pagc_normalize_address] == list(CASCADE_RATINGS)[1:]
+
+
+def test_cascade_columns_have_the_stage():
+    db, _ = make_database(CASCADE_RATINGS)
+
+    columns = db.geocode_many(list(CASCADE_RATINGS), cascade=True, cascade_rating_threshold=10, columnar=True)
+
+    assert columns["stage"] == ["default", "pagc", "default", "pagc", "default"]
+    assert list(columns["matched"]) == [True, True, True, True, False]
+
+
+def test_metrics_record_the_confidences_of_a_batch():
+    metrics = GeocoderMetrics()
+    db, _ = make_database({"1 Main St": (0, None)}, metrics=metrics)
+
+    db.geocode_many(["1 Main St", "2 Main St"])
+
+    operations = metrics.summary()["operations"]
+    assert list(operations) == ["geocode_many"]
+    assert operations["geocode_many"]["rows"] == 2
+    assert operations["geocode_many"]["confidences"] == {'excellent': 1, 'no match': 1}
@@ -0,0 +1,164 @@
+from contextlib import contextmanager
+
+import numpy as np
+
+from geocoder import (
+    CONFIDENCE_CATEGORIES,
+    LOCALITY_MANY_SQL,
+    LOCALITY_ZIP_SQL,
+    Database,
+    GeocodingConfidence,
+    parse_locality,
+)
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = []
+        self.result = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, sql_query, parameters=None, prepare=None):
+        self.executed.append((sql_query, parameters))
+        self.result = self.rows(sql_query, parameters)
+
+    def fetchone(self):
+        return self.result
+
+    def fetchall(self):
+        return self.result
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self.fake_cursor = cursor
+
+    def cursor(self):
+        return self.fake_cursor
+
+
+def get_zip_centroid(place, state, zip_code):
+    """Stands in for tiger_data.locality_centroid with the zip code 02895 of Woonsocket, RI"""
+
+    if zip_code != "02895" or (state and state.upper() != "RI") or (place and place.lower() != "woonsocket"):
+        return None
+
+    return ("Woonsocket", "RI", "02895", 42.0, -71.5)
+
+
+def find_zip_centroid(sql_query, parameters):
+    if sql_query == LOCALITY_ZIP_SQL:
+        zip_code, state, _, place, _ = parameters
+        return get_zip_centroid(place, state, zip_code)
+
+    if sql_query == LOCALITY_MANY_SQL:
+        return [
+            (ordinality, *(get_zip_centroid(place, state, zip_code) or (None,) * 5))
+            for ordinality, (place, state, zip_code) in enumerate(zip(*parameters), 1)
+        ]
+
+    # Every street address is matched by geocode() with a rating of 5
+    return [(address.upper(), 41.0, -71.0, 5) for address in parameters[0]]
+
+
+def make_database():
+    db = Database(replicas=[])
+    cursor = FakeCursor(find_zip_centroid)
+
+    @contextmanager
+    def get_connection():
+        yield FakeConnection(cursor)
+
+    db.get_connection = get_connection
+    return db, cursor
+
+
+def test_parse_locality():
+    assert parse_locality("02895") == (None, None, "02895")
+    assert parse_locality("RI 02895") == (None, "RI", "02895")
+    assert parse_locality("Woonsocket, RI 02895") == ("Woonsocket", "RI", "02895")
+    assert parse_locality("Boston, MA") == ("Boston", "MA", None)
+    assert parse_locality("60 TEMPLE PL, BOSTON, MA") is None
+    assert parse_locality("RI") is None
+
+
+def test_parse_locality_keeps_street_text_before_the_state():
+    # The text is kept so get_locality_data can check it against the place of the zip code
+    assert parse_locality("Main St, RI 02895") == ("Main St", "RI", "02895")
+    assert parse_locality("Cass Ave RI 02895") == ("Cass Ave", "RI", "02895")
+
+
+def test_zip_and_its_place_use_the_zip_centroid():
+    db, _ = make_database()
+
+    for address in ["02895", "RI 02895", "Woonsocket, RI 02895", "woonsocket ri 02895"]:
+        geocoded_data = db.get_locality_data(address)
+        assert geocoded_data.confidence == GeocodingConfidence.LOCALITY
+        assert geocoded_data.address == "Woonsocket, RI 02895"
+
+
+def test_street_without_house_number_falls_through_to_geocode():
+    db, cursor = make_database()
+
+    for address in ["Main St, RI 02895", "Cass Ave RI 02895", "Cass Avenue, Woonsocket RI 02895"]:
+        assert db.get_locality_data(address) is None
+
+    assert all(parameters[3] is not None for _, parameters in cursor.executed)
+
+
+def get_geocoded_addresses(cursor):
+    return [address for sql_query, parameters in cursor.executed if sql_query not in (LOCALITY_ZIP_SQL, LOCALITY_MANY_SQL) for address in parameters[0]]
+
+
+def test_geocode_many_answers_addresses_without_a_street_from_the_centroids():
+    db, cursor = make_database()
+    addresses = ["Woonsocket, RI 02895", "60 Temple Pl, Boston, MA", "RI 02895", "Main St, RI 02895"]
+
+    geocoded_data_list = db.geocode_many(addresses)
+
+    assert [geocoded_data.confidence for geocoded_data in geocoded_data_list] == [
+        GeocodingConfidence.LOCALITY,
+        GeocodingConfidence.FAIR,
+        GeocodingConfidence.LOCALITY,
+        GeocodingConfidence.FAIR,
+    ]
+    assert geocoded_data_list[0].address == "Woonsocket, RI 02895"
+    assert [sql_query for sql_query, _ in cursor.executed].count(LOCALITY_MANY_SQL) == 1
+    assert get_geocoded_addresses(cursor) == ["60 Temple Pl, Boston, MA", "Main St, RI 02895"]
+
+
+def test_geocode_many_without_locality_geocodes_everything():
+    db, cursor = make_database()
+    addresses = ["Woonsocket, RI 02895", "60 Temple Pl, Boston, MA"]
+
+    geocoded_data_list = db.geocode_many(addresses, locality=False)
+
+    assert all(geocoded_data.confidence == GeocodingConfidence.FAIR for geocoded_data in geocoded_data_list)
+    assert get_geocoded_addresses(cursor) == addresses
+
+
+def test_columnar_locality_is_matched_with_its_own_confidence():
+    db, _ = make_database()
+
+    columns = db.geocode_many(["02895", "60 Temple Pl, Boston, MA"], columnar=True)
+
+    assert columns["matched"].tolist() == [True, True]
+    assert [CONFIDENCE_CATEGORIES[confidence] for confidence in columns["confidence"]] == ["locality", "fair"]
+    assert columns["rating"].tolist() == [-1, 5]
+    assert np.allclose(columns["latitude"], [42.0, 41.0])
+
+
+def test_cascade_doesnt_send_localities_to_pagc():
+    db, cursor = make_database()
+
+    geocoded_data_list = db.geocode_many(["02895"], cascade=True, cascade_rating_threshold=0)
+
+    assert geocoded_data_list[0].confidence == GeocodingConfidence.LOCALITY
+    assert geocoded_data_list[0].stage == "default"
+    assert get_geocoded_addresses(cursor) == []
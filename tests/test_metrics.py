@@ -0,0 +1,84 @@
+import pytest
+
+from metrics import GeocoderMetrics, LatencyHistogram
+
+
+def test_percentiles_are_interpolated_inside_their_bucket():
+    histogram = LatencyHistogram(buckets=(0.1, 0.2, 0.3))
+    for seconds in [0.05, 0.15, 0.25, 0.25]:
+        histogram.observe(seconds)
+
+    assert histogram.percentile(0.25) == pytest.approx(0.1)
+    assert histogram.percentile(0.5) == pytest.approx(0.2)
+    # The largest observation bounds the last bucket that has any
+    assert histogram.percentile(1) == pytest.approx(0.25)
+    assert histogram.count == 4
+    assert histogram.sum == pytest.approx(0.7)
+
+
+def test_percentiles_above_the_last_bucket_are_bounded_by_the_max():
+    histogram = LatencyHistogram(buckets=(0.1,))
+    histogram.observe(5.0)
+
+    assert histogram.percentile(0.5) == pytest.approx(2.55)
+    assert histogram.percentile(0.99) <= 5.0
+
+
+def test_percentile_of_nothing_is_none():
+    assert LatencyHistogram().percentile(0.5) is None
+
+
+def test_summary_counts_calls_rows_confidences_and_errors():
+    metrics = GeocoderMetrics(buckets=(0.1, 1))
+    metrics.observe("geocode_many", 0.05, ["excellent", "no match", "excellent"])
+    metrics.observe_error("geocode", 0.2, ValueError())
+    metrics.add_gauges("cache", lambda: {'entries': 3, 'enabled': True})
+
+    summary = metrics.summary()
+
+    geocode_many = summary["operations"]["geocode_many"]
+    assert (geocode_many["calls"], geocode_many["rows"]) == (1, 3)
+    assert geocode_many["confidences"] == {'excellent': 2, 'no match': 1}
+    assert summary["operations"]["geocode"]["errors"] == {'ValueError': 1}
+    # Booleans arent numbers to export
+    assert summary["gauges"] == {'geocoder_cache_entries': 3}
+
+
+def test_only_the_outermost_measured_call_is_recorded():
+    metrics = GeocoderMetrics()
+
+    def inner():
+        return metrics.call("inner", lambda result: [], lambda: "inner")
+
+    assert metrics.call("outer", lambda result: ["excellent"], inner) == "inner"
+    assert list(metrics.histograms) == ["outer"]
+
+
+def test_prometheus_buckets_are_cumulative():
+    metrics = GeocoderMetrics(buckets=(0.1, 1))
+    metrics.observe("geocode", 0.05, ["excellent"])
+    metrics.observe("geocode", 0.5, ["poor"])
+    metrics.observe("geocode", 2.0, ["poor"])
+
+    lines = metrics.to_prometheus().splitlines()
+
+    assert 'geocoder_call_duration_seconds_bucket{operation="geocode",le="0.1"} 1' in lines
+    assert 'geocoder_call_duration_seconds_bucket{operation="geocode",le="1"} 2' in lines
+    assert 'geocoder_call_duration_seconds_bucket{operation="geocode",le="+Inf"} 3' in lines
+    assert 'geocoder_call_duration_seconds_count{operation="geocode"} 3' in lines
+    assert 'geocoder_results_total{operation="geocode",confidence="poor"} 2' in lines
+    assert "# TYPE geocoder_rows_total counter" in lines
+    assert lines[-1] != "# EOF"
+
+
+def test_openmetrics_names_counter_families_without_total():
+    metrics = GeocoderMetrics()
+    metrics.observe("geocode", 0.05, ["excellent"])
+    metrics.add_gauges("pool", lambda: {'size': float("nan")})
+
+    lines = metrics.to_prometheus(openmetrics=True).splitlines()
+
+    assert "# TYPE geocoder_rows counter" in lines
+    assert 'geocoder_rows_total{operation="geocode"} 1' in lines
+    assert "geocoder_pool_size NaN" in lines
+    assert lines[-1] == "# EOF"
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from geocoder import GeocodingConfidence
+from offline_export import build_export_arrays, write_export
+from offline_geocoder import OfflineGeocoder, parse_street_address
+
+
+def write_town_export(directory):
+    """
+    Writes an export with Oak St and Oak St W in Woonsocket and Main St in West Warwick, all in zip code 02895,
+    every edge runs east for about 100 m with odd numbers on the left
+    """
+
+    edge_rows = [
+        (1, np.array([[-71.530, 41.990], [-71.5287, 41.990]]), None, "Oak", "St", None, "Woonsocket", "Woonsocket", "02895", "02895"),
+        (2, np.array([[-71.530, 41.991], [-71.5287, 41.991]]), None, "Oak", "St", "W", "Woonsocket", "Woonsocket", "02895", "02895"),
+        (3, np.array([[-71.530, 41.992], [-71.5287, 41.992]]), None, "Main", "St", None, "West Warwick", "West Warwick", "02895", "02895"),
+    ]
+    range_rows = []
+    for tlid in (1, 2, 3):
+        range_rows += [(tlid, "L", 1, 99, "02895"), (tlid, "R", 2, 98, "02895")]
+
+    write_export(directory, build_export_arrays(edge_rows, range_rows), {'state': "RI"})
+
+
+@pytest.fixture
+def geocoder(tmp_path):
+    write_town_export(tmp_path)
+    return OfflineGeocoder([tmp_path])
+
+
+def test_parse_street_address_never_truncates_to_one_word():
+    number, candidates, place, state, zip_code = parse_street_address("51 Oak St West Warwick RI 02895")
+
+    assert (number, place, state, zip_code) == (51, None, "RI", "02895")
+    assert candidates == [
+        ("Oak St West Warwick", None),
+        ("Oak St West", "Warwick"),
+        ("Oak St", "West Warwick"),
+    ]
+
+
+def test_parse_street_address_with_comma_keeps_the_street():
+    assert parse_street_address("51 Oak St, Woonsocket, RI 02895") == (51, [("Oak St", None)], "Woonsocket", "RI", "02895")
+
+
+@pytest.mark.parametrize("address, expected_address", [
+    ("51 Oak St, Woonsocket, RI 02895", "51 Oak St, Woonsocket, RI 02895"),
+    ("51 Oak Street Woonsocket RI 02895", "51 Oak St, Woonsocket, RI 02895"),
+    ("51 Oak St West, Woonsocket, RI 02895", "51 Oak St W, Woonsocket, RI 02895"),
+    ("51 Oak St W Woonsocket RI 02895", "51 Oak St W, Woonsocket, RI 02895"),
+    ("51 Main St West Warwick RI 02895", "51 Main St, West Warwick, RI 02895"),
+])
+def test_exact_addresses_match_offline(geocoder, address, expected_address):
+    geocoded_data = geocoder.match(address)
+
+    assert geocoded_data.address == expected_address
+    assert geocoded_data.confidence == GeocodingConfidence.EXCELLENT
+
+
+@pytest.mark.parametrize("address", [
+    # The dropped words arent the place of Oak St W or Oak St, it could be another street in West Warwick
+    "51 Oak St West Warwick RI 02895",
+    "51 Oak St Providence RI 02895",
+    # A single word is never taken as the street
+    "51 Oak Woonsocket RI 02895",
+    "51 Main St Woonsocket RI 02895",
+    "151 Oak St, Woonsocket, RI 02895",
+    "51 Oak St, Woonsocket, RI",
+])
+def test_uncertain_addresses_fall_through_to_the_database(geocoder, address):
+    assert geocoder.match(address) is None
+    assert geocoder.get_geocoded_data(address).confidence == GeocodingConfidence.NO_MATCH
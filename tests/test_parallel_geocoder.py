@@ -0,0 +1,8 @@
+from parallel_geocoder import parse_state
+
+
+def test_parse_state():
+    assert parse_state("115 Cass Avenue in Woonsocket, RI 02895") == "RI"
+    assert parse_state("60 TEMPLE PL, BOSTON, MA") == "MA"
+    assert parse_state("115 Cass Avenue in Woonsocket, RI, United States") == "RI"
+    assert parse_state("no state here") == ""
@@ -0,0 +1,102 @@
+from contextlib import contextmanager
+
+import psycopg
+import pytest
+from psycopg_pool import PoolTimeout
+
+from replicas import ReplicaRouter
+
+
+class FakeConnection:
+    def __init__(self, name):
+        self.name = name
+        self.broken = False
+
+
+class FakePool:
+    def __init__(self, name, error=None):
+        self.name = name
+        self.error = error
+
+    def getconn(self, timeout=None):
+        if self.error is not None:
+            raise self.error
+        return FakeConnection(self.name)
+
+    def putconn(self, connection):
+        pass
+
+
+def make_router(*errors):
+    router = ReplicaRouter([f"replica-{index}:5432" for index in range(len(errors))], {}, check_interval=0)
+    for index, (replica, error) in enumerate(zip(router.replicas, errors)):
+        replica.pool = FakePool(f"replica-{index}", error)
+
+    return router
+
+
+@contextmanager
+def primary():
+    yield FakeConnection("primary")
+
+
+def is_ejected(replica):
+    return replica.ejected_until > 0
+
+
+def test_busy_replica_is_skipped_without_ejecting_it():
+    router = make_router(PoolTimeout("busy"), None)
+
+    with router.connection(primary) as connection:
+        assert connection.name == "replica-1"
+
+    assert not is_ejected(router.replicas[0])
+    assert router.replicas[0].outstanding == 0
+
+
+def test_every_replica_busy_raises_instead_of_using_the_primary():
+    router = make_router(PoolTimeout("busy"), PoolTimeout("busy"))
+
+    with pytest.raises(PoolTimeout):
+        with router.connection(primary):
+            pass
+
+    assert not any(is_ejected(replica) for replica in router.replicas)
+
+
+def test_canceled_query_doesnt_eject_the_replica():
+    router = make_router(None)
+
+    with pytest.raises(psycopg.errors.QueryCanceled):
+        with router.connection(primary):
+            raise psycopg.errors.QueryCanceled("canceling statement due to statement timeout")
+
+    assert not is_ejected(router.replicas[0])
+
+
+def test_broken_connection_ejects_the_replica():
+    router = make_router(None, None)
+
+    with pytest.raises(psycopg.OperationalError):
+        with router.connection(primary) as connection:
+            connection.broken = True
+            raise psycopg.OperationalError("server closed the connection unexpectedly")
+
+    assert is_ejected(router.replicas[0])
+
+
+def test_failed_pool_ejects_the_replica_and_uses_the_next_one():
+    router = make_router(psycopg.OperationalError("connection refused"), None)
+
+    with router.connection(primary) as connection:
+        assert connection.name == "replica-1"
+
+    assert is_ejected(router.replicas[0])
+
+
+def test_primary_is_used_when_every_replica_is_ejected():
+    router = make_router(None)
+    router.eject(router.replicas[0], psycopg.OperationalError("down"))
+
+    with router.connection(primary) as connection:
+        assert connection.name == "primary"
@@ -0,0 +1,77 @@
+import math
+
+import pytest
+
+import geocoder
+from geocoder import (
+    CONFIDENCE_CATEGORIES,
+    NO_MATCH_RESULT,
+    GeocodeResult,
+    GeocodingConfidence,
+    ReverseGeocodeResult,
+    build_geocode_columns,
+    to_record_batch,
+)
+
+
+ROWS = [
+    ("60 Temple Pl, Boston, MA 02111", 42.35, -71.06, 0),
+    (None, None, None, None),
+    GeocodeResult("Woonsocket, RI 02895", 42.0, -71.5, None, GeocodingConfidence.LOCALITY),
+    ("115 Cass Ave, Woonsocket, RI 02895", 42.0, -71.5, 60),
+]
+
+
+def get_confidences(columns):
+    return [CONFIDENCE_CATEGORIES[confidence] for confidence in columns["confidence"]]
+
+
+def test_results_read_like_the_old_dictionaries():
+    geocoded_data = GeocodeResult("60 Temple Pl, Boston, MA 02111", 42.35, -71.06, 0, GeocodingConfidence.EXCELLENT)
+
+    assert geocoded_data["latitude"] == geocoded_data.latitude == geocoded_data[1]
+    assert set(geocoded_data.to_dict()) == {"address", "latitude", "longitude", "rating", "confidence"}
+    assert set(geocoded_data._replace(stage="default", timings={}).to_dict()) >= {"stage", "timings"}
+    assert ReverseGeocodeResult("1 Main St", None, None)["street_1"] == "1 Main St"
+
+    with pytest.raises(KeyError):
+        geocoded_data["lat"]
+
+
+def test_results_dont_have_an_instance_dictionary():
+    with pytest.raises(AttributeError):
+        NO_MATCH_RESULT.__dict__
+
+
+def test_numpy_columns():
+    pytest.importorskip("numpy")
+
+    columns = build_geocode_columns(ROWS)
+
+    assert columns["address"].tolist() == [ROWS[0][0], None, ROWS[2].address, ROWS[3][0]]
+    assert columns["rating"].tolist() == [0, -1, -1, 60]
+    assert columns["matched"].tolist() == [True, False, True, True]
+    assert get_confidences(columns) == ["excellent", "no match", "locality", "poor"]
+    assert math.isnan(columns["latitude"][1])
+
+
+def test_columns_without_numpy(monkeypatch):
+    monkeypatch.setattr(geocoder, "np", None)
+
+    columns = build_geocode_columns(ROWS)
+
+    assert columns["rating"] == [0, None, None, 60]
+    assert columns["matched"] == [True, False, True, True]
+    assert get_confidences(columns) == ["excellent", "no match", "locality", "poor"]
+    assert columns["latitude"][1] is None
+
+
+def test_record_batch_nulls_what_wasnt_matched_or_rated():
+    pytest.importorskip("numpy")
+    pytest.importorskip("pyarrow")
+
+    record_batch = to_record_batch(build_geocode_columns(ROWS))
+
+    assert record_batch.column("latitude").to_pylist() == [42.35, None, 42.0, 42.0]
+    assert record_batch.column("rating").to_pylist() == [0, None, None, 60]
+    assert record_batch.column("confidence").to_pylist() == ["excellent", "no match", "locality", "poor"]
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from server import MAX_BODY_BYTES, MAX_HEADER_BYTES, GeocodingServer
+
+
+class FakeDatabase:
+    """Only /health is requested so the batch methods are never called"""
+
+    async def geocode_many(self, addresses, pagc_normalize_address=False):
+        raise AssertionError("not called")
+
+    async def reverse_geocode_many(self, coordinates):
+        raise AssertionError("not called")
+
+
+async def send_request(request):
+    server = GeocodingServer(FakeDatabase())
+    tcp_server = await asyncio.start_server(server.handle_connection, "127.0.0.1", 0, limit=MAX_HEADER_BYTES)
+    port = tcp_server.sockets[0].getsockname()[1]
+
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(request)
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), 5)
+        writer.close()
+    finally:
+        tcp_server.close()
+        await tcp_server.wait_closed()
+
+    return response
+
+
+def get_status(response):
+    return int(response.split(b" ", 2)[1])
+
+
+@pytest.mark.parametrize("content_length, status", [
+    ("abc", 400),
+    ("-1", 400),
+    ("", 400),
+    # Superscript digits of latin-1 pass str.isdigit but int() rejects them
+    ("\xb2", 400),
+    ("1\xb9", 400),
+    (str(MAX_BODY_BYTES + 1), 413),
+])
+def test_bad_content_length_gets_a_response(content_length, status):
+    request = f"GET /health HTTP/1.1\r\nContent-Length: {content_length}\r\nConnection: close\r\n\r\n".encode("latin-1")
+
+    assert get_status(asyncio.run(send_request(request))) == status
+
+
+def test_body_within_the_limit_is_skipped():
+    request = b"GET /health HTTP/1.1\r\nContent-Length: 5\r\nConnection: close\r\n\r\nhello"
+
+    assert get_status(asyncio.run(send_request(request))) == 200
+
+
+@pytest.mark.parametrize("method", ["POST", "DELETE"])
+@pytest.mark.parametrize("path", ["/metrics", "/health", "/geocode?address=02895"])
+def test_only_get_is_served(method, path):
+    status, _, _ = asyncio.run(GeocodingServer(FakeDatabase()).handle_request(method, path))
+
+    assert status == 405